@@ -1,11 +1,9 @@
 import atexit
-import time
 from configparser import ConfigParser
 from copy import deepcopy
-from datetime import datetime, timedelta
 from operator import methodcaller
 from threading import Barrier
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import dlib
@@ -16,6 +14,7 @@ from imutils import face_utils
 from nptyping import Int, NDArray
 
 from app.app_type import ApplicationType
+from brightness.actuator import BACKENDS, BrightnessActuator
 from brightness.calculator import BrightnessMode
 from brightness.controller import BrightnessController
 from concentration.fuzzy.classes import Interval
@@ -25,20 +24,31 @@ from distance.calculator import (
     draw_landmarks_used_by_distance_calculator,
 )
 from distance.guard import DistanceGuard, DistanceState
+from distance.reference_cache import ReferenceCache
 from focus_time.guard import TimeGuard
 from gui.popup_widget import TimeState
 from posture.calculator import PostureLabel, draw_landmarks_used_by_angle_calculator
+from posture.fallback import MtcnnFallback
 from posture.guard import PostureGuard
-from screenshot.compare import get_compare_slices, get_screenshot
+from screenshot.capture import shared_screen_capture
+from screenshot.compare import get_compare_slices
+from screenshot.fingerprint import difference_hash
+from screenshot.similarity import fingerprint_to_hex
 from util.color import GREEN, MAGENTA
-from util.image_convert import ndarray_to_qimage
+from util.image_convert import QImageWriter
 from util.image_type import ColorImage
+from util.logger import setup_logger
 from util.path import to_abs_path
+from util.scheduler import shared_scheduler
+from util.startup import StartupError, StartupOrchestrator
 from util.task_worker import TaskWorker
-from util.time import Timer
+from util.time import ONE_MIN, Timer
 from util.video_writer import VideoWriter
 
 
+logger = setup_logger("log-of-startup", to_abs_path("log-of-startup.log"))
+
+
 class WebcamApplication(QObject):
     """
     The WebcamApplication provides 4 main applications:
@@ -63,13 +73,21 @@ class WebcamApplication(QObject):
             Sends the label of posture and few detection details.
         s_screenshot_refreshed:
             Emits everytime a new screenshot is ready to be compared with others.
-            Sends the sequence of frame data.
+            Sends the slices and the fingerprint (hex) of it.
         s_time_refreshed:
             Emits everytime the timer is updated.
             Sends the time and its state.
         s_frame_refreshed:
             Emits every time a new frame is captured.
             Sends the new frame.
+        s_distance_measure_failed:
+            Emits if the distance guard can't be created or updated, e.g., by
+            a reference image without exactly 1 face.
+            Sends the reason.
+        s_start_failed:
+            Emits if the webcam, the models or the grader fail to load, in
+            which case start() returns right after it, with s_stopped.
+            Sends the reason.
         s_started:
             Emits after the WebcamApplication starts running.
         s_stopped:
@@ -77,6 +95,17 @@ class WebcamApplication(QObject):
     """
 
     SETTINGS_FILE = to_abs_path("./app/settings.ini")
+    SHAPE_PREDICTOR_FILE = to_abs_path(
+        "dlib_model/shape_predictor_68_face_landmarks.dat"
+    )
+    REFERENCE_CACHE_FILE = to_abs_path("dlib_model/reference_landmarks.json")
+    # Slices of screenshot are sent on every XX:X0:00 and XX:X5:00, plus a
+    # random delay within the jitter (in seconds) which is fixed per student,
+    # so the students of a class don't hit the server in the same instant.
+    SCREENSHOT_PERIOD = 5 * ONE_MIN
+    SCREENSHOT_JITTER = 3.0
+    # in seconds, how old a capture may be to be sliced
+    SCREENSHOT_MAX_AGE = 1.0
 
     # Signals used to communicate with controller.
     s_brightness_refreshed = pyqtSignal(int)
@@ -84,8 +113,12 @@ class WebcamApplication(QObject):
     s_distance_refreshed = pyqtSignal(float, DistanceState)
     s_frame_refreshed = pyqtSignal(QImage)
     s_posture_refreshed = pyqtSignal(PostureLabel, str)
-    s_screenshot_refreshed = pyqtSignal(np.ndarray)
+    s_screenshot_refreshed = pyqtSignal(np.ndarray, str)
     s_time_refreshed = pyqtSignal(int, TimeState)
+    s_distance_measure_failed = pyqtSignal(str)
+    s_start_failed = pyqtSignal(str)
+    # emits from the thread of the last step of startup
+    _s_startup_finished = pyqtSignal()
 
     s_started = (
         pyqtSignal()
@@ -102,12 +135,16 @@ class WebcamApplication(QObject):
         # flag to False will stop it.
         self._f_ready: bool = False
 
-        self._webcam = cv2.VideoCapture(0)
+        # the frames shown are converted into the same QImage, loop by loop
+        self._frame_writer = QImageWriter()
         # self._writer = VideoWriter("concent_live")
         # atexit.register(self._writer.release)
-        self._create_face_detectors()
-        self._create_concentration_grader()
+        # the grader is created by one of the slow steps, which hands it to the
+        # posture guard
+        self._concentration_grader: Optional[ConcentrationGrader] = None
         self._create_guards()
+        self._start_slow_steps()
+        self._configure_screen_capture()
         self._create_brightness_controller()
 
     def _load_settings(self) -> None:
@@ -122,15 +159,81 @@ class WebcamApplication(QObject):
         with open(self.SETTINGS_FILE, "w", encoding="utf-8") as f:
             self._settings.write(f)
 
-    def _create_face_detectors(self) -> None:
-        """Creates face detector and shape predictor."""
+    def _start_slow_steps(self) -> None:
+        """Opens the webcam, loads the models, including those the concentration
+        grader imports, and creates the distance guard, which needs the
+        reference landmarks, concurrently in the background, so the window
+        shows without waiting for them, and the first grading doesn't freeze it.
+
+        The capturing loop starts once the webcam and models are ready; the
+        distance measurement switches on once its guard is. The reference
+        landmarks wait for the models only if they aren't cached. The timeline
+        of the steps is logged when all are done.
+        """
         self._face: Optional[dlib.rectangle] = None
         self._landmarks: NDArray[(68, 2), Int[32]] = None
+        # None until created by its step, or by a valid reference image set
+        # after the step failed
+        self._distance_guard: Optional[DistanceGuard] = None
+        self._distance_measure = self._settings.getboolean(
+            ApplicationType.DISTANCE_MEASUREMENT.name, "ENABLED"
+        )
+        # those set before the startup finishes, see set_distance_measure()
+        self._pending_distance_settings: Dict[str, Any] = {}
+        self._f_startup_finished = False
+        self._s_startup_finished.connect(self._on_startup_finished)
+        self._ref_cache = ReferenceCache(
+            self.REFERENCE_CACHE_FILE, self.SHAPE_PREDICTOR_FILE
+        )
+
+        self._startup = StartupOrchestrator()
+        self._startup.add("webcam", self._open_webcam)
+        self._startup.add("face_detector", self._create_face_detector)
+        self._startup.add("shape_predictor", self._load_shape_predictor)
+        self._startup.add("reference_landmarks", self._update_ref_landmarks)
+        self._startup.add("concentration_grader", self._create_concentration_grader)
+        self._startup.add(
+            "grader_models",
+            lambda: self._concentration_grader.warm_up(),
+            after=("concentration_grader",),
+        )
+        self._startup.add(
+            "distance_guard",
+            self._create_distance_guard,
+            after=("reference_landmarks", "concentration_grader"),
+        )
+        self._startup.on_finished(
+            lambda: logger.info("startup timeline\n%s", self._startup.report())
+        )
+        self._startup.on_finished(self._s_startup_finished.emit)
+        self._startup.start()
+
+    def _open_webcam(self) -> None:
+        self._webcam = cv2.VideoCapture(0)
+        if not self._webcam.isOpened():
+            raise OSError("the webcam can't be opened")
+
+    def _create_face_detector(self) -> None:
         self._face_detector: dlib.fhog_object_detector = (
             dlib.get_frontal_face_detector()
         )
-        self._shape_predictor = dlib.shape_predictor(
-            to_abs_path("dlib_model/shape_predictor_68_face_landmarks.dat")
+
+    def _load_shape_predictor(self) -> None:
+        self._shape_predictor = dlib.shape_predictor(self.SHAPE_PREDICTOR_FILE)
+
+    def _configure_screen_capture(self) -> None:
+        """Sets how often the screen is captured for the brightness optimization
+        and the slices of screenshot.
+        """
+        capture = shared_screen_capture()
+        capture.max_rate = self._settings.getfloat(
+            "SCREEN_CAPTURE", "MAX_RATE", fallback=capture.max_rate
+        )
+        capture.ttl = self._settings.getfloat(
+            "SCREEN_CAPTURE", "TTL", fallback=capture.ttl
+        )
+        capture.max_width = self._settings.getint(
+            "SCREEN_CAPTURE", "MAX_WIDTH", fallback=capture.max_width
         )
 
     def _create_brightness_controller(self) -> None:
@@ -141,28 +244,48 @@ class WebcamApplication(QObject):
         self._brightness_controller = BrightnessController(
             settings.getint("BASE_VALUE"),
             BrightnessMode[settings["MODE"]],
+            self._create_brightness_actuator(),
         )
 
-    def _create_concentration_grader(self) -> None:
-        """Create ConcentrationGrader shared by guards."""
-        self._concentration_grader = ConcentrationGrader()
-        self._concentration_grader.s_concent_interval_refreshed.connect(
-            self.s_concent_interval_refreshed
+    def _create_brightness_actuator(self) -> BrightnessActuator:
+        """Creates the actuator which writes the brightness to the screen, with
+        the backend, e.g., "fake" on platforms without WMI, and how often it
+        writes.
+        """
+        backend: str = self._settings.get(
+            "BRIGHTNESS_ACTUATOR", "BACKEND", fallback="wmi"
         )
-        self._keep_grading_if_related_apps_enabled()
+        actuator = BrightnessActuator(BACKENDS[backend]())
+        actuator.step = self._settings.getint(
+            "BRIGHTNESS_ACTUATOR", "STEP", fallback=actuator.step
+        )
+        actuator.min_interval = self._settings.getfloat(
+            "BRIGHTNESS_ACTUATOR", "MIN_INTERVAL", fallback=actuator.min_interval
+        )
+        return actuator
+
+    def _create_concentration_grader(self) -> None:
+        """Creates ConcentrationGrader shared by guards; in the background, so
+        it's moved to the thread of the application, whose event loop runs its
+        timers.
+        """
+        grader = ConcentrationGrader()
+        # starts grading unless stopped here; can't be started in this thread
+        if not self._related_apps_enabled():
+            grader.stop_grading()
+        grader.s_concent_interval_refreshed.connect(self.s_concent_interval_refreshed)
+        grader.moveToThread(self.thread())
+        self._posture_guard.set_grader(grader)
+        self._concentration_grader = grader
 
     def _create_guards(self) -> None:
-        self._create_distance_guard()
+        # the distance guard is created in the background, see _start_slow_steps()
         self._create_time_guard()
         self._create_posture_guard()
 
     def _create_distance_guard(self) -> None:
-        self._ref_landmarks: NDArray[(68, 2), Int[32]]
-        self._update_ref_landmarks()
-
         settings = self._settings[ApplicationType.DISTANCE_MEASUREMENT.name]
 
-        self._distance_measure = settings.getboolean("ENABLED")
         self._distance_guard = DistanceGuard(
             DistanceCalculator(
                 self._ref_landmarks, settings.getfloat("REFERENCE_DISTANCE")
@@ -194,7 +317,27 @@ class WebcamApplication(QObject):
             settings.getfloat("ANGLE"),
             settings.getboolean("WARNING"),
             self._concentration_grader,
+            self._create_mtcnn_fallback(),
+        )
+
+    def _create_mtcnn_fallback(self) -> MtcnnFallback:
+        """Creates the MTCNN detection for the faces that HOG fails on, with
+        how often it runs and how long its results are reused.
+        """
+        fallback = MtcnnFallback()
+        fallback.min_interval = self._settings.getfloat(
+            "MTCNN_FALLBACK", "MIN_INTERVAL", fallback=fallback.min_interval
+        )
+        fallback.result_ttl = self._settings.getfloat(
+            "MTCNN_FALLBACK", "RESULT_TTL", fallback=fallback.result_ttl
+        )
+        fallback.negative_ttl = self._settings.getfloat(
+            "MTCNN_FALLBACK", "NEGATIVE_TTL", fallback=fallback.negative_ttl
         )
+        fallback.max_width = self._settings.getint(
+            "MTCNN_FALLBACK", "MAX_WIDTH", fallback=fallback.max_width
+        )
+        return fallback
 
     def set_distance_measure(
         self,
@@ -205,29 +348,96 @@ class WebcamApplication(QObject):
         warn_dist: Optional[float] = None,
         warning_enabled: Optional[bool] = None
     ) -> None:
+        """Those set before the startup finishes are deferred until it does,
+        so the GUI never waits for the models. A failure is emitted by
+        s_distance_measure_failed.
+        """
+        self._pending_distance_settings.update(
+            (name, value)
+            for name, value in (
+                ("enabled", enabled),
+                ("ref_img_path", ref_img_path),
+                ("camera_dist", camera_dist),
+                ("warn_dist", warn_dist),
+                ("warning_enabled", warning_enabled),
+            )
+            if value is not None
+        )
+        if self._f_startup_finished:
+            self._apply_distance_settings()
+
+    @pyqtSlot()
+    def _on_startup_finished(self) -> None:
+        self._f_startup_finished = True
+        # in case the settings changed while the grader was being created
+        self._keep_grading_if_related_apps_enabled()
+        # a new reference image may fix it, which is tried right after
+        if "ref_img_path" not in self._pending_distance_settings:
+            try:
+                self._startup.wait("reference_landmarks", "distance_guard")
+            except StartupError as e:
+                # the error the step failed with
+                self.s_distance_measure_failed.emit(str(e.__cause__ or e))
+        self._apply_distance_settings()
+
+    def _apply_distance_settings(self) -> None:
+        pending, self._pending_distance_settings = self._pending_distance_settings, {}
+        if not pending:
+            return
+        try:
+            self._update_distance_measure(**pending)
+        except (OSError, StartupError, ValueError) as e:
+            self.s_distance_measure_failed.emit(str(e))
+
+    def _update_distance_measure(
+        self,
+        *,
+        enabled: Optional[bool] = None,
+        ref_img_path: Optional[str] = None,
+        camera_dist: Optional[float] = None,
+        warn_dist: Optional[float] = None,
+        warning_enabled: Optional[bool] = None
+    ) -> None:
+        """
+        Raises:
+            OSError: The reference image can't be read.
+            StartupError: The models failed to load.
+            ValueError: The reference image doesn't have exactly 1 face.
+        """
         settings = self._settings[ApplicationType.DISTANCE_MEASUREMENT.name]
 
+        if camera_dist is not None:
+            settings["REFERENCE_DISTANCE"] = str(camera_dist)
+        if warn_dist is not None:
+            settings["LIMIT"] = str(warn_dist)
+        if warning_enabled is not None:
+            settings["WARNING"] = str(warning_enabled)
+        if enabled is not None:
+            settings["ENABLED"] = str(enabled)
+            self._distance_measure = enabled
+            self._keep_grading_if_related_apps_enabled()
+        if ref_img_path is not None:
+            settings["REFERENCE_IMAGE_PATH"] = ref_img_path
+            self._update_ref_landmarks()
+            if self._distance_guard is None:
+                # the reference image on startup was bad; created with all the
+                # settings above
+                self._create_distance_guard()
+                return
+        # without a valid reference image yet, the settings are kept for later
+        if self._distance_guard is None:
+            return
+
         if camera_dist is not None or ref_img_path is not None:
-            if camera_dist is not None:
-                settings["REFERENCE_DISTANCE"] = str(camera_dist)
-            if ref_img_path is not None:
-                settings["REFERENCE_IMAGE_PATH"] = ref_img_path
-                self._update_ref_landmarks()
             self._distance_guard.set_calculator(
                 DistanceCalculator(
                     self._ref_landmarks, settings.getfloat("REFERENCE_DISTANCE")
                 )
             )
         if warn_dist is not None:
-            settings["LIMIT"] = str(warn_dist)
             self._distance_guard.set_warn_dist(warn_dist)
         if warning_enabled is not None:
-            settings["WARNING"] = str(warning_enabled)
             self._distance_guard.set_warning_enabled(warning_enabled)
-        if enabled is not None:
-            settings["ENABLED"] = str(enabled)
-            self._distance_measure = enabled
-            self._keep_grading_if_related_apps_enabled()
 
     def set_focus_time(
         self,
@@ -305,10 +515,26 @@ class WebcamApplication(QObject):
         Arguments:
             refresh: Refresh speed in millisecond. 1ms in default.
         """
-        screenshot_worker = TaskWorker(self._send_slices_of_screenshot)
-        self.s_stopped.connect(screenshot_worker.quit)
-        self.s_stopped.connect(screenshot_worker.deleteLater)
-        screenshot_worker.start()
+        # The loop needs the webcam, models and grader, which are loaded in the
+        # background.
+        try:
+            self._startup.wait(
+                "webcam", "face_detector", "shape_predictor", "concentration_grader"
+            )
+        except StartupError as e:
+            if self._startup.is_done("webcam"):
+                self._webcam.release()
+            # the error the step failed with
+            self.s_start_failed.emit(str(e.__cause__ or e))
+            self.s_stopped.emit()
+            return
+
+        screenshot_job = shared_scheduler().every(
+            self.SCREENSHOT_PERIOD,
+            self._send_slices_of_screenshot,
+            jitter=self.SCREENSHOT_JITTER,
+        )
+        self.s_stopped.connect(screenshot_job.cancel)
 
         # Set the flag to True so can start capturing.
         # Loop breaks if someone calls stop() and sets the flag to False.
@@ -349,7 +575,7 @@ class WebcamApplication(QObject):
 
             self._concentration_grader.add_frame()
 
-            self.s_frame_refreshed.emit(ndarray_to_qimage(canvas))
+            self.s_frame_refreshed.emit(self._frame_writer.write(canvas))
             cv2.waitKey(refresh)
         # Release resources.
         self._webcam.release()
@@ -361,8 +587,10 @@ class WebcamApplication(QObject):
         self._f_ready = False
 
     def _do_distance_measurement(self) -> None:
-        if self._distance_measure and self._has_face():
-            dist_info = self._distance_guard.warn_if_too_close(self._landmarks)
+        # switches on once the guard is created
+        guard = self._distance_guard
+        if guard is not None and self._distance_measure and self._has_face():
+            dist_info = guard.warn_if_too_close(self._landmarks)
             self.s_distance_refreshed.emit(*dist_info)
         self._task_barrier.wait()
 
@@ -400,48 +628,21 @@ class WebcamApplication(QObject):
         self._task_barrier.wait()
 
     def _send_slices_of_screenshot(self) -> None:
-        """Sends the slices of screenshot precisely on every XX:XX:00 and XX:XX:30."""
-
-        def _do_real_data_send() -> None:
-            data: ColorImage = get_screenshot()
-            # don't need that much precision
-            slices: NDArray[(36,), Int[16]] = get_compare_slices(data).astype(np.int16)
-            self.s_screenshot_refreshed.emit(slices)
-
-        # time alignment tech.: https://stackoverflow.com/a/47510198
-        now = datetime.now()
-
-        # Align to the next multiple of 5 minute:
-        #   get the largest multiple smaller than now and
-        #   set the fire time to the smallest multiple greater than now.
-        minute = (now.minute // 5) * 5
-        next_fire = now.replace(minute=minute, second=0, microsecond=0) + timedelta(
-            minutes=5
+        """Sends the slices of screenshot; scheduled on the boundaries of
+        SCREENSHOT_PERIOD.
+        """
+        # fresh, the one cached for the brightness may be from a while ago
+        data: ColorImage = shared_screen_capture().get(max_age=self.SCREENSHOT_MAX_AGE)
+        # don't need that much precision
+        slices: NDArray[(36,), Int[16]] = get_compare_slices(data).astype(np.int16)
+        self.s_screenshot_refreshed.emit(
+            slices, fingerprint_to_hex(difference_hash(data))
         )
 
-        # How long we might be busy waiting and checking to approach the precise
-        # time, better be longer than the task time.
-        # NOTE: the current time might be so close to the next fire time, smaller
-        # than gap, so no gap in the first task to prevent negative sleep time.
-        BUSY_CHECK_GAP = 2
-        sleep = (next_fire - now).seconds
-
-        while True:
-            # sleep for most of the time
-            time.sleep(sleep)
-            # wait until the precise time is reached
-            while datetime.now() < next_fire:
-                pass
-
-            _do_real_data_send()
-
-            next_fire += timedelta(minutes=5)  # advance 5 minutes
-            sleep = 5 * 60 - BUSY_CHECK_GAP
-
-    def _keep_grading_if_related_apps_enabled(self) -> None:
+    def _related_apps_enabled(self) -> bool:
         # Need both distance measurement and posture detection to have
         # the concentration grader work.
-        relate_enabled = all(
+        return all(
             [
                 self._settings.getboolean(app_type.name, "ENABLED")
                 for app_type in (
@@ -451,10 +652,15 @@ class WebcamApplication(QObject):
             ]
         )
 
-        if relate_enabled:
-            self._concentration_grader.start_grading()
+    def _keep_grading_if_related_apps_enabled(self) -> None:
+        grader = self._concentration_grader
+        if grader is None:
+            # decided once it's created, see _create_concentration_grader()
+            return
+        if self._related_apps_enabled():
+            grader.start_grading()
         else:
-            self._concentration_grader.stop_grading()
+            grader.stop_grading()
 
     def _update_face_and_landmarks(self, canvas: ColorImage, frame: ColorImage) -> None:
         """
@@ -474,19 +680,27 @@ class WebcamApplication(QObject):
             draw_landmarks_used_by_distance_calculator(canvas, self._landmarks)
 
     def _update_ref_landmarks(self) -> None:
-        """Updates the reference landmarks with the reference image path."""
-        ref_img: ColorImage = cv2.imread(
+        """Updates the reference landmarks with the reference image path.
+
+        Raises:
+            ValueError: The reference image doesn't have exactly 1 face.
+        """
+        self._ref_landmarks: NDArray[(68, 2), Int[32]] = self._ref_cache.get_or_detect(
             self._settings[ApplicationType.DISTANCE_MEASUREMENT.name][
                 "REFERENCE_IMAGE_PATH"
-            ]
+            ],
+            self._detect_ref_landmarks,
         )
+
+    def _detect_ref_landmarks(self, ref_img: ColorImage) -> NDArray[(68, 2), Int[32]]:
+        """Detects the landmarks on a cache miss of the reference image."""
+        # the models may still be loading in the background
+        self._startup.wait("face_detector", "shape_predictor")
         faces: dlib.rectangles = self._face_detector(ref_img)
         if len(faces) != 1:
             # must have exactly one face in the reference image
             raise ValueError("should have exactly 1 face in the reference image")
-        self._ref_landmarks = face_utils.shape_to_np(
-            self._shape_predictor(ref_img, faces[0])
-        )
+        return face_utils.shape_to_np(self._shape_predictor(ref_img, faces[0]))
 
     def _has_face(self) -> bool:
         """Returns whether the landmarks indicate a face."""
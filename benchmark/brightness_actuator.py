@@ -0,0 +1,63 @@
+"""Benchmarks writing the brightness of the control loop to the screen.
+
+A loop of 30 frames per second requests a brightness which drifts slowly with
+noise, as the webcam does. The brightness is written on every frame as it used
+to be, and through the actuator. The writes go to a fake backend which blocks
+as long as a slow WMI call. Run with
+
+    python -m benchmark.brightness_actuator
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from brightness.actuator import BrightnessActuator, RecordingBackend
+
+
+FPS = 30
+
+
+def _targets(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    drift = np.cumsum(rng.normal(0, 0.2, int(seconds * FPS)))
+    noise = rng.normal(0, 1, drift.size)
+    return np.clip(np.rint(50 + drift + noise), 0, 100).astype(int)
+
+
+def run(seconds: float, latency: float, step: int, min_interval: float) -> None:
+    targets = _targets(seconds)
+
+    backend = RecordingBackend(latency)
+    start = time.perf_counter()
+    for target in targets:
+        backend.set_brightness(int(target))
+    blocked = time.perf_counter() - start
+    print(f"every frame: {len(backend.writes):4d} writes, ", end="")
+    print(f"{blocked / targets.size * 1e3:7.3f} ms blocked per frame")
+
+    backend = RecordingBackend(latency)
+    actuator = BrightnessActuator(backend, step, min_interval)
+    blocked = 0.0
+    for target in targets:
+        start = time.perf_counter()
+        actuator.request(int(target))
+        blocked += time.perf_counter() - start
+        time.sleep(1 / FPS)
+    actuator.stop()
+    print(f"actuator:    {len(backend.writes):4d} writes, ", end="")
+    print(f"{blocked / targets.size * 1e3:7.3f} ms blocked per frame")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10, help="of frames")
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="in seconds, of a write"
+    )
+    parser.add_argument("--step", type=int, default=2)
+    parser.add_argument("--min-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    run(args.seconds, args.latency, args.step, args.min_interval)
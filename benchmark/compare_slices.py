@@ -0,0 +1,76 @@
+"""Benchmarks taking the slices of screenshots of several resolutions.
+
+The slices are taken by the mean of each block as they used to be, by the
+reshape reduction of get_compare_slices(), and by the latter on a capture
+downscaled to 640 pixels wide as the shared screen capture delivers. Run with
+
+    python -m benchmark.compare_slices
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+import cv2
+import numpy as np
+
+from screenshot.compare import get_compare_slices
+
+
+RESOLUTIONS = {
+    "1080p": (1080, 1920),
+    "1440p": (1440, 2560),
+    "4K": (2160, 3840),
+}
+
+
+def _slices_block_by_block(image: np.ndarray) -> np.ndarray:
+    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = gray_image.shape
+    h //= 12
+    w //= 12
+    slices = [
+        np.mean(gray_image[h * i : h * (i + 1), w * j : w * (j + 1)])
+        for i in range(0, 12, 2)
+        for j in range(0, 12, 2)
+    ]
+    return np.array(slices, dtype=np.float64)
+
+
+def _best_of(repeat: int, take: Callable[[], np.ndarray]) -> float:
+    """Returns the shortest time in seconds."""
+    elapsed: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        take()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def run(repeat: int) -> None:
+    rng = np.random.default_rng(0)
+    for name, (height, width) in RESOLUTIONS.items():
+        # 4 channels, as captured from the screen
+        image = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+        downscaled = cv2.resize(
+            image, (640, height * 640 // width), interpolation=cv2.INTER_AREA
+        )
+        np.testing.assert_allclose(
+            _slices_block_by_block(image), get_compare_slices(image)
+        )
+
+        print(f"{name}:")
+        for method, take in (
+            ("block by block", lambda: _slices_block_by_block(image)),
+            ("reshape", lambda: get_compare_slices(image)),
+            ("downscaled", lambda: get_compare_slices(downscaled)),
+        ):
+            print(f"  {method:<15} {_best_of(repeat, take) * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="best of")
+    args = parser.parse_args()
+
+    run(args.repeat)
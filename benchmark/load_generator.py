@@ -0,0 +1,287 @@
+"""Simulates a class of students and teachers against a server and reports how
+well the server sustains it.
+
+Students post their grades every minute and the slices of their screenshots
+every 5 minutes. Like the Student-end, they do so on the wall-clock
+boundaries, so all of them post in the same instant at XX:XX:00, and both at
+XX:X0:00 and XX:X5:00. Teachers either long-poll the pushed grades or poll
+them every 30 seconds like the Teacher-end used to.
+
+The simulated clock can run faster than the real one, e.g., with
+--time-scale 30 a simulated minute passes in 2 seconds. Run with
+
+    python -m benchmark.load_generator --students 1000 --minutes 10 --spawn asyncio
+"""
+
+import argparse
+import asyncio
+import contextlib
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, DefaultDict, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+import psutil
+
+from benchmark.servers import (
+    IN_PROCESS_VARIANTS,
+    VARIANTS,
+    in_process_server,
+    port_of,
+    spawned_server,
+)
+from util.time import DATE_STR_FORMAT
+
+
+@dataclass
+class _Stats:
+    """The latencies and errors of a kind of request."""
+
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def report(self, kind: str) -> str:
+        total = len(self.latencies) + self.errors
+        if total == 0:
+            return f"  {kind:<12} no request"
+        line = (
+            f"  {kind:<12} {total:>8,} requests, error rate {self.errors / total:6.2%}"
+        )
+        if len(self.latencies) > 1:
+            p = statistics.quantiles(self.latencies, n=100)
+            line += f", p50 {p[49] * 1e3:7.1f} ms, p95 {p[94] * 1e3:7.1f} ms, p99 {p[98] * 1e3:7.1f} ms"
+        return line
+
+
+class _SimulatedClock:
+    """Maps the simulated wall-clock time to the real monotonic time."""
+
+    def __init__(self, time_scale: float) -> None:
+        self._time_scale = time_scale
+        self._real_start = time.monotonic()
+        # start right before a 5-minute boundary, so the first burst comes soon
+        now = datetime.now()
+        minute = (now.minute // 5) * 5
+        self._sim_start = now.replace(minute=minute, second=0, microsecond=0) + (
+            timedelta(minutes=5) - timedelta(seconds=2 * time_scale)
+        )
+
+    def now(self) -> datetime:
+        elapsed = (time.monotonic() - self._real_start) * self._time_scale
+        return self._sim_start + timedelta(seconds=elapsed)
+
+    async def sleep_until(self, sim_time: datetime) -> None:
+        delay = (sim_time - self.now()).total_seconds() / self._time_scale
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        url: str,
+        students: int,
+        teachers: int,
+        minutes: int,
+        time_scale: float,
+        jitter: float,
+        teacher_mode: str,
+    ) -> None:
+        """
+        Arguments:
+            url: Where the server is.
+            students: The number of students posting.
+            teachers: The number of teachers getting the grades.
+            minutes: How long, in simulated minutes, the class lasts.
+            time_scale: How many times the simulated clock is faster than the real one.
+            jitter:
+                In seconds. Each student posts with a fixed random delay within
+                it after the boundaries; 0 to have all of them post at once.
+            teacher_mode: "push" to long-poll, "poll" to get every 30 seconds.
+        """
+        self._url = url
+        self._students = students
+        self._teachers = teachers
+        self._minutes = minutes
+        self._time_scale = time_scale
+        self._jitter = jitter
+        self._teacher_mode = teacher_mode
+        self._stats: DefaultDict[str, _Stats] = defaultdict(_Stats)
+
+    async def run(self) -> Dict[str, _Stats]:
+        self._clock = _SimulatedClock(self._time_scale)
+        self._end = self._clock.now() + timedelta(minutes=self._minutes)
+        # each client keeps its own connection, as real students do
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=120)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as self._session:
+            await asyncio.gather(
+                *(self._simulate_student(str(i)) for i in range(self._students)),
+                *(self._simulate_teacher() for _ in range(self._teachers)),
+            )
+        return dict(self._stats)
+
+    async def _request(self, kind: str, method: str, path: str, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            async with self._session.request(method, self._url + path, **kwargs) as r:
+                body = await r.json()
+                r.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            self._stats[kind].errors += 1
+            return None
+        self._stats[kind].latencies.append(time.perf_counter() - start)
+        return body
+
+    async def _simulate_student(self, student_id: str) -> None:
+        offset = timedelta(seconds=random.uniform(0, self._jitter))
+        now = self._clock.now()
+        next_fire = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while next_fire + offset < self._end:
+            await self._clock.sleep_until(next_fire + offset)
+            end = int(next_fire.timestamp())
+            await self._request(
+                "grades",
+                "POST",
+                "/student/grades",
+                json={
+                    "start": end - 60,
+                    "end": end,
+                    "grade": round(random.random(), 2),
+                    "time": next_fire.strftime(DATE_STR_FORMAT),
+                    "id": student_id,
+                },
+            )
+            if next_fire.minute % 5 == 0:
+                await self._request(
+                    "screenshots",
+                    "POST",
+                    "/student/screenshots",
+                    json={
+                        "id": student_id,
+                        "slices": [random.randrange(256) for _ in range(36)],
+                        "fingerprint": f"{random.getrandbits(64):016x}",
+                    },
+                )
+            next_fire += timedelta(minutes=1)
+
+    async def _simulate_teacher(self) -> None:
+        params: Dict[str, Any] = {"genre": "grades"}
+        while self._clock.now() < self._end:
+            if self._teacher_mode == "push":
+                # don't be held by the server long after the class ends
+                remaining = (self._end - self._clock.now()).total_seconds()
+                params["timeout"] = max(min(remaining / self._time_scale, 25), 0.1)
+                events = await self._request(
+                    "teacher", "GET", "/teacher/events", params=params
+                )
+                if events is not None:
+                    params["cursor"] = events["cursor"]
+                else:
+                    await asyncio.sleep(1)
+            else:
+                await self._request(
+                    "teacher", "GET", "/teacher", params={"genre": "grades"}
+                )
+                await self._clock.sleep_until(self._clock.now() + timedelta(seconds=30))
+
+
+class _MemorySampler:
+    """Samples the resident memory of the server processes once a second."""
+
+    def __init__(self, pid: int) -> None:
+        self._process = psutil.Process(pid)
+        self._samples: List[int] = []
+        self._f_sampling = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _rss(self) -> int:
+        processes = [self._process, *self._process.children(recursive=True)]
+        return sum(p.memory_info().rss for p in processes)
+
+    def _sample(self) -> None:
+        while self._f_sampling:
+            self._samples.append(self._rss())
+            time.sleep(1)
+
+    def __enter__(self) -> "_MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._f_sampling = False
+        self._thread.join()
+        self._samples.append(self._rss())
+
+    def report(self) -> str:
+        start, peak, end = self._samples[0], max(self._samples), self._samples[-1]
+        mb = 1024 * 1024
+        return f"  memory       start {start / mb:.1f} MB, peak {peak / mb:.1f} MB, growth {(end - start) / mb:+.1f} MB"
+
+
+@contextlib.contextmanager
+def _target(args: argparse.Namespace) -> Iterator[Tuple[str, Optional[int]]]:
+    """Yields the url of the server and the pid whose memory to sample."""
+    if args.url:
+        yield args.url, args.server_pid
+    elif args.spawn:
+        with spawned_server(args.spawn, args.workers) as server:
+            yield f"http://127.0.0.1:{port_of(server)}", server.pid
+    else:
+        with in_process_server(args.in_process) as port:
+            # the memory of the generator is counted as well
+            yield f"http://127.0.0.1:{port}", psutil.Process().pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="a server already running, e.g., on localhost")
+    target.add_argument("--spawn", choices=VARIANTS, help="start it as a process")
+    target.add_argument(
+        "--in-process", choices=IN_PROCESS_VARIANTS, help="serve it by a thread"
+    )
+    parser.add_argument("--server-pid", type=int, help="to sample memory with --url")
+    parser.add_argument("--workers", type=int, default=2, help="for cluster variants")
+    parser.add_argument("--students", type=int, default=1_000)
+    parser.add_argument("--teachers", type=int, default=2)
+    parser.add_argument("--minutes", type=int, default=10, help="simulated minutes")
+    parser.add_argument("--time-scale", type=float, default=30.0)
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="in simulated seconds"
+    )
+    parser.add_argument("--teacher-mode", choices=("push", "poll"), default="push")
+    args = parser.parse_args()
+
+    with _target(args) as (url, pid):
+        generator = LoadGenerator(
+            url,
+            args.students,
+            args.teachers,
+            args.minutes,
+            args.time_scale,
+            args.jitter,
+            args.teacher_mode,
+        )
+        sampler = _MemorySampler(pid) if pid is not None else None
+        with sampler or contextlib.nullcontext():
+            stats = asyncio.run(generator.run())
+
+    print(
+        f"{args.students:,} students, {args.teachers} teachers ({args.teacher_mode}), {args.minutes} minutes:"
+    )
+    for kind in ("grades", "screenshots", "teacher"):
+        print(stats.get(kind, _Stats()).report(kind))
+    if sampler is not None:
+        print(sampler.report())
+
+
+if __name__ == "__main__":
+    main()
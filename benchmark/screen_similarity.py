@@ -0,0 +1,101 @@
+"""Benchmarks comparing the screenshot slices of a class with the teacher's.
+
+The slices of each student are compared one by one as the teacher-end used to,
+and then all at once as an N x 36 matrix; so are the 64-bit fingerprints as an
+N x 1 matrix of uint64. Run with
+
+    python -m benchmark.screen_similarity --students 1000
+"""
+
+import argparse
+import json
+import math
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from screenshot.similarity import (
+    compare_similarity_of_many_fingerprints,
+    compare_similarity_of_many_slices,
+    fingerprint_from_hex,
+)
+
+
+def _compare_one_by_one(
+    screenshots: List[List[float]], teacher_slices: np.ndarray
+) -> List[float]:
+    similarities: List[float] = []
+    for slices in screenshots:
+        diff = np.array(slices).astype(np.float64) - teacher_slices
+        rms = math.sqrt(sum(np.square(diff)) / 36)
+        similarities.append(1 - rms / 255)
+    return similarities
+
+
+def _compare_at_once(
+    screenshots: List[List[float]], teacher_slices: np.ndarray
+) -> List[float]:
+    return compare_similarity_of_many_slices(
+        np.array(screenshots, dtype=np.float64), teacher_slices
+    ).tolist()
+
+
+def _compare_fingerprints_at_once(
+    fingerprints: List[str], teacher_fingerprint: np.ndarray
+) -> List[float]:
+    return compare_similarity_of_many_fingerprints(
+        np.stack([fingerprint_from_hex(text) for text in fingerprints]),
+        teacher_fingerprint,
+    ).tolist()
+
+
+def _best_of(repeat: int, compare: Callable[[], List[float]]) -> float:
+    """Returns the shortest time in seconds."""
+    elapsed: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compare()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def run(students: int, repeat: int) -> None:
+    rng = np.random.default_rng(0)
+    # as they're received from the server, lists decoded from JSON
+    screenshots = rng.uniform(0, 255, (students, 36)).tolist()
+    teacher_slices = rng.uniform(0, 255, 36)
+
+    np.testing.assert_allclose(
+        _compare_one_by_one(screenshots, teacher_slices),
+        _compare_at_once(screenshots, teacher_slices),
+    )
+    for name, compare in (
+        ("one by one", _compare_one_by_one),
+        ("at once", _compare_at_once),
+    ):
+        elapsed = _best_of(repeat, lambda: compare(screenshots, teacher_slices))
+        print(f"  {name:<12} {elapsed * 1e3:8.2f} ms")
+
+    fingerprints = [f"{rng.integers(2**63):016x}" for _ in range(students)]
+    teacher_fingerprint = fingerprint_from_hex(f"{rng.integers(2**63):016x}")
+    elapsed = _best_of(
+        repeat,
+        lambda: _compare_fingerprints_at_once(fingerprints, teacher_fingerprint),
+    )
+    print(f"  {'fingerprint':<12} {elapsed * 1e3:8.2f} ms")
+    # as JSON, a list of 36 integers as students send against 16 hex digits
+    print(
+        f"  {len(json.dumps([round(x) for x in screenshots[0]]))} bytes of slices vs"
+        f" {len(fingerprints[0]) + 2} bytes of fingerprint per student"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=5, help="best of")
+    args = parser.parse_args()
+
+    print(f"{args.students:,} students:")
+    run(args.students, args.repeat)
@@ -0,0 +1,74 @@
+"""Benchmarks the ingestion throughput of the server under concurrent posters.
+
+Each poster is a thread which posts grades through its own Flask test client,
+so the HTTP stack is skipped and what's measured is the request handling and
+the storage layer. Run with
+
+    python -m benchmark.server_ingest --posters 32 --posts 500
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import server.main as flask_server
+
+
+def _post_grades(student_id: str, posts: int) -> List[float]:
+    """Returns the latency of each post in seconds."""
+    client = flask_server.app.test_client()
+    latencies: List[float] = []
+    for i in range(posts):
+        grade = {
+            "id": student_id,
+            "time": "2022-05-20, 10:00:00",
+            "start": i,
+            "end": i + 60,
+            "grade": 0.8,
+        }
+        start = time.perf_counter()
+        client.post("/student/grades", json=grade)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(posters: int, posts: int) -> None:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=posters) as executor:
+        results = executor.map(
+            _post_grades, map(str, range(posters)), [posts] * posters
+        )
+        latencies = sorted(lat for result in results for lat in result)
+    elapsed = time.perf_counter() - start
+    # the records are not durable until the journal is flushed
+    flask_server.store.close()
+    flushed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"  {len(latencies):,} posts in {elapsed:.2f} s ({len(latencies) / elapsed:,.0f} posts/s)"
+    )
+    print(
+        f"  latency p50 {quantiles[49] * 1e3:.2f} ms, p99 {quantiles[98] * 1e3:.2f} ms"
+    )
+    if flushed - elapsed > 1e-3:
+        print(f"  all committed after {flushed:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posters", type=int, default=32, help="concurrent posters")
+    parser.add_argument("--posts", type=int, default=500, help="posts per poster")
+    args = parser.parse_args()
+
+    print("in memory:")
+    run(args.posters, args.posts)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print("persisted with SQLite WAL:")
+        flask_server.persist_to(str(Path(tmp_dir) / "records.db"))
+        run(args.posters, args.posts)
+        flask_server.store.close()
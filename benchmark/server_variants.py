@@ -0,0 +1,115 @@
+"""Compares the server variants under thousands of concurrent clients.
+
+Every variant is started as a separate process on localhost. Then the clients,
+which are coroutines of this process, post grades all at the same time, as the
+students do at the turn of every minute, while the teachers keep long-polling
+for the new grades. Run with
+
+    python -m benchmark.server_variants --clients 2000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List, Tuple
+
+import aiohttp
+
+from benchmark.servers import VARIANTS, port_of, spawned_server
+
+
+async def _post_grades(
+    session: aiohttp.ClientSession, url: str, student_id: str, posts: int
+) -> Tuple[List[float], int]:
+    """Returns the latencies of the successful posts and the number of errors."""
+    latencies: List[float] = []
+    errors = 0
+    for i in range(posts):
+        grade = {"id": student_id, "time": "2022-05-20, 10:00:00", "grade": 0.8}
+        start = time.perf_counter()
+        try:
+            async with session.post(f"{url}/student/grades", json=grade) as r:
+                await r.read()
+                r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            errors += 1
+    return latencies, errors
+
+
+async def _listen(session: aiohttp.ClientSession, url: str, until: float) -> int:
+    """Long-polls the grades until the time; returns the number of grades got."""
+    # the form of cursor depends on the server, start from the initial one
+    params = {"genre": "grades", "timeout": 1}
+    received = 0
+    while time.monotonic() < until:
+        try:
+            async with session.get(f"{url}/teacher/events", params=params) as r:
+                r.raise_for_status()
+                events = await r.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+        params["cursor"] = events["cursor"]
+        received += len(events["grades"])
+    return received
+
+
+async def _load(url: str, clients: int, posts: int, teachers: int) -> None:
+    # no limit on connections, so every client has its own
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        start = time.perf_counter()
+        listeners = [
+            asyncio.ensure_future(_listen(session, url, time.monotonic() + 5))
+            for _ in range(teachers)
+        ]
+        results = await asyncio.gather(
+            *(_post_grades(session, url, str(i), posts) for i in range(clients))
+        )
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*listeners)
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(err for _, err in results)
+    print(
+        f"  {len(latencies):,} posts in {elapsed:.2f} s ({len(latencies) / elapsed:,.0f} posts/s), {errors} errors"
+    )
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"  latency p50 {quantiles[49] * 1e3:.1f} ms, p99 {quantiles[98] * 1e3:.1f} ms"
+        )
+
+
+def run(variant: str, clients: int, posts: int, teachers: int, workers: int) -> None:
+    with spawned_server(variant, workers) as server:
+        print(f"{variant}:")
+        url = f"http://127.0.0.1:{port_of(server)}"
+        asyncio.run(_load(url, clients, posts, teachers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--clients", type=int, default=2_000, help="concurrent students"
+    )
+    parser.add_argument("--posts", type=int, default=5, help="posts per student")
+    parser.add_argument(
+        "--teachers", type=int, default=10, help="long-polling teachers"
+    )
+    parser.add_argument(
+        "--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS)
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes of the cluster variants",
+    )
+    args = parser.parse_args()
+
+    for variant in args.variants:
+        run(variant, args.clients, args.posts, args.teachers, args.workers)
@@ -0,0 +1,120 @@
+"""Helpers to start the server variants for the benchmarks."""
+
+import asyncio
+import contextlib
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List
+
+# the command line arguments to start each variant with
+VARIANTS: Dict[str, List[str]] = {
+    # in memory, so only the difference of the servers is compared
+    "flask": ["-m", "server.main", "--database", ""],
+    "asyncio": ["-m", "server.async_main", "--database", ""],
+    # the workers have to share the records through the disk
+    "flask-cluster": ["-m", "server.cluster", "--variant", "flask"],
+    "asyncio-cluster": ["-m", "server.cluster", "--variant", "asyncio"],
+}
+# those which can be run in the benchmarking process itself
+IN_PROCESS_VARIANTS = ("flask", "asyncio")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_listening(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"server on port {port} doesn't start in {timeout} s")
+
+
+@contextlib.contextmanager
+def spawned_server(variant: str, workers: int = 1) -> Iterator[subprocess.Popen]:
+    """Starts the variant as a separate process on localhost.
+
+    Yields:
+        The process, whose port is in its args.
+    """
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        command = [sys.executable, *VARIANTS[variant], "--port", str(port)]
+        if variant.endswith("cluster"):
+            command += ["--workers", str(workers), "--database-dir", tmp_dir]
+        server = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_listening(port)
+            yield server
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def port_of(server: subprocess.Popen) -> int:
+    args = list(server.args)  # type: ignore[arg-type]
+    return int(args[args.index("--port") + 1])
+
+
+@contextlib.contextmanager
+def in_process_server(variant: str) -> Iterator[int]:
+    """Serves the variant with records in memory by a thread of this process.
+
+    Yields:
+        The port it listens to.
+    """
+    from server.store import RecordStore
+    import server.main as flask_server
+
+    port = free_port()
+    store = RecordStore(flask_server.GENRES)
+    if variant == "flask":
+        from werkzeug.serving import make_server
+
+        # the store of the module is swapped for the run only
+        origin = flask_server.store
+        flask_server.store = store
+        try:
+            httpd = make_server("127.0.0.1", port, flask_server.app, threaded=True)
+            thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+            thread.start()
+            try:
+                yield port
+            finally:
+                httpd.shutdown()
+        finally:
+            flask_server.store = origin
+    elif variant == "asyncio":
+        from aiohttp import web
+
+        from server.async_main import create_app
+
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(create_app(store))
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(
+            web.TCPSite(runner, "127.0.0.1", port, backlog=1024).start()
+        )
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            yield port
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.run_until_complete(runner.cleanup())
+            loop.close()
+    else:
+        raise ValueError(f"variant should be one of {IN_PROCESS_VARIANTS}")
@@ -0,0 +1,192 @@
+"""Benchmarks the startup of the Student-end, up to the first webcam frame.
+
+Each run starts a new interpreter which starts the application as main.py does
+and reports, since the process is spawned, when the modules are imported, when
+the window is shown and when the first frame is shown. A cold run compiles the
+modules from scratch with an empty bytecode cache; the warm ones reuse it.
+With --revision, the tree of that git revision is measured as well, e.g., the
+one before the heavy dependencies are loaded lazily.
+
+--audit lists the modules which take the longest to import, by -X importtime.
+Run with
+
+    python -m benchmark.startup --revision HEAD~1
+    python -m benchmark.startup --audit
+"""
+
+import argparse
+import contextlib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the milestones in seconds since the epoch; exits on the first frame.
+_CHILD = """
+import os, sys, time
+from PyQt5.QtCore import QObject, pyqtSlot
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QApplication
+
+from app.webcam_application import WebcamApplication
+from gui.window_controller import WindowController
+from gui.window import Window
+print("imported", time.time(), flush=True)
+
+
+class Probe(QObject):
+    @pyqtSlot(QImage)
+    def on_frame(self, _):
+        print("frame", time.time(), flush=True)
+        os._exit(0)
+
+
+app = QApplication(sys.argv)
+window = Window()
+webcam_app = WebcamApplication()
+probe = Probe()
+webcam_app.s_frame_refreshed.connect(probe.on_frame)
+controller = WindowController(window, webcam_app)
+window.show()
+print("shown", time.time(), flush=True)
+app.exec_()
+"""
+
+MILESTONES = ("imported", "shown", "frame")
+# the heavy dependencies which the startup shouldn't import
+HEAVY_MODULES = ("tensorflow", "mtcnn", "sklearn", "skfuzzy", "matplotlib")
+
+
+def _run_once(cwd: str, pycache: str, timeout: float) -> Dict[str, float]:
+    """Returns the seconds since the spawn of each milestone reached."""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache, PYTHONPATH=cwd)
+    spawned_at = time.time()
+    child = subprocess.Popen(
+        [sys.executable, "-c", _CHILD],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    reached: Dict[str, float] = {}
+    # without a webcam, there's no frame; the child is killed on timeout, which
+    # ends its output
+    killer = threading.Timer(timeout, child.kill)
+    killer.start()
+    try:
+        assert child.stdout is not None
+        for line in child.stdout:
+            # the application prints as well
+            name, _, moment = line.partition(" ")
+            if name not in MILESTONES:
+                continue
+            reached[name] = float(moment) - spawned_at
+            if name == MILESTONES[-1]:
+                break
+    finally:
+        killer.cancel()
+        child.kill()
+        child.wait()
+    return reached
+
+
+def _report(label: str, runs: List[Dict[str, float]]) -> None:
+    cells: List[str] = []
+    for name in MILESTONES:
+        times = [run[name] for run in runs if name in run]
+        cells.append(
+            f"{name} {statistics.median(times) * 1e3:7.0f} ms" if times else f"{name} -"
+        )
+    print(f"  {label:<5} " + ", ".join(cells))
+
+
+def measure(cwd: str, repeat: int, timeout: float) -> None:
+    with tempfile.TemporaryDirectory() as pycache:
+        cold = _run_once(cwd, pycache, timeout)
+        warm = [_run_once(cwd, pycache, timeout) for _ in range(repeat)]
+    _report("cold", [cold])
+    _report("warm", warm)
+
+
+@contextlib.contextmanager
+def _worktree_of(revision: str) -> Iterator[str]:
+    """Checks out the revision into a temporary worktree."""
+    with tempfile.TemporaryDirectory() as parent:
+        path = os.path.join(parent, "tree")
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", path, revision],
+            cwd=ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            yield path
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", path], cwd=ROOT, check=True
+            )
+
+
+def audit(top: int) -> None:
+    """Prints the top-level modules which take the longest to import."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import app.webcam_application, gui.window_controller, gui.window",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    # "import time: self [us] | cumulative | imported package"
+    modules: List[Tuple[int, str]] = []
+    imported: Set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imported.add(name.strip().split(".")[0])
+        # the nested ones are indented
+        if not name.startswith("  "):
+            modules.append((int(cumulative), name.strip()))
+    for cumulative, name in sorted(modules, reverse=True)[:top]:
+        print(f"  {cumulative / 1e3:8.1f} ms  {name}")
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    print(f"heavy modules imported on startup: {', '.join(heavy) or 'none'}")
+    if result.returncode:
+        print(result.stderr.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="of the warm runs")
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="in seconds, of a run"
+    )
+    parser.add_argument("--revision", help="the git revision to compare with")
+    parser.add_argument("--audit", action="store_true", help="list slow imports")
+    parser.add_argument("--top", type=int, default=20, help="of --audit")
+    args = parser.parse_args()
+
+    if args.audit:
+        audit(args.top)
+    else:
+        revision: Optional[str] = args.revision
+        if revision is not None:
+            print(f"{revision}:")
+            with _worktree_of(revision) as tree:
+                measure(tree, args.repeat, args.timeout)
+        print("working tree:")
+        measure(ROOT, args.repeat, args.timeout)
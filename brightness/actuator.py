@@ -0,0 +1,164 @@
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class BrightnessBackend(ABC):
+    """Writes the brightness to the screen."""
+
+    @abstractmethod
+    def set_brightness(self, value: int) -> None:
+        """
+        Arguments:
+            value: Between 0 and 100.
+        """
+
+
+class ScreenBrightnessControlBackend(BrightnessBackend):
+    """Writes through screen_brightness_control, which is imported on first
+    write, so the other backends work without it.
+    """
+
+    def __init__(self, method: Optional[str] = "wmi") -> None:
+        """
+        Arguments:
+            method: The method of screen_brightness_control, e.g., "wmi" for the
+                built-in displays of laptops on Windows; None to let it decide.
+        """
+        self._method = method
+
+    def set_brightness(self, value: int) -> None:
+        import screen_brightness_control as sbc
+
+        sbc.set_brightness(value, method=self._method)
+
+
+class RecordingBackend(BrightnessBackend):
+    """Writes nothing but records the values, with their time, for tests and
+    benchmarks on platforms without a controllable screen.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Arguments:
+            latency: In seconds, how long a write blocks, to simulate a slow one.
+        """
+        self._latency = latency
+        self._cond = threading.Condition()
+        self._writes: List[Tuple[float, int]] = []
+
+    @property
+    def writes(self) -> List[Tuple[float, int]]:
+        """(time.monotonic(), value) of the writes, in order."""
+        with self._cond:
+            return list(self._writes)
+
+    def set_brightness(self, value: int) -> None:
+        if self._latency:
+            time.sleep(self._latency)
+        with self._cond:
+            self._writes.append((time.monotonic(), value))
+            self._cond.notify_all()
+
+    def wait_for_writes(self, count: int, timeout: float) -> bool:
+        """Returns whether there are at least count writes within the timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self._writes) >= count, timeout)
+
+
+BACKENDS: Dict[str, Callable[[], BrightnessBackend]] = {
+    "wmi": lambda: ScreenBrightnessControlBackend("wmi"),
+    "sbc": lambda: ScreenBrightnessControlBackend(None),
+    "fake": RecordingBackend,
+}
+
+
+class BrightnessActuator:
+    """Applies the brightness targets to the screen through a backend, on a
+    single thread, so a slow write doesn't block the one who requests it.
+
+    A target is written only if it differs from the last written one by at
+    least step (hysteresis), and at most once per min_interval seconds (rate
+    limit). Targets requested in the meantime are coalesced: only the latest
+    one is written.
+    """
+
+    def __init__(
+        self,
+        backend: BrightnessBackend,
+        step: int = 2,
+        min_interval: float = 1.0,
+        name: str = "brightness-actuator",
+    ) -> None:
+        """
+        Arguments:
+            backend: Where the brightness is written.
+            step: The least change of brightness to write.
+            min_interval: In seconds, the least time between two writes.
+        """
+        self._backend = backend
+        self.step = step
+        self.min_interval = min_interval
+        self._cond = threading.Condition()
+        # the target to write; None if there's none pending
+        self._target: Optional[int] = None
+        self._written: Optional[int] = None
+        self._written_at = -float("inf")
+        self._f_running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def request(self, value: int) -> bool:
+        """Requests the brightness to be the value; never blocks on the write.
+
+        Returns:
+            False if the value is too close to the last written one to write.
+        """
+        with self._cond:
+            if self._written is not None and abs(value - self._written) < self.step:
+                # a pending target, if any, is outdated as well
+                self._target = None
+                return False
+            self._target = value
+            self._cond.notify()
+            return True
+
+    def stop(self) -> None:
+        """Stops the thread after the running write, if any, returns; the
+        pending target is dropped.
+        """
+        with self._cond:
+            self._f_running = False
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _next_target(self) -> Optional[int]:
+        """Blocks until a target is due; None if the actuator is stopped."""
+        with self._cond:
+            while self._f_running:
+                if self._target is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._written_at + self.min_interval - time.monotonic()
+                if remaining <= 0:
+                    target, self._target = self._target, None
+                    # the requests from now on are compared with it
+                    self._written = target
+                    self._written_at = time.monotonic()
+                    return target
+                self._cond.wait(remaining)
+            return None
+
+    def _run(self) -> None:
+        while True:
+            target = self._next_target()
+            if target is None:
+                return
+            try:
+                self._backend.set_brightness(target)
+            except Exception:
+                # e.g., the screen doesn't support it; the next may succeed
+                traceback.print_exc()
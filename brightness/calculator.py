@@ -1,12 +1,11 @@
+import math
 from enum import Enum, auto
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional
 
 import cv2
 import dlib
 import numpy as np
-import numpy.ma as ma
 from imutils import face_utils
-from nptyping import NDArray
 
 from util.image_type import ColorImage
 
@@ -41,6 +40,12 @@ class BrightnessCalculator:
     def get_mode(self) -> BrightnessMode:
         return self._mode
 
+    def get_next_mode(self) -> BrightnessMode:
+        """Returns the mode the next calculation is in, which is not yet the
+        current one right after a mode change.
+        """
+        return self._mode_change_list[0] if self._mode_change_list else self._mode
+
     def set_mode(self, new_mode: BrightnessMode) -> None:
         self._mode_change_list.append(new_mode)
 
@@ -149,32 +154,25 @@ class BrightnessCalculator:
 
         Arguments:
             frame: The image to perform brightness calculation on.
-            face: If provided, the non-face area of the frame is masked.
+            face: If provided, the face area of the frame is excluded.
         """
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        # Value is as known as brightness.
-        *_, value = cv2.split(hsv)
+        # Value is as known as brightness, which is the max of B, G and R;
+        # the same as the value channel of HSV, without the other 2 channels.
+        value = np.maximum(frame[..., 0], frame[..., 1])
+        np.maximum(value, frame[..., 2], out=value)
+        total: float = cv2.sumElems(value)[0]
+        count: int = value.size
 
         if face is not None:
-            mask = BrightnessCalculator._generate_face_mask(face, value.shape)
-            masked_arr = ma.masked_array(value, mask)
-            # truncate masked constants
-            value = masked_arr.compressed()
-        return 100 * value.mean() / 255
-
-    @staticmethod
-    def _generate_face_mask(
-        face: Optional[dlib.rectangle], frame_shape: Tuple[int, int, int]
-    ) -> NDArray:
-        """Gets the boundaries of face area and generates the value with
-        corresponding elements masked.
-        """
-        # get the four corners of face
-        fx, fy, fw, fh = face_utils.rect_to_bb(face)
-        # generate mask with face area masked
-        face_mask = np.zeros(frame_shape, dtype=np.bool8)
-        face_mask[fy : fy + fh + 1, fx : fx + fw + 1] = True
-        return face_mask
+            # the face area is subtracted instead of masked out, which saves
+            # the mask and the copy of the rest
+            fx, fy, fw, fh = face_utils.rect_to_bb(face)
+            face_value = value[fy : fy + fh + 1, fx : fx + fw + 1]
+            total -= cv2.sumElems(face_value)[0]
+            count -= face_value.size
+        if not count:
+            return math.nan
+        return 100 * total / count / 255
 
     @staticmethod
     def _clamp_between_zero_and_hundred(value: float) -> float:
@@ -1,31 +1,43 @@
 from typing import Dict, Optional
 
 import dlib
-import screen_brightness_control as sbc
 
+from brightness.actuator import BrightnessActuator, ScreenBrightnessControlBackend
 from brightness.calculator import BrightnessCalculator, BrightnessMode
-from screenshot.compare import get_screenshot
+from screenshot.capture import shared_screen_capture
 from util.image_type import ColorImage
 
 
 class BrightnessController:
     """Store arguments and controls the optimizing method."""
 
-    def __init__(self, base_value: int, mode: BrightnessMode) -> None:
+    def __init__(
+        self,
+        base_value: int,
+        mode: BrightnessMode,
+        actuator: Optional[BrightnessActuator] = None,
+    ) -> None:
         """
-        All arguments can be set later with their corresponding setters.
+        All arguments except the actuator can be set later with their
+        corresponding setters.
 
         Arguments:
             base_value:
                 The user's screen brightness preference.
                 Brightness will be fine-tuned based on the base value.
             mode: The attribute affecting the algorithm of optimizing method.
+            actuator:
+                Writes the brightness to the screen. One which writes through
+                WMI is created if not provided.
         """
         super().__init__()
 
         # frame dict is empty if no frame passed
         self._frames: Dict[BrightnessMode, ColorImage] = {}
         self._brightness_calculator = BrightnessCalculator(mode, base_value)
+        if actuator is None:
+            actuator = BrightnessActuator(ScreenBrightnessControlBackend("wmi"))
+        self._actuator = actuator
 
     def set_mode(self, new_mode: BrightnessMode) -> None:
         """
@@ -57,8 +69,18 @@ class BrightnessController:
     def _refresh_color_system_screenshot(self) -> None:
         """Takes a screenshot of the current screen and sets it as the frame of
         COLOR_SYSTEM mode.
+
+        The screen changes much slower than the webcam frames come, so the
+        screenshot is a cached one of the shared capture most of the time, and
+        none is taken if the mode doesn't need it.
         """
-        self._frames[BrightnessMode.COLOR_SYSTEM] = get_screenshot()
+        needed = self._brightness_calculator.get_next_mode() in (
+            BrightnessMode.COLOR_SYSTEM,
+            BrightnessMode.BOTH,
+        )
+        # the mode may still change right before the calculation
+        if needed or BrightnessMode.COLOR_SYSTEM not in self._frames:
+            self._frames[BrightnessMode.COLOR_SYSTEM] = shared_screen_capture().get()
 
     def optimize_brightness(
         self, frame: ColorImage, face: Optional[dlib.rectangle]
@@ -66,6 +88,9 @@ class BrightnessController:
         """Sets brightness of screen to a suggested brightness with respect to
         mode, the base value and frames.
 
+        The brightness is written asynchronously by the actuator, which skips
+        it if it's too close to the current one.
+
         Returns:
             The brightness value after optimization.
         """
@@ -79,5 +104,5 @@ class BrightnessController:
                 self._frames, face
             )
         )
-        sbc.set_brightness(optimized_brightness, method="wmi")
+        self._actuator.request(optimized_brightness)
         return optimized_brightness
@@ -1,11 +1,20 @@
 # Please read the example of tipping problem before playing with this file.
 # https://pythonhosted.org/scikit-fuzzy/auto_examples/plot_tipping_problem_newapi.html
 
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+
+from util.lazy_import import lazy_import
+
+
+if TYPE_CHECKING:
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+else:
+    # imported on the first grading
+    fuzz = lazy_import("skfuzzy")
+    ctrl = lazy_import("skfuzzy.control")
 
 
 class FuzzyGrader:
@@ -103,7 +112,7 @@ class FuzzyGrader:
         self._grade["medium"] = fuzz.trimf(self._grade.universe, [0, 6, 10])
         self._grade["low"] = fuzz.trimf(self._grade.universe, [0, 0, 6])
 
-    def _create_fuzzy_rules(self) -> List[ctrl.Rule]:
+    def _create_fuzzy_rules(self) -> "List[ctrl.Rule]":
         """Returns the fuzzy rule that controls the grade."""
         rule1 = ctrl.Rule(
             # at least two poors to lead to poor
@@ -152,8 +161,6 @@ class FuzzyGrader:
 import argparse
 from enum import Enum, auto, unique
 
-import matplotlib.pyplot as plt
-
 
 @unique
 class _InteractiveMode(Enum):
@@ -164,6 +171,8 @@ class _InteractiveMode(Enum):
 
 
 def interact(mode: _InteractiveMode) -> None:
+    import matplotlib.pyplot as plt
+
     fuzzy_grader = FuzzyGrader()
 
     if mode is _InteractiveMode.MEMBERSHIP:
@@ -1,14 +1,21 @@
 import json
 import math
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
 
 import numpy as np
-import matplotlib.pyplot as plt
 
 from concentration.fuzzy.classes import Interval
+from util.lazy_import import lazy_import
 from util.time import to_date_time
 
 
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+else:
+    # only the charts need it
+    plt = lazy_import("matplotlib.pyplot")
+
+
 def save_chart_of_intervals(filename: str, intervals: List[Interval]) -> None:
     if not intervals:
         raise ValueError("intervals can't be empty")
@@ -1,8 +1,8 @@
 import math
-from functools import partial
+from functools import cached_property
 from typing import Optional, Tuple
 
-from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import QMetaObject, QObject, Qt, QTimer, pyqtSignal, pyqtSlot
 from nptyping import Int, NDArray
 
 from blink.detector import BlinkDetector
@@ -32,6 +32,9 @@ class ConcentrationGrader(QObject):
     - Body concentration, which is the posture
     - Face existence, whether the user is in front of the screen
 
+    It may be created in a thread without an event loop, e.g., of startup, and
+    moved to one with moveToThread(); its timers start in the thread it lives in.
+
     Signals:
         s_concent_interval_refreshed:
             Emits when an interval is recorded and sends that interval.
@@ -60,7 +63,9 @@ class ConcentrationGrader(QObject):
         super().__init__()
         self._blink_detector = BlinkDetector()
 
+        # the criteria which are QObjects are children, so they're moved along
         self._interval_detector = BlinkRateIntervalDetector(good_rate_range)
+        self._interval_detector.setParent(self)
         self._interval_detector.s_interval_detected.connect(
             self._push_interval_to_grade_into_heap
         )
@@ -68,23 +73,18 @@ class ConcentrationGrader(QObject):
         # Since the append of blinks is sparse, we need a timer to periodically
         # sync its windows up.
         self._interval_timer = QTimer(self)
-        self._interval_timer.timeout.connect(self._interval_detector.check_blink_rate)
-        self._interval_timer.start(1_000)
+        self._interval_timer.setInterval(1_000)
+        self._interval_timer.timeout.connect(self._check_blink_rate)
 
         self._body_concent_counter = BodyConcentrationCounter()
 
         self._face_existence_counter = FaceExistenceRateCounter(low_existence)
+        self._face_existence_counter.setParent(self)
         self._face_existence_counter.s_low_existence_detected.connect(
-            partial(
-                self._push_interval_to_grade_into_heap,
-                interval_type=IntervalType.LOW_FACE,
-            )
+            self._push_low_face_interval_into_heap
         )
 
         self._face_center_counter = FaceCenterCounter(ONE_MIN)
-        self._center_calculator = CenterCalculator()
-
-        self._fuzzy_grader = FuzzyGrader()
 
         # Min heaps that store the intervals to grade.
         # The in-times has the REAL_TIME and LOW_FACEs, which are in the current
@@ -96,8 +96,42 @@ class ConcentrationGrader(QObject):
         self._last_end_time: int = 0
 
         self._process_timer = QTimer(self)
+        self._process_timer.setInterval(1_000)
         self._process_timer.timeout.connect(self._grade_intervals)
-        self._process_timer.start(1_000)
+        self._f_grading = True
+        # posted to the thread it lives in, and moved along with it
+        QMetaObject.invokeMethod(self, "_start_timers", Qt.QueuedConnection)
+
+    # The calculator and grader are created by warm_up(), or on the first
+    # grading if it's not called, so scikit-learn and scikit-fuzzy aren't
+    # imported on the GUI thread.
+
+    def warm_up(self) -> None:
+        """Creates the center calculator and the fuzzy grader, which imports
+        scikit-learn and scikit-fuzzy and builds the control system; takes
+        seconds, so it should be called from a background thread.
+        """
+        self._center_calculator
+        self._fuzzy_grader
+
+    @cached_property
+    def _center_calculator(self) -> CenterCalculator:
+        return CenterCalculator()
+
+    @cached_property
+    def _fuzzy_grader(self) -> FuzzyGrader:
+        return FuzzyGrader()
+
+    @pyqtSlot()
+    def _start_timers(self) -> None:
+        self._interval_timer.start()
+        # unless stopped before
+        if self._f_grading:
+            self._process_timer.start()
+
+    @pyqtSlot()
+    def _check_blink_rate(self) -> None:
+        self._interval_detector.check_blink_rate()
 
     def detect_blink(self, landmarks: NDArray[(68, 2), Int[32]]) -> None:
         self._blink_detector.detect_blink(landmarks)
@@ -119,6 +153,12 @@ class ConcentrationGrader(QObject):
     def add_face_center(self, center: Tuple[float, float]) -> None:
         self._face_center_counter.add_face_center(center)
 
+    # Slots of the grader itself instead of lambdas or partials, whose
+    # connections would stay in the thread it's created in.
+    @pyqtSlot(Interval)
+    def _push_low_face_interval_into_heap(self, interval: Interval) -> None:
+        self._push_interval_to_grade_into_heap(interval, IntervalType.LOW_FACE)
+
     @pyqtSlot(Interval, IntervalType)
     @pyqtSlot(Interval, IntervalType, int)
     def _push_interval_to_grade_into_heap(
@@ -141,6 +181,7 @@ class ConcentrationGrader(QObject):
 
     def start_grading(self) -> None:
         """Starts the grader if it is stopped."""
+        self._f_grading = True
         if not self._process_timer.isActive():
             self._process_timer.start()
 
@@ -148,6 +189,7 @@ class ConcentrationGrader(QObject):
         """Stops the grader and clears all windows of criteria,
         which means the current interval is thrown away.
         """
+        self._f_grading = False
         self._process_timer.stop()
         for window_type in WindowType:
             self._clear_windows(window_type)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+import cv2
+import numpy as np
+from nptyping import Int, NDArray
+
+from util.image_type import ColorImage
+
+
+Landmarks = NDArray[(68, 2), Int[32]]
+
+
+class ReferenceCache:
+    """Caches the landmarks of reference images in a small JSON file, keyed by
+    the hash of the image content and the hash of the model, so the detection
+    is skipped when neither changes, even across launches.
+
+    A reference image which fails the detection, e.g., with no or several
+    faces, is cached as well, so it fails again right away.
+
+    The hash of the model, which is large, is cached by its size and time of
+    modification instead of hashing it on every launch.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_file: str, model_file: str, max_entries: int = 16) -> None:
+        """
+        Arguments:
+            cache_file: Where the cache is stored; created on first store.
+            model_file: The shape predictor the landmarks are detected with.
+            max_entries: The least recently stored ones are dropped beyond it.
+        """
+        self._cache_file = cache_file
+        self._model_file = model_file
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def get_or_detect(
+        self, image_path: str, detect: Callable[[ColorImage], Landmarks]
+    ) -> Landmarks:
+        """Returns the landmarks of the image, detected by detect() only if
+        they're not cached.
+
+        Arguments:
+            detect: Raises ValueError if the landmarks can't be detected.
+
+        Raises:
+            OSError: The image can't be read.
+            ValueError: The detection failed, now or when it was cached.
+        """
+        with open(image_path, "rb") as f:
+            content = f.read()
+        key = f"{hashlib.sha256(content).hexdigest()}:{self._model_hash()}"
+
+        with self._lock:
+            entry = self._data["entries"].get(key)
+        if entry is None:
+            image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+            try:
+                if image is None:
+                    raise ValueError("the reference image can't be decoded")
+                landmarks = detect(image)
+            except ValueError as e:
+                self._store(key, {"error": str(e)})
+                raise
+            self._store(key, {"landmarks": landmarks.tolist()})
+            return landmarks
+
+        if "error" in entry:
+            raise ValueError(entry["error"])
+        return np.array(entry["landmarks"])
+
+    def _model_hash(self) -> str:
+        stat = os.stat(self._model_file)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            model = self._data["model"]
+            if model.get("signature") == signature:
+                return model["hash"]
+
+        digest = hashlib.sha256()
+        with open(self._model_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._data["model"] = {"signature": signature, "hash": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def _store(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            entries = self._data["entries"]
+            entries[key] = entry
+            entries.move_to_end(key)
+            while len(entries) > self._max_entries:
+                entries.popitem(last=False)
+            try:
+                self._dump()
+            except OSError:
+                # detects again next time, which isn't worth failing for
+                traceback.print_exc()
+
+    def _load(self) -> Dict[str, Any]:
+        empty: Dict[str, Any] = {"model": {}, "entries": OrderedDict()}
+        try:
+            with open(self._cache_file, mode="r", encoding="utf-8") as f:
+                data = json.load(f, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            # not stored yet or broken, which is rebuilt by detecting again
+            return empty
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            return empty
+        return {"model": data["model"], "entries": data["entries"]}
+
+    def _dump(self) -> None:
+        # written to a temporary file first, so a crash never leaves a
+        # half-written cache
+        temp_file = f"{self._cache_file}.tmp"
+        with open(temp_file, mode="w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, **self._data}, f)
+        os.replace(temp_file, self._cache_file)
@@ -1,8 +1,16 @@
 from collections import Counter
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Tuple
 
 import numpy as np
-from sklearn import cluster
+
+from util.lazy_import import lazy_import
+
+
+if TYPE_CHECKING:
+    from sklearn import cluster
+else:
+    # imported on the first fit
+    cluster = lazy_import("sklearn.cluster")
 
 
 class CenterCalculator:
@@ -27,7 +35,7 @@ class CenterCalculator:
         return (float(np.sum(x)) / l, float(np.sum(y)) / l)
 
     @property
-    def mean_shift(self) -> cluster.MeanShift:
+    def mean_shift(self) -> "cluster.MeanShift":
         return self._ms
 
     @property
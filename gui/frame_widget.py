@@ -1,14 +1,31 @@
+import json
+from typing import Optional
+
 from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtCore import Qt, pyqtSlot
 from PyQt5.QtWidgets import QLabel, QWidget
 
 from gui.language import Language
+from util.path import to_abs_path
 
 
 class FrameWidget(QLabel):
     def __init__(self, parent: QWidget = None) -> None:
         super().__init__(parent)
         self.setStyleSheet("border: 1px solid black;")
+        # shows the loading text until the first frame comes, since the webcam
+        # and models are loaded after the window shows
+        self._f_loading = True
+        self.setText("Loading...")
+        # shown instead of the loading text if they fail to load
+        self._fail_text = "Failed to start:"
+        self._fail_reason: Optional[str] = None
+
+    @pyqtSlot(str)
+    def show_failure(self, reason: str) -> None:
+        """Shows why the webcam or models failed to load."""
+        self._fail_reason = reason
+        self.setText(f"{self._fail_text}\n{reason}")
 
     @pyqtSlot(QImage)
     def set_frame(self, frame: QImage) -> None:
@@ -21,6 +38,7 @@ class FrameWidget(QLabel):
         if not self.isVisible():
             # to save efficiency
             return
+        self._f_loading = False
         # This is a self-adjust way.
         # NOTE: If simply use self.frameGeometry().width(), the image will grow.
         #   Because the image is always as big as the widget and PyQt will
@@ -34,5 +52,14 @@ class FrameWidget(QLabel):
         )
 
     def change_language(self, lang: Language) -> None:
-        # frame widget has no text
-        pass
+        # the loading text, or the failure instead, is the only text
+        if not self._f_loading:
+            return
+        lang_file = to_abs_path(f"./gui/lang/{lang.name.lower()}.json")
+        with open(lang_file, mode="r", encoding="utf-8") as f:
+            lang_map = json.load(f)[type(self).__name__]
+        self._fail_text = lang_map["fail"]
+        if self._fail_reason is None:
+            self.setText(lang_map["loading"])
+        else:
+            self.show_failure(self._fail_reason)
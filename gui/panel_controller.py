@@ -102,6 +102,7 @@ class PanelController(QObject):
         panel.warning.toggled.connect(
             lambda checked: self._app.set_distance_measure(warning_enabled=checked)
         )
+        self._app.s_distance_measure_failed.connect(panel.show_failure)
 
     def _choose_file_path(self) -> None:
         panel = self._panel_widget.panels[ApplicationType.DISTANCE_MEASUREMENT]
@@ -16,6 +16,7 @@ from brightness.calculator import BrightnessMode
 from gui.component import (
     ActionButton,
     CheckableGroupBox,
+    FailMessageBox,
     HorizontalSlider,
     Label,
     LineEdit,
@@ -69,11 +70,19 @@ class DistancePanel(CheckableGroupBox):
         self._layout = QFormLayout()
         self.setLayout(self._layout)
 
+        self._fail_text = "Failed to load the reference image:"
         self._create_settings()
         self._set_restrictions()
 
+    def show_failure(self, reason: str) -> None:
+        """Shows why the reference image failed, without blocking the caller."""
+        # kept so the box isn't collected while it shows
+        self._fail_box = FailMessageBox(f"{self._fail_text}\n{reason}", self)
+        self._fail_box.open()
+
     def change_language(self, lang_map: Dict[str, str]) -> None:
         self.setTitle(lang_map["title"])
+        self._fail_text = lang_map["reference_fail"]
         self._file_path_layout.itemAt(0).widget().setText(lang_map["reference"])
         self.file_open.setText(lang_map["open"])
         self._layout.itemAt(1, QFormLayout.LabelRole).widget().setText(
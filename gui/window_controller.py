@@ -5,7 +5,6 @@ from typing import Dict, Tuple
 
 from PyQt5.QtCore import QObject
 import numpy as np
-import requests
 
 import concentration.fuzzy.parse as parse
 import server.main as flask_server
@@ -15,9 +14,10 @@ from concentration.fuzzy.classes import Interval
 from gui.language import Language
 from gui.panel_controller import PanelController
 from gui.window import Window
-from teacher.controller import DATE_STR_FORMAT
+from server.uploader import BatchUploader
 from util.path import to_abs_path
 from util.task_worker import TaskWorker
+from util.time import DATE_STR_FORMAT
 
 
 class WindowController(QObject):
@@ -34,6 +34,9 @@ class WindowController(QObject):
         self._connect_config_change()
 
         self._server_url = f"http://{flask_server.HOST}:{flask_server.PORT}"
+        # posts in the background, so the GUI isn't blocked by the server
+        self._uploader = BatchUploader(self._server_url)
+        atexit.register(self._uploader.close)
         self._connect_grade_output_routines()
         self._connect_slices_post()
 
@@ -60,6 +63,7 @@ class WindowController(QObject):
     def _connect_app_and_frame(self) -> None:
         frame = self._window.widgets["frame"]
         self._app.s_frame_refreshed.connect(frame.set_frame)
+        self._app.s_start_failed.connect(frame.show_failure)
 
     def _connect_information_and_panel(self) -> None:
         """First inits the show/hide state of information in accordance with the
@@ -117,27 +121,18 @@ class WindowController(QObject):
         # add new key info
         grade["time"] = datetime.fromtimestamp(interval.end).strftime(DATE_STR_FORMAT)
         grade["id"] = self._student_id
-        try:
-            requests.post(f"{self._server_url}/student/grades", json=grade)
-        except requests.ConnectionError:
-            # Skip posting if the connection fails,
-            # which may be caused by server not running.
-            pass
+        self._uploader.put("grades", grade)
 
     def _write_grade_into_json(self, interval: Interval) -> None:
         parse.append_to_json(self._json_file, interval.__dict__)
 
-    def _send_slices_to_server(self, slices: np.ndarray) -> None:
+    def _send_slices_to_server(self, slices: np.ndarray, fingerprint: str) -> None:
         data = {
             "id": self._student_id,
             "slices": slices.tolist(),  # ndarray is not JSON serializable
+            "fingerprint": fingerprint,
         }
-        try:
-            requests.post(f"{self._server_url}/student/screenshots", json=data)
-        except requests.ConnectionError:
-            # Skip posting if the connection fails,
-            # which may be caused by server not running.
-            pass
+        self._uploader.put("screenshots", data)
 
     def _change_language_of_widgets(self, lang_no: int) -> None:
         self._lang = Language(lang_no)
@@ -0,0 +1,191 @@
+import threading
+import time
+import traceback
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional
+
+import cv2
+
+from util.image_type import ColorImage
+
+
+# takes an RGB image, returns the faces as mtcnn.MTCNN.detect_faces() does
+FaceDetectFunc = Callable[[ColorImage], List[Dict]]
+
+
+@dataclass
+class FallbackStats:
+    """The counters of MtcnnFallback.
+
+    A call which is answered by an unexpired result, with or without a face, is
+    a hit; one which has no result to be answered is a miss.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    detections: int = 0
+    # in seconds, of the detections
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.detections if self.detections else 0.0
+
+
+class MtcnnFallback:
+    """Detects faces with MTCNN on a thread of its own, for the frames that HOG
+    fails on.
+
+    MTCNN is so slow that it's run at most once per min_interval seconds, on a
+    frame downscaled to max_width pixels wide; the calls in between are
+    answered by the latest result. That no face is found usually means the user
+    has left, so such a result stops the detection for negative_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        detect_faces: Optional[FaceDetectFunc] = None,
+        min_interval: float = 1.0,
+        result_ttl: float = 2.0,
+        negative_ttl: float = 5.0,
+        max_width: int = 320,
+        name: str = "mtcnn-fallback",
+    ) -> None:
+        """
+        Arguments:
+            detect_faces:
+                The MTCNN detector, which is created on the thread on first
+                detection if not provided, so TensorFlow is loaded only if the
+                fallback is ever needed.
+            min_interval: In seconds, the least time between two detections.
+            result_ttl: In seconds, how long a face found answers the calls.
+            negative_ttl: In seconds, how long a result of no face does.
+            max_width: In pixels, the width a frame is downscaled to at most.
+        """
+        self._detect_faces = detect_faces
+        self.min_interval = min_interval
+        self.result_ttl = result_ttl
+        self.negative_ttl = negative_ttl
+        self.max_width = max_width
+        self._cond = threading.Condition()
+        # the frame to detect; None if there's none pending
+        self._frame: Optional[ColorImage] = None
+        self._f_busy = False
+        self._submitted_at = -float("inf")
+        self._face: Optional[Dict] = None
+        self._result_at: Optional[float] = None
+        self._stats = FallbackStats()
+        self._f_running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def stats(self) -> FallbackStats:
+        """A copy of the counters."""
+        with self._cond:
+            return replace(self._stats)
+
+    def detect_face(self, frame: ColorImage) -> Optional[Dict]:
+        """Returns the face of the latest detection, in the coordinates of the
+        frame; None if no face is found or there's no unexpired result.
+
+        The frame is detected later on the thread if a detection is due. Never
+        blocks on the detection.
+
+        Arguments:
+            frame: The BGR image, which should not be modified afterwards.
+        """
+        now = time.monotonic()
+        with self._cond:
+            fresh = False
+            if self._result_at is not None:
+                ttl = self.negative_ttl if self._face is None else self.result_ttl
+                fresh = now - self._result_at <= ttl
+            due = (
+                not self._f_busy
+                and now - self._submitted_at >= self.min_interval
+                # a fresh result of no face holds the detection
+                and not (fresh and self._face is None)
+            )
+            if due:
+                self._frame = frame
+                self._f_busy = True
+                self._submitted_at = now
+                self._cond.notify()
+
+            if not fresh:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            return self._face
+
+    def stop(self) -> None:
+        """Stops the thread after the running detection, if any, returns."""
+        with self._cond:
+            self._f_running = False
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _next_frame(self) -> Optional[ColorImage]:
+        """Blocks until a frame is submitted; None if the fallback is stopped."""
+        with self._cond:
+            while self._f_running:
+                if self._frame is not None:
+                    frame, self._frame = self._frame, None
+                    return frame
+                self._cond.wait()
+            return None
+
+    def _run(self) -> None:
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return
+            try:
+                self._detect(frame)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._f_busy = False
+
+    def _detect(self, frame: ColorImage) -> None:
+        if self._detect_faces is None:
+            import mtcnn
+
+            self._detect_faces = mtcnn.MTCNN().detect_faces
+
+        scale = 1.0
+        if frame.shape[1] > self.max_width:
+            scale = frame.shape[1] / self.max_width
+            frame = cv2.resize(
+                frame,
+                (self.max_width, round(frame.shape[0] / scale)),
+                interpolation=cv2.INTER_AREA,
+            )
+        start = time.perf_counter()
+        faces = self._detect_faces(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        latency = time.perf_counter() - start
+
+        with self._cond:
+            self._face = self._scale_face(faces[0], scale) if faces else None
+            self._result_at = time.monotonic()
+            self._stats.detections += 1
+            self._stats.last_latency = latency
+            self._stats.max_latency = max(self._stats.max_latency, latency)
+            self._stats.total_latency += latency
+
+    @staticmethod
+    def _scale_face(face: Dict, scale: float) -> Dict:
+        """Returns the face with the box and keypoints scaled back to the frame."""
+        return {
+            **face,
+            "box": [round(v * scale) for v in face["box"]],
+            "keypoints": {
+                name: (round(x * scale), round(y * scale))
+                for name, (x, y) in face["keypoints"].items()
+            },
+        }
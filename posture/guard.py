@@ -1,11 +1,10 @@
 from typing import Optional, Tuple
 
-import cv2
-import mtcnn
 from nptyping import Int, NDArray
 
 from concentration.grader import ConcentrationGrader
 from posture.calculator import PostureLabel
+from posture.fallback import FallbackStats, MtcnnFallback
 from posture.layer import AngleLayer, HogLayer, MtcnnLayer
 from sounds.sound_guard import SoundRepeatGuard
 from util.image_type import ColorImage
@@ -22,6 +21,7 @@ class PostureGuard(SoundRepeatGuard):
         warn_angle: float,
         warning_enabled: bool = True,
         grader: Optional[ConcentrationGrader] = None,
+        fallback: Optional[MtcnnFallback] = None,
     ) -> None:
         """
         Arguments:
@@ -33,6 +33,9 @@ class PostureGuard(SoundRepeatGuard):
                 Provide this optional argument if you're using the guard as
                 one of the overall concentration grading components. The result
                 will be send to the grader.
+            fallback:
+                Detects the faces that HOG fails on with MTCNN, off the frame
+                loop. One in default settings is created if not provided.
         """
         super().__init__(
             sound_file=to_abs_path("sounds/posture_slump.wav"),
@@ -41,7 +44,7 @@ class PostureGuard(SoundRepeatGuard):
         )
         self._hog_layer = HogLayer(warn_angle)
         self._mtcnn_layer = MtcnnLayer(warn_angle)
-        self._mtcnn_detector = mtcnn.MTCNN()
+        self._mtcnn_fallback = fallback if fallback is not None else MtcnnFallback()
         self._grader: Optional[ConcentrationGrader] = grader
 
     def set_warn_angle(self, warn_angle: float) -> None:
@@ -52,6 +55,16 @@ class PostureGuard(SoundRepeatGuard):
         self._hog_layer.set_warn_angle(warn_angle)
         self._mtcnn_layer.set_warn_angle(warn_angle)
 
+    def set_grader(self, grader: ConcentrationGrader) -> None:
+        """Sends the results to the grader from now on, e.g., once it's created
+        in the background.
+        """
+        self._grader = grader
+
+    def get_fallback_stats(self) -> FallbackStats:
+        """Returns the hit/miss counters and detection latency of MTCNN."""
+        return self._mtcnn_fallback.stats
+
     def check_posture(
         self, frame: ColorImage, landmarks: NDArray[(68, 2), Int[32]]
     ) -> Tuple[PostureLabel, str]:
@@ -74,20 +87,20 @@ class PostureGuard(SoundRepeatGuard):
         # HOG is accurate enough and has the fastest speed but needs front faces,
         # so it's used as the first layer; then when the angle is too large that
         # HOG fails, MTCNN takes over. It's robust but so slow that we can't have
-        # it as the first layer; last, when the above 2 detections both fail on
-        # face detection, we say that the user isn't concentrating since he/she
-        # isn't even in front of the screen.
+        # it as the first layer, and it runs asynchronously on the latest frame
+        # at most once in a while, the frames in between reuse its result;
+        # last, when the above 2 detections both fail on face detection, we say
+        # that the user isn't concentrating since he/she isn't even in front of
+        # the screen.
 
         layer: AngleLayer
         if landmarks.any():
             self._hog_layer.detect(landmarks)
             layer = self._hog_layer
         else:
-            faces = self._mtcnn_detector.detect_faces(
-                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            )
-            if faces:
-                self._mtcnn_layer.detect(faces[0])
+            face = self._mtcnn_fallback.detect_face(frame)
+            if face is not None:
+                self._mtcnn_layer.detect(face)
                 layer = self._mtcnn_layer
             else:  # no face
                 # a sufficienly large angle to be sent as distraction
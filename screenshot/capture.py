@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Optional
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from util.image_convert import qpixmap_to_ndarray
+from util.image_type import ColorImage
+
+
+class ScreenCapture:
+    """Captures the screen on demand, at most max_rate times per second, and
+    caches the capture for ttl seconds.
+
+    The consumers, e.g., the brightness optimization and the slices of
+    screenshots, only need the means of areas, so the capture is downscaled to
+    at most max_width pixels wide before it's converted into an ndarray, which
+    saves most of the copying of a full-resolution screen.
+
+    Nothing is captured until a consumer asks for a frame which is not fresh
+    enough.
+    """
+
+    def __init__(
+        self, max_rate: float = 2.0, ttl: float = 0.5, max_width: int = 640
+    ) -> None:
+        """
+        Arguments:
+            max_rate: The max number of captures per second.
+            ttl: In seconds, how long a capture is reused.
+            max_width: In pixels, the width a capture is downscaled to at most.
+        """
+        self.max_rate = max_rate
+        self.ttl = ttl
+        self.max_width = max_width
+        self._lock = threading.Lock()
+        self._frame: Optional[ColorImage] = None
+        self._taken_at = -float("inf")
+
+    def get(self, max_age: Optional[float] = None) -> ColorImage:
+        """Returns the latest capture, or a new one if it's older than max_age.
+
+        The capture is the same as screenshot.compare.get_screenshot() but
+        downscaled. Even a too old one is returned if capturing again would
+        exceed max_rate, unless there's none.
+
+        Arguments:
+            max_age: In seconds, ttl if not provided.
+        """
+        if max_age is None:
+            max_age = self.ttl
+        # the consumers run in different threads, only one of them captures
+        with self._lock:
+            age = time.monotonic() - self._taken_at
+            if self._frame is not None and (age <= max_age or age < 1 / self.max_rate):
+                return self._frame
+            self._frame = self._capture()
+            self._taken_at = time.monotonic()
+            return self._frame
+
+    def _capture(self) -> ColorImage:
+        screenshot: QPixmap = QApplication.primaryScreen().grabWindow(
+            QApplication.desktop().winId()
+        )
+        if screenshot.width() > self.max_width:
+            # smooth transformation averages the pixels, as the means need
+            screenshot = screenshot.scaledToWidth(
+                self.max_width, Qt.SmoothTransformation
+            )
+        return qpixmap_to_ndarray(screenshot)
+
+
+_shared_capture: Optional[ScreenCapture] = None
+_shared_lock = threading.Lock()
+
+
+def shared_screen_capture() -> ScreenCapture:
+    """Returns the capture shared by the whole process, created on first use."""
+    global _shared_capture
+    with _shared_lock:
+        if _shared_capture is None:
+            _shared_capture = ScreenCapture()
+        return _shared_capture
@@ -1,4 +1,5 @@
 import math
+from typing import Any
 
 import cv2
 import numpy as np
@@ -6,6 +7,7 @@ from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QApplication
 from nptyping import Float, Int, NDArray
 
+from screenshot.similarity import compare_similarity_of_many_slices
 from util.image_convert import qpixmap_to_ndarray
 from util.image_type import ColorImage, GrayImage
 
@@ -17,27 +19,33 @@ def get_screenshot() -> ColorImage:
     return qpixmap_to_ndarray(screenshot)
 
 
-def get_compare_slices(image: ColorImage) -> NDArray[(36,), Float[64]]:
-    """Takes 6 x 6 equally spaced slices and gets their means of pixel values as
-    comparison components.
+def get_compare_slices(image: ColorImage, grid: int = 6) -> NDArray[(Any,), Float[64]]:
+    """Takes grid x grid equally spaced slices and gets their means of pixel
+    values as comparison components.
 
-    This method works regardless of monitor size.
+    The image is split into (2 * grid) x (2 * grid) blocks, and every other
+    block of every other row is a slice, e.g., 36 of the 144 blocks with the
+    default grid. This method works regardless of monitor size, so does with a
+    downscaled capture.
 
     Returns:
-        An numpy array with 36 values, value range from 0 ~ 255, each in type
-        Float64, which allows you to make basic operations without overflowing.
+        An numpy array with grid x grid values, value range from 0 ~ 255, each
+        in type Float64, which allows you to make basic operations without
+        overflowing.
     """
-    gray_image: GrayImage = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    h, w = gray_image.shape
-    h //= 12
-    w //= 12
-    # 144 slices in total, take 36 of them
-    slices = [
-        np.mean(gray_image[h * i : h * (i + 1), w * j : w * (j + 1)])
-        for i in range(0, 12, 2)
-        for j in range(0, 12, 2)
+    blocks = 2 * grid
+    h = image.shape[0] // blocks
+    w = image.shape[1] // blocks
+    # (block row, y, block col, x, channel), every other block of every other row
+    taken = image[: blocks * h, : blocks * w].reshape(blocks, h, blocks, w, -1)[
+        ::2, :, ::2
     ]
-    return np.array(slices, dtype=np.float64)
+    # only the pixels of the slices are converted, a quarter of the image
+    gray_slices: GrayImage = cv2.cvtColor(
+        np.ascontiguousarray(taken).reshape(grid * h, grid * w, -1),
+        cv2.COLOR_BGR2GRAY,
+    )
+    return gray_slices.reshape(grid, h, grid, w).mean(axis=(1, 3)).ravel()
 
 
 def compare_similarity_of_slices(
@@ -49,10 +57,7 @@ def compare_similarity_of_slices(
         the ratio of similarity between [0, 1], percisely 1 - RMS / 255,
         1 means they are the same.
     """
-    # make sure no overflow
-    diff = slices1.astype(np.float64) - slices2.astype(np.float64)
-    rms = math.sqrt(sum(np.square(diff)) / 36)
-    return 1 - rms / 255
+    return float(compare_similarity_of_many_slices(slices1[np.newaxis], slices2)[0])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+import math
+
+import cv2
+import numpy as np
+
+from util.image_type import ColorImage
+
+
+def _hash_size_of(bits: int) -> int:
+    size = math.isqrt(bits)
+    if size * size != bits or bits % 64:
+        raise ValueError("bits should be a square multiple of 64, e.g., 64 or 256")
+    return size
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """Packs the booleans into uint64 words, the first one as the highest bit."""
+    return np.packbits(bits.ravel()).view(">u8").astype(np.uint64)
+
+
+def difference_hash(image: ColorImage, bits: int = 64) -> np.ndarray:
+    """Hashes the image by whether each pixel is brighter than the next one of
+    the image shrunk to sqrt(bits) x sqrt(bits) (+ 1 column).
+
+    Returns:
+        bits / 64 uint64 words.
+    """
+    size = _hash_size_of(bits)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def dct_hash(image: ColorImage, bits: int = 64) -> np.ndarray:
+    """Hashes the image by whether each of the lowest sqrt(bits) x sqrt(bits)
+    frequencies of the DCT is greater than their median.
+
+    Returns:
+        bits / 64 uint64 words.
+    """
+    size = _hash_size_of(bits)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size * 4, size * 4), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small.astype(np.float32))[:size, :size]
+    return _pack(low > np.median(low))
@@ -0,0 +1,75 @@
+import re
+
+import numpy as np
+
+
+def compare_similarity_of_many_slices(
+    many_slices: np.ndarray, slices: np.ndarray
+) -> np.ndarray:
+    """Calculates how similar each set of slices is to the one set at once,
+    e.g., those of the whole class to the teacher's, by the RMS value of
+    difference.
+
+    Only numpy is needed, so the server compares without any GUI dependency.
+
+    Arguments:
+        many_slices: N sets of slices, one per row.
+        slices: The set the others are compared with.
+
+    Returns:
+        N ratios of similarity between [0, 1], percisely 1 - RMS / 255,
+        1 means they are the same.
+    """
+    # make sure no overflow
+    diff = many_slices.astype(np.float64) - slices.astype(np.float64)
+    rms = np.sqrt(np.einsum("ij,ij->i", diff, diff) / diff.shape[1])
+    return 1 - rms / 255
+
+
+def popcount64(words: np.ndarray) -> np.ndarray:
+    """Counts the bits set in each uint64, element-wise, by SWAR arithmetic."""
+    x = words.astype(np.uint64)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + (
+        (x >> np.uint64(2)) & np.uint64(0x3333333333333333)
+    )
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    # the sum of the 8 bytes ends up in the highest one; overflow is intended
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def compare_similarity_of_many_fingerprints(
+    many_fingerprints: np.ndarray, fingerprint: np.ndarray
+) -> np.ndarray:
+    """Calculates how similar each fingerprint is to the one at once by their
+    Hamming distance.
+
+    Arguments:
+        many_fingerprints: N fingerprints, one per row of uint64 words.
+        fingerprint: The one the others are compared with.
+
+    Returns:
+        N ratios of similarity between [0, 1], percisely 1 - distance / bits,
+        1 means they are the same.
+    """
+    distances = popcount64(many_fingerprints ^ fingerprint).sum(axis=1)
+    return 1 - distances / (64 * many_fingerprints.shape[1])
+
+
+def fingerprint_to_hex(fingerprint: np.ndarray) -> str:
+    """Returns the fingerprint in hex, 16 digits per word, to be sent as JSON."""
+    return "".join(f"{word:016x}" for word in fingerprint.tolist())
+
+
+def fingerprint_from_hex(text: str) -> np.ndarray:
+    """Converts the fingerprint in hex back to uint64 words.
+
+    Raises:
+        ValueError: The text is not a multiple of 16 hex digits.
+    """
+    # int() alone would take signs, "0x" and whitespace as well
+    if not isinstance(text, str) or not re.fullmatch(r"(?:[0-9a-fA-F]{16})+", text):
+        raise ValueError("fingerprint should be a multiple of 16 hex digits")
+    return np.array(
+        [int(text[i : i + 16], 16) for i in range(0, len(text), 16)], dtype=np.uint64
+    )
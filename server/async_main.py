@@ -0,0 +1,311 @@
+"""The asyncio variant of the server.
+
+It serves the same web API as server.main with the same storage layer, but
+all connections are handled by a single event loop instead of a thread per
+request, so thousands of students and long-polling teachers cost sockets,
+not threads.
+"""
+
+import asyncio
+import functools
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from aiohttp import web
+from jinja2 import Environment, FileSystemLoader
+
+from server.ingest import IngestGate, batch_size, parse_batch, store_batch
+from server.journal import SqliteJournal
+from server.main import (
+    GENRES,
+    LEGACY_CONSUMER,
+    MAX_POLL_TIMEOUT,
+    parse_server_args,
+    resolve_cursor,
+)
+from server.similarity import BaseSimilarityBoard, SimilarityBoard
+from server.store import BaseRecordStore, Record, RecordStore
+from util.path import to_abs_path
+
+
+_templates = Environment(loader=FileSystemLoader(to_abs_path("server/templates")))
+
+_T = TypeVar("_T")
+
+
+async def _in_executor(func: Callable[..., _T], *args: Any) -> _T:
+    """Calls the blocking function in the default executor, so the reads and
+    writes of the store and the board, e.g., in SQLite, never stall the event
+    loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(func, *args)
+    )
+
+
+class _AppendNotifier:
+    """Wakes up all the coroutines which are waiting for new records.
+
+    Every waiter awaits the same future, which is resolved and replaced on each
+    append, so a notification costs the same no matter how many are waiting.
+    The reads of the waiters are shared the same way, see read_since().
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._appended: asyncio.Future = loop.create_future()
+        # the reads since the last append, by genres and cursor
+        self._reads: Dict[Tuple[Tuple[str, ...], Any], asyncio.Future] = {}
+
+    @property
+    def appended(self) -> asyncio.Future:
+        """The future resolved on the next append."""
+        return self._appended
+
+    def notify_threadsafe(self) -> None:
+        """Can be called from any thread, which is what RecordStore listeners need."""
+        self._loop.call_soon_threadsafe(self._notify)
+
+    def _notify(self) -> None:
+        if not self._appended.done():
+            self._appended.set_result(None)
+        self._appended = self._loop.create_future()
+        self._reads.clear()
+
+    async def read_since(
+        self, store: BaseRecordStore, genres: Sequence[str], cursor: Any
+    ) -> Tuple[Any, Dict[str, List[Record]]]:
+        """Reads the store in the default executor, so the blocking reads,
+        e.g., of the sharded store, never stall the event loop.
+
+        The waiters woken up by the same append are mostly at the same cursor,
+        so they share one read instead of reading once each.
+        """
+        key = (tuple(genres), cursor)
+        read = self._reads.get(key)
+        if read is None:
+            read = self._loop.run_in_executor(None, store.read_since, genres, cursor)
+            self._reads[key] = read
+            # a failed read is retried by the next waiter
+            read.add_done_callback(
+                lambda r: r.exception() is not None and self._reads.pop(key, None)
+            )
+        # shielded so a disconnected waiter won't cancel the read of the others
+        return await asyncio.shield(read)
+
+    async def wait(
+        self, timeout: float, appended: Optional[asyncio.Future] = None
+    ) -> None:
+        """Waits until the next append or the timeout expires.
+
+        Arguments:
+            appended: The future taken from appended before the records are
+                read, so an append during the read isn't missed.
+        """
+        try:
+            # shielded so the timeout of one waiter won't cancel the others
+            await asyncio.wait_for(asyncio.shield(appended or self._appended), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def home(request: web.Request) -> web.Response:
+    return web.Response(
+        text=_templates.get_template("index.html").render(), content_type="text/html"
+    )
+
+
+async def get_data(request: web.Request) -> web.Response:
+    store: BaseRecordStore = request.app["store"]
+    # get certain data by passing `genre` as parameter
+    if request.query.get("genre") in store.genres():
+        # the data are cleared after being gotten
+        return web.json_response(
+            await _in_executor(store.consume, LEGACY_CONSUMER, request.query["genre"])
+        )
+    records = {
+        genre: await _in_executor(store.peek, LEGACY_CONSUMER, genre)
+        for genre in store.genres()
+    }
+    return web.Response(
+        text=_templates.get_template("data.html").render(**records),
+        content_type="text/html",
+    )
+
+
+async def get_events(request: web.Request) -> web.Response:
+    """Long-polls the records which come after the cursor.
+
+    Behaves the same as GET /teacher/events of server.main.
+    """
+    store: BaseRecordStore = request.app["store"]
+    notifier: _AppendNotifier = request.app["notifier"]
+
+    genres: List[str] = request.query.getall("genre", []) or list(store.genres())
+    if any(genre not in store.genres() for genre in genres):
+        return web.json_response(
+            {"error": f"genre should be in {store.genres()}"}, status=400
+        )
+    try:
+        # may write the cursor of the consumer
+        cursor = await _in_executor(
+            resolve_cursor,
+            store,
+            request.query.get("consumer"),
+            request.query.get("cursor"),
+        )
+        timeout = min(float(request.query.get("timeout", 25.0)), MAX_POLL_TIMEOUT)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(timeout, 0.0)
+    while True:
+        appended = notifier.appended
+        new_cursor, records = await notifier.read_since(store, genres, cursor)
+        remaining = deadline - loop.time()
+        if any(records.values()) or remaining <= 0:
+            return web.json_response({"cursor": new_cursor, **records})
+        await notifier.wait(remaining, appended)
+
+
+async def update_reference(request: web.Request) -> web.Response:
+    """Behaves the same as POST /teacher/reference of server.main."""
+    board: BaseSimilarityBoard = request.app["board"]
+    try:
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError(f"body should be an object with {board.feature}")
+        feature = board.parse(body.get(board.feature))
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    # the shared board compares in a SQLite transaction
+    round_ = await _in_executor(board.set_reference, feature)
+    return web.json_response({"round": round_})
+
+
+async def get_similarities(request: web.Request) -> web.Response:
+    """Behaves the same as GET /teacher/similarities of server.main."""
+    board: BaseSimilarityBoard = request.app["board"]
+    notifier: _AppendNotifier = request.app["board_notifier"]
+    try:
+        cursor = int(request.query["cursor"]) if "cursor" in request.query else None
+        timeout = min(float(request.query.get("timeout", 25.0)), MAX_POLL_TIMEOUT)
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(timeout, 0.0)
+    while True:
+        appended = notifier.appended
+        round_, new_cursor, similarities = await _in_executor(board.read_since, cursor)
+        remaining = deadline - loop.time()
+        if cursor is None or new_cursor != cursor or remaining <= 0:
+            return web.json_response(
+                {"round": round_, "cursor": new_cursor, "similarities": similarities}
+            )
+        await notifier.wait(remaining, appended)
+
+
+def _busy(gate: IngestGate) -> web.Response:
+    return web.json_response(
+        {"error": "server is busy, retry later"},
+        status=503,
+        headers={"Retry-After": str(gate.retry_after)},
+    )
+
+
+async def _ingest(app: web.Application, batch: Dict[str, List[Record]]) -> bool:
+    """Same as server.ingest.ingest(), but admits on the event loop, so the
+    posts waiting for the executor are counted by the gate as well.
+    """
+    gate: IngestGate = app["gate"]
+    size = batch_size(batch)
+    if not gate.try_admit(size):
+        return False
+    try:
+        await _in_executor(store_batch, app["store"], batch)
+    finally:
+        gate.release(size)
+    return True
+
+
+async def update_grade(request: web.Request) -> web.Response:
+    try:
+        new_grade = await request.json()
+    except ValueError:
+        return web.json_response({"error": "body should be JSON"}, status=400)
+    if not await _ingest(request.app, {"grades": [new_grade]}):
+        return _busy(request.app["gate"])
+    return web.json_response(new_grade)
+
+
+async def update_screenshot(request: web.Request) -> web.Response:
+    try:
+        new_screenshot = await request.json()
+    except ValueError:
+        return web.json_response({"error": "body should be JSON"}, status=400)
+    if not await _ingest(request.app, {"screenshots": [new_screenshot]}):
+        return _busy(request.app["gate"])
+    await _in_executor(request.app["board"].add_screenshots, (new_screenshot,))
+    return web.json_response(new_screenshot)
+
+
+async def update_batch(request: web.Request) -> web.Response:
+    """Behaves the same as POST /student/batch of server.main."""
+    store: BaseRecordStore = request.app["store"]
+    try:
+        batch = parse_batch(await request.json(), store.genres())
+    except ValueError as e:
+        # also raised when the body is not JSON
+        return web.json_response({"error": str(e)}, status=400)
+    if not await _ingest(request.app, batch):
+        return _busy(request.app["gate"])
+    await _in_executor(
+        request.app["board"].add_screenshots, batch.get("screenshots", ())
+    )
+    return web.json_response({genre: len(records) for genre, records in batch.items()})
+
+
+async def _attach_notifier(app: web.Application) -> None:
+    app["notifier"] = _AppendNotifier(asyncio.get_running_loop())
+    app["store"].add_listener(app["notifier"].notify_threadsafe)
+    app["board_notifier"] = _AppendNotifier(asyncio.get_running_loop())
+    app["board"].add_listener(app["board_notifier"].notify_threadsafe)
+
+
+def create_app(
+    store: BaseRecordStore, board: Optional[BaseSimilarityBoard] = None
+) -> web.Application:
+    """
+    Arguments:
+        board: Compares the screenshots; one in memory by slices if not provided.
+    """
+    app = web.Application()
+    app["store"] = store
+    app["gate"] = IngestGate(store.pending)
+    app["board"] = board if board is not None else SimilarityBoard()
+    app.on_startup.append(_attach_notifier)
+    app.router.add_get("/", home)
+    app.router.add_get("/teacher", get_data)
+    app.router.add_get("/teacher/events", get_events)
+    app.router.add_get("/teacher/similarities", get_similarities)
+    app.router.add_post("/teacher/reference", update_reference)
+    app.router.add_post("/student/grades", update_grade)
+    app.router.add_post("/student/screenshots", update_screenshot)
+    app.router.add_post("/student/batch", update_batch)
+    return app
+
+
+if __name__ == "__main__":
+    args = parse_server_args("The asyncio server, one event loop for all requests.")
+    store = RecordStore(
+        GENRES, journal=SqliteJournal(args.database) if args.database else None
+    )
+    # a larger backlog so the bursts of thousands of students aren't refused
+    web.run_app(
+        create_app(store, SimilarityBoard(mode=args.similarity)),
+        host=args.host,
+        port=args.port,
+        backlog=1024,
+    )
+    store.close()
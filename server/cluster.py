@@ -0,0 +1,104 @@
+"""Runs the server as several worker processes behind one listening socket.
+
+A single Python process is bounded by the GIL, so the listening socket is
+created once and inherited by forked workers, which accept the connections
+in turn. The workers share the records through a ShardedRecordStore, and the
+rounds of similarities through a SharedSimilarityBoard, on the local disk
+instead of their own memory. Linux only, no external services needed. Run with
+
+    python -m server.cluster --workers 4 --variant asyncio
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from pathlib import Path
+from typing import List
+
+import server.main as flask_server
+from server.sharded_store import ShardedRecordStore
+from server.shared_similarity import SharedSimilarityBoard
+from server.similarity import SIMILARITY_MODES
+from util.path import to_abs_path
+
+
+DATABASE_DIR = to_abs_path("server/database/shards")
+
+
+def _run_worker(args: argparse.Namespace, sock: socket.socket) -> None:
+    # created after fork since threads don't survive it
+    store = ShardedRecordStore(
+        flask_server.GENRES, args.database_dir, shards=args.shards
+    )
+    board = SharedSimilarityBoard(
+        str(Path(args.database_dir) / "similarities.db"), mode=args.similarity
+    )
+    try:
+        if args.variant == "asyncio":
+            from aiohttp import web
+
+            from server.async_main import create_app
+
+            # aiohttp leaves gracefully on SIGTERM by itself
+            web.run_app(create_app(store, board), sock=sock, print=None)
+        else:
+            from werkzeug.serving import make_server
+
+            # leave gracefully so the queued records are committed
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+            flask_server.use_store(store)
+            flask_server.board = board
+            make_server(
+                args.host, args.port, flask_server.app, threaded=True, fd=sock.fileno()
+            ).serve_forever()
+    finally:
+        board.close()
+        store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=flask_server.HOST)
+    parser.add_argument("--port", type=int, default=flask_server.PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=4,
+        help="the number of database files records are sharded into by student id",
+    )
+    parser.add_argument("--variant", choices=("flask", "asyncio"), default="asyncio")
+    parser.add_argument("--database-dir", default=DATABASE_DIR)
+    parser.add_argument("--similarity", choices=SIMILARITY_MODES, default="slices")
+    args = parser.parse_args()
+
+    # a larger backlog so the bursts of thousands of students aren't refused
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.set_inheritable(True)
+    context = multiprocessing.get_context("fork")
+    workers: List[multiprocessing.process.BaseProcess] = [
+        context.Process(target=_run_worker, args=(args, sock), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def terminate_workers(signum, frame) -> None:
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, terminate_workers)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # the workers are interrupted as well since they're in the same group
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import threading
+from typing import Any, Callable, Dict, Iterable, List
+
+from server.store import BaseRecordStore, Record
+
+
+# The max number of records a batch may carry.
+MAX_BATCH_SIZE = 1_000
+
+
+def parse_batch(body: Any, genres: Iterable[str]) -> Dict[str, List[Record]]:
+    """Validates the whole batch before any of its records is stored, so a
+    batch is either stored entirely or not at all.
+
+    A batch is a JSON object which maps genres to lists of records, e.g.,
+    {"grades": [{...}, ...], "screenshots": [{...}]}; every record should be an
+    object with the "id" of the student.
+
+    Raises:
+        ValueError: The batch is malformed or has more than MAX_BATCH_SIZE records.
+    """
+    genres = tuple(genres)
+    if not isinstance(body, dict):
+        raise ValueError("batch should be an object which maps genres to records")
+    size = 0
+    for genre, records in body.items():
+        if genre not in genres:
+            raise ValueError(f"genre should be in {genres}")
+        if not isinstance(records, list):
+            raise ValueError(f"records of {genre} should be in a list")
+        if not all(isinstance(r, dict) and "id" in r for r in records):
+            raise ValueError(f"every record of {genre} should be an object with id")
+        size += len(records)
+    if size > MAX_BATCH_SIZE:
+        raise ValueError(f"batch should have at most {MAX_BATCH_SIZE} records")
+    return body
+
+
+class IngestGate:
+    """The admission control of the records posted.
+
+    The records which are admitted but not yet stored, i.e., those being
+    handled by requests plus those queued by the store for writing, are
+    bounded. So are the posts being stored at once, which is what bounds a
+    store that queues nothing, e.g., the one in memory without a journal,
+    whose records are stored as soon as they're admitted. Posts beyond are
+    refused with a hint of when to retry, so a burst is spread over time
+    instead of piling up in memory and latency.
+    """
+
+    def __init__(
+        self,
+        pending: Callable[[], int],
+        max_pending: int = 5_000,
+        retry_after: int = 2,
+        max_requests: int = 256,
+    ) -> None:
+        """
+        Arguments:
+            pending: Returns the number of records queued by the store.
+            max_pending: The max number of records admitted but not yet stored.
+            retry_after: In seconds. How long a refused client should wait.
+            max_requests: The max number of posts admitted but not yet stored.
+        """
+        self._pending = pending
+        self._max_pending = max_pending
+        self._max_requests = max_requests
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def try_admit(self, n: int) -> bool:
+        """Admits a post of n records if there's room; release() it once stored.
+
+        Returns:
+            False if the post should be refused.
+        """
+        with self._lock:
+            if (
+                self._requests >= self._max_requests
+                or self._in_flight + self._pending() + n > self._max_pending
+            ):
+                return False
+            self._in_flight += n
+            self._requests += 1
+            return True
+
+    def release(self, n: int) -> None:
+        """Releases a post of n records."""
+        with self._lock:
+            self._in_flight -= n
+            self._requests -= 1
+
+
+def ingest(
+    store: BaseRecordStore, gate: IngestGate, batch: Dict[str, List[Record]]
+) -> bool:
+    """Appends the records of the batch to the store if the gate admits them.
+
+    Returns:
+        False if the batch is refused, in which case nothing is stored.
+    """
+    size = batch_size(batch)
+    if not gate.try_admit(size):
+        return False
+    try:
+        store_batch(store, batch)
+    finally:
+        gate.release(size)
+    return True
+
+
+def batch_size(batch: Dict[str, List[Record]]) -> int:
+    return sum(len(records) for records in batch.values())
+
+
+def store_batch(store: BaseRecordStore, batch: Dict[str, List[Record]]) -> None:
+    for genre, records in batch.items():
+        store.extend(genre, records)
@@ -0,0 +1,238 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from server.store import Record
+
+
+class SqliteJournal:
+    """Persists the records and consumer cursors of a RecordStore into a SQLite
+    database in WAL mode.
+
+    Writes are queued and group-committed by a single writer thread: whatever
+    has been queued while the previous transaction was committing is written
+    in the next one, so a burst of posts costs a few commits instead of one per
+    record and the posting requests never wait for the disk.
+
+    Notice that the records which are queued but not yet committed are lost if
+    the process crashes; close() flushes them on a normal shutdown.
+
+    Once capacity is set, the writer deletes the records out of it every
+    trim_interval commits, so the database doesn't grow without bound.
+
+    A batch which fails to commit, e.g., on a full disk or a locked database,
+    is retried with an exponential backoff, so the writer never dies; the
+    writes queued in the meantime are counted by pending().
+    """
+
+    # in seconds, the first and the longest delays before retrying a batch
+    RETRY_DELAY = 0.1
+    MAX_RETRY_DELAY = 5.0
+
+    def __init__(
+        self, db_file: str, max_batch_size: int = 1_000, trim_interval: int = 100
+    ) -> None:
+        """
+        Arguments:
+            db_file: The database to write into, created if not exists.
+            max_batch_size: The max number of writes committed in a transaction.
+            trim_interval: The number of commits between two trims.
+        """
+        self._db_file = db_file
+        self._max_batch_size = max_batch_size
+        self._trim_interval = trim_interval
+        # the max number of records kept per genre, set by the RecordStore;
+        # None to keep all
+        self.capacity: Optional[int] = None
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY,
+                    genre TEXT NOT NULL,
+                    body TEXT NOT NULL
+                );"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS records_genre_seq ON records (genre, seq);"
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cursors (
+                    consumer TEXT PRIMARY KEY,
+                    cursor INTEGER NOT NULL
+                );"""
+            )
+        conn.close()
+
+        # Items are either (seq, genre, record) or (consumer, cursor);
+        # None tells the writer to stop.
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._write_periodically, name="journal-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_file)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        # WAL is safe from corruption with NORMAL, only the last commits may
+        # be rolled back on a power loss
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    def write_record(self, seq: int, genre: str, record: Record) -> None:
+        """Queues the record to be written. Should be called in order of seq."""
+        self._queue.put((seq, genre, record))
+
+    def write_cursor(self, consumer: str, cursor: int) -> None:
+        """Queues the cursor of the consumer to be written."""
+        self._queue.put((consumer, cursor))
+
+    def load_records(self, genre: str, limit: int) -> List[Tuple[int, Record]]:
+        """Returns at most the latest limit records of the genre with their
+        sequence numbers, in ascending order.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT seq, body FROM records WHERE genre=? ORDER BY seq DESC LIMIT ?;",
+            (genre, limit),
+        ).fetchall()
+        conn.close()
+        return [(seq, json.loads(body)) for seq, body in reversed(rows)]
+
+    def load_cursors(self) -> Dict[str, int]:
+        conn = self._connect()
+        rows = conn.execute("SELECT consumer, cursor FROM cursors;").fetchall()
+        conn.close()
+        return dict(rows)
+
+    def last_seq(self) -> int:
+        """Returns the sequence number of the latest record, 0 if there's none."""
+        conn = self._connect()
+        (seq,) = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM records;").fetchone()
+        conn.close()
+        return seq
+
+    def trim(self, genre: str, keep: int) -> None:
+        """Deletes all but the latest keep records of the genre."""
+        conn = self._connect()
+        with conn:
+            self._trim(conn, genre, keep)
+        conn.close()
+
+    def pending(self) -> int:
+        """Returns the approximate number of writes not yet committed."""
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Commits all the queued writes and stops the writer."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write_periodically(self) -> None:
+        # the connection is owned by the writer thread only
+        conn = self._connect()
+        # the genres written since the last trim
+        genres: Set[str] = set()
+        commits = 0
+        stopped = False
+        while not stopped:
+            # blocks until there's something to write
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopped = True
+            genres.update(
+                self._commit_until_done(
+                    conn, [item for item in batch if item is not None], stopped
+                )
+            )
+            commits += 1
+            capacity = self.capacity
+            if capacity is not None and commits >= self._trim_interval:
+                try:
+                    with conn:
+                        for genre in genres:
+                            self._trim(conn, genre, capacity)
+                except sqlite3.Error:
+                    # trimmed again after the next interval
+                    traceback.print_exc()
+                    continue
+                genres.clear()
+                commits = 0
+        conn.close()
+
+    def _commit_until_done(
+        self,
+        conn: sqlite3.Connection,
+        batch: List[Union[Tuple[int, str, Record], Tuple[str, int]]],
+        stopping: bool,
+    ) -> Set[str]:
+        """Retries the batch until it's committed; while stopping, it's dropped
+        after the first retry fails, as a crash would lose it.
+
+        Returns:
+            The genres of the records committed.
+        """
+        delay = self.RETRY_DELAY
+        retries = 0
+        while True:
+            try:
+                return self._commit(conn, batch)
+            except sqlite3.Error:
+                # rolled back by the context manager of the connection
+                traceback.print_exc()
+                if stopping and retries:
+                    return set()
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RETRY_DELAY)
+            retries += 1
+
+    @staticmethod
+    def _commit(
+        conn: sqlite3.Connection,
+        batch: List[Union[Tuple[int, str, Record], Tuple[str, int]]],
+    ) -> Set[str]:
+        """Returns the genres of the records committed."""
+        records: List[Tuple[int, str, str]] = []
+        cursors: Dict[str, int] = {}
+        for item in batch:
+            if len(item) == 3:
+                seq, genre, record = item  # type: ignore
+                records.append((seq, genre, json.dumps(record)))
+            else:
+                consumer, cursor = item  # type: ignore
+                # only the latest cursor of a consumer matters
+                cursors[consumer] = cursor
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (seq, genre, body) VALUES (?, ?, ?);",
+                records,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO cursors (consumer, cursor) VALUES (?, ?);",
+                cursors.items(),
+            )
+        return {genre for _, genre, _ in records}
+
+    @staticmethod
+    def _trim(conn: sqlite3.Connection, genre: str, keep: int) -> None:
+        conn.execute(
+            """DELETE FROM records WHERE genre=:genre AND seq <= (
+                SELECT seq FROM records WHERE genre=:genre
+                ORDER BY seq DESC LIMIT 1 OFFSET :keep
+            );""",
+            {"genre": genre, "keep": keep},
+        )
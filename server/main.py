@@ -1,7 +1,15 @@
-from typing import Dict, List
+import argparse
+import atexit
+from typing import Any, Optional
 
 from flask import Flask, jsonify, render_template, request
 
+from server.ingest import IngestGate, ingest, parse_batch
+from server.journal import SqliteJournal
+from server.similarity import SIMILARITY_MODES, BaseSimilarityBoard, SimilarityBoard
+from server.store import BaseRecordStore, RecordStore
+from util.path import to_abs_path
+
 
 HOST = "127.0.0.1"
 PORT = 5000
@@ -15,36 +23,194 @@ def home():
     return render_template("index.html")
 
 
-data: Dict[str, List] = {
-    "grades": [],
-    "screenshots": [],
-}
+GENRES = ("grades", "screenshots")
+DATABASE = to_abs_path("server/database/records.db")
+
+# Kept in memory only until persist_to() or use_store() is called.
+store: BaseRecordStore = RecordStore(GENRES)
+
+
+# Admits the records posted only while the store keeps up with them.
+gate = IngestGate(lambda: store.pending())
+
+# Compares the screenshots of the students with the teacher's.
+board: BaseSimilarityBoard = SimilarityBoard()
+
+
+def use_store(new_store: BaseRecordStore) -> None:
+    """Has the records stored in the new store, which is closed at exit."""
+    global store
+    store = new_store
+    atexit.register(store.close)
+
+
+def persist_to(db_file: str) -> None:
+    """Has the records and consumer cursors persisted into the database file.
+
+    Those which were persisted in the database file are recovered, so undelivered
+    records survive a restart of the server.
+    """
+    use_store(RecordStore(GENRES, journal=SqliteJournal(db_file)))
+
+
+def parse_server_args(description: str) -> argparse.Namespace:
+    """Parses the command line arguments shared by all variants of the server."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--database",
+        default=DATABASE,
+        help="where records are persisted; pass an empty string to keep them in memory only",
+    )
+    parser.add_argument(
+        "--similarity",
+        choices=SIMILARITY_MODES,
+        default="slices",
+        help="what the screenshots are compared by",
+    )
+    return parser.parse_args()
+
+
+# The consumer which reads through GET /teacher?genre=...
+# Records are "cleared" once they're gotten by it.
+LEGACY_CONSUMER = "legacy"
+# How long, in seconds, a long-poll request may be held at most.
+MAX_POLL_TIMEOUT = 60.0
+
+
+def resolve_cursor(
+    store: BaseRecordStore, consumer: Optional[str], cursor_text: Optional[str]
+) -> Any:
+    """Returns the cursor a long-poll request should continue from.
+
+    The cursor sent is remembered as the cursor of the consumer, which is used
+    when the next request comes without one. An anonymous consumer without
+    cursor starts from the oldest record kept.
+
+    Raises:
+        ValueError: The cursor is malformed.
+    """
+    if cursor_text is not None:
+        cursor = store.parse_cursor(cursor_text)
+        if consumer is not None:
+            store.set_consumer_cursor(consumer, cursor)
+        return cursor
+    if consumer is not None:
+        return store.consumer_cursor(consumer)
+    return store.initial_cursor
 
 
 @app.route("/teacher", methods=["GET"])
 def get_data():
     # get certain data by passing `genre` as parameter
-    if "genre" in request.args and request.args["genre"] in data.keys():
+    if "genre" in request.args and request.args["genre"] in store.genres():
         # the data are cleared after being gotten
-        res_data = data[request.args["genre"]].copy()
-        data[request.args["genre"]].clear()
-        return jsonify(res_data)
-    return render_template("data.html", **data)
+        return jsonify(store.consume(LEGACY_CONSUMER, request.args["genre"]))
+    return render_template(
+        "data.html",
+        **{genre: store.peek(LEGACY_CONSUMER, genre) for genre in store.genres()},
+    )
+
+
+@app.route("/teacher/events", methods=["GET"])
+def get_events():
+    """Long-polls the records which come after the cursor.
+
+    The request is held until any new record arrives or the timeout expires,
+    so the records are pushed to the consumer as soon as they are posted.
+    """
+    genres = request.args.getlist("genre") or list(store.genres())
+    if any(genre not in store.genres() for genre in genres):
+        return jsonify({"error": f"genre should be in {store.genres()}"}), 400
+    try:
+        cursor = resolve_cursor(
+            store, request.args.get("consumer"), request.args.get("cursor")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    timeout = min(request.args.get("timeout", 25.0, type=float), MAX_POLL_TIMEOUT)
+
+    new_cursor, records = store.wait_since(genres, cursor, max(timeout, 0.0))
+    return jsonify({"cursor": new_cursor, **records})
+
+
+@app.route("/teacher/reference", methods=["POST"])
+def update_reference():
+    """Sets the slices, or the fingerprint, of the teacher's screenshot of
+    this round, with which those of the students are compared.
+    """
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError(f"body should be an object with {board.feature}")
+        feature = board.parse(body.get(board.feature))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"round": board.set_reference(feature)})
+
+
+@app.route("/teacher/similarities", methods=["GET"])
+def get_similarities():
+    """Long-polls the similarities of the screenshots which come after the cursor.
+
+    Without cursor, those of all students of the current round are responsed
+    at once.
+    """
+    cursor = request.args.get("cursor", type=int)
+    timeout = min(request.args.get("timeout", 25.0, type=float), MAX_POLL_TIMEOUT)
+
+    round_, new_cursor, similarities = board.wait_since(cursor, max(timeout, 0.0))
+    return jsonify(
+        {"round": round_, "cursor": new_cursor, "similarities": similarities}
+    )
+
+
+def _busy():
+    return (
+        jsonify({"error": "server is busy, retry later"}),
+        503,
+        {"Retry-After": str(gate.retry_after)},
+    )
 
 
 @app.route("/student/grades", methods=["POST"])
 def update_grade():
     new_grade = request.get_json()
-    data["grades"].append(new_grade)
+    if not ingest(store, gate, {"grades": [new_grade]}):
+        return _busy()
     return jsonify(new_grade)
 
 
 @app.route("/student/screenshots", methods=["POST"])
 def update_screenshot():
     new_screenshot = request.get_json()
-    data["screenshots"].append(new_screenshot)
+    if not ingest(store, gate, {"screenshots": [new_screenshot]}):
+        return _busy()
+    board.add_screenshots((new_screenshot,))
     return jsonify(new_screenshot)
 
 
+@app.route("/student/batch", methods=["POST"])
+def update_batch():
+    """Stores the records of several genres posted at once.
+
+    The batch is validated as a whole; responses how many records of each genre
+    are stored.
+    """
+    try:
+        batch = parse_batch(request.get_json(silent=True), store.genres())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not ingest(store, gate, batch):
+        return _busy()
+    board.add_screenshots(batch.get("screenshots", ()))
+    return jsonify({genre: len(records) for genre, records in batch.items()})
+
+
 if __name__ == "__main__":
-    app.run(host=HOST, port=PORT, threaded=True, use_reloader=False)
+    args = parse_server_args("The Flask server, one thread per request.")
+    if args.database:
+        persist_to(args.database)
+    board = SimilarityBoard(mode=args.similarity)
+    app.run(host=args.host, port=args.port, threaded=True, use_reloader=False)
@@ -0,0 +1,414 @@
+import contextlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+import zlib
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from server.store import BaseRecordStore, Record
+
+
+class _Connections(NamedTuple):
+    """The read connections to all the databases, used by a thread at a time."""
+
+    shards: List[sqlite3.Connection]
+    cursors: sqlite3.Connection
+
+    def close(self) -> None:
+        for conn in self.shards:
+            conn.close()
+        self.cursors.close()
+
+
+class ShardedRecordStore(BaseRecordStore[str]):
+    """Keeps the records in SQLite databases in WAL mode, which are shared by
+    all the processes of the server on the same machine.
+
+    Records are sharded by the id of the student into several database files,
+    so processes which ingest the posts of different students seldom contend
+    for the same write lock. Each shard numbers its records on its own, so a
+    cursor is the sequence numbers of all shards, e.g., "12.0.7.3".
+
+    Writes are group-committed by a writer thread of each process; the records
+    are visible to other processes once committed. Changes made by other
+    processes are noticed by polling, which wakes up the waiting consumers.
+
+    A shard which fails to commit, e.g., locked by other processes beyond the
+    busy timeout, is rolled back and retried with an exponential backoff, so
+    the writer never dies.
+
+    Notice that records of different shards are not ordered with respect to
+    each other.
+    """
+
+    # in seconds, the first and the longest delays before retrying a shard
+    RETRY_DELAY = 0.1
+    MAX_RETRY_DELAY = 5.0
+
+    def __init__(
+        self,
+        genres: Iterable[str],
+        db_dir: str,
+        shards: int = 4,
+        capacity: int = 10_000,
+        poll_interval: float = 0.05,
+        pool_size: int = 8,
+    ) -> None:
+        """
+        Arguments:
+            genres: The kinds of records the store accepts.
+            db_dir:
+                Where the database files are, created if not exist. All processes
+                which share the records should use the same directory and the
+                same number of shards.
+            shards: The number of database files the records are sharded into.
+            capacity:
+                The max number of records kept per genre per shard. The oldest
+                records are deleted when exceeds, even if they are not yet consumed.
+            poll_interval: How often, in seconds, the changes are checked.
+            pool_size:
+                The max number of idle read connections kept per database; the
+                requests beyond it connect and close on their own.
+        """
+        self._genres = tuple(genres)
+        self._shard_files = [
+            str(Path(db_dir) / f"records-{i}.db") for i in range(shards)
+        ]
+        self._cursor_file = str(Path(db_dir) / "cursors.db")
+        self._capacity = capacity
+        self._poll_interval = poll_interval
+        Path(db_dir).mkdir(parents=True, exist_ok=True)
+        self._create_tables()
+
+        # the read connections are borrowed by the request threads, which
+        # come and go with a threaded server
+        self._pool: "queue.LifoQueue[_Connections]" = queue.LifoQueue(pool_size)
+        self._cond = threading.Condition()
+        # increases on every commit noticed
+        self._version = 0
+        self._listeners: List[Callable[[], Any]] = []
+
+        # Items are (shard no., genre, record); None tells the writer to stop.
+        self._queue: "queue.Queue[Optional[Tuple[int, str, Record]]]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._write_periodically, name="shard-writer", daemon=True
+        )
+        self._writer.start()
+        self._f_polling = True
+        self._poller = threading.Thread(
+            target=self._poll_changes, name="shard-poller", daemon=True
+        )
+        self._poller.start()
+
+    def _connect(self, db_file: str) -> sqlite3.Connection:
+        # in autocommit mode, transactions are begun explicitly; the pooled
+        # connections are used by different threads, though one at a time
+        conn = sqlite3.connect(
+            db_file, isolation_level=None, timeout=30, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    def _create_tables(self) -> None:
+        for db_file in self._shard_files:
+            conn = self._connect(db_file)
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY,
+                    genre TEXT NOT NULL,
+                    body TEXT NOT NULL
+                );"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS records_genre_seq ON records (genre, seq);"
+            )
+            conn.close()
+        conn = self._connect(self._cursor_file)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS cursors (
+                consumer TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                cursor INTEGER NOT NULL,
+                PRIMARY KEY (consumer, shard)
+            );"""
+        )
+        conn.close()
+
+    @contextlib.contextmanager
+    def _connections(self) -> Iterator[_Connections]:
+        """Borrows the read connections from the pool, or connects if there's
+        none idle, and gives them back once done.
+        """
+        try:
+            conns = self._pool.get_nowait()
+        except queue.Empty:
+            conns = _Connections(
+                [self._connect(f) for f in self._shard_files],
+                self._connect(self._cursor_file),
+            )
+        try:
+            yield conns
+        except BaseException:
+            # may be in the middle of a transaction
+            conns.close()
+            raise
+        try:
+            self._pool.put_nowait(conns)
+        except queue.Full:
+            conns.close()
+
+    def shard_of(self, record: Record) -> int:
+        """Returns the no. of the shard the record belongs to, which depends on
+        the id of the student only.
+        """
+        # crc32 instead of hash() since str hash is randomized per process
+        return zlib.crc32(str(record.get("id", "")).encode()) % len(self._shard_files)
+
+    def genres(self) -> Tuple[str, ...]:
+        return self._genres
+
+    @property
+    def initial_cursor(self) -> str:
+        return ".".join("0" * len(self._shard_files))
+
+    def parse_cursor(self, text: str) -> str:
+        self._to_seqs(text)
+        return text
+
+    def _to_seqs(self, cursor: str) -> List[int]:
+        seqs = [int(seq) for seq in cursor.split(".")]
+        if len(seqs) != len(self._shard_files) or any(seq < 0 for seq in seqs):
+            raise ValueError(
+                f"cursor should be {len(self._shard_files)} non-negative integers separated by dots"
+            )
+        return seqs
+
+    @staticmethod
+    def _to_cursor(seqs: Iterable[int]) -> str:
+        return ".".join(map(str, seqs))
+
+    def extend(self, genre: str, records: Iterable[Record]) -> None:
+        """Queues the records to be written; they are readable once committed."""
+        if genre not in self._genres:
+            raise KeyError(genre)
+        for record in records:
+            self._queue.put((self.shard_of(record), genre, record))
+
+    def read_since(
+        self, genres: Iterable[str], cursor: str
+    ) -> Tuple[str, Dict[str, List[Record]]]:
+        genres = tuple(genres)
+        result: Dict[str, List[Record]] = {genre: [] for genre in genres}
+        new_seqs: List[int] = []
+        placeholders = ", ".join("?" * len(genres))
+        with self._connections() as conns:
+            for conn, seq in zip(conns.shards, self._to_seqs(cursor)):
+                # the max seq and the records are read from the same snapshot,
+                # so no record is skipped by the new cursor
+                conn.execute("BEGIN;")
+                (last_seq,) = conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM records;"
+                ).fetchone()
+                rows = conn.execute(
+                    f"""SELECT genre, body FROM records
+                    WHERE seq > ? AND genre IN ({placeholders}) ORDER BY seq;""",
+                    (seq, *genres),
+                ).fetchall()
+                conn.execute("COMMIT;")
+                for genre, body in rows:
+                    result[genre].append(json.loads(body))
+                new_seqs.append(max(seq, last_seq))
+        return self._to_cursor(new_seqs), result
+
+    def wait_since(
+        self, genres: Iterable[str], cursor: str, timeout: float
+    ) -> Tuple[str, Dict[str, List[Record]]]:
+        genres = tuple(genres)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                version = self._version
+            # read without the lock, the version tells whether we've missed
+            # any commit in the meantime
+            new_cursor, records = self.read_since(genres, cursor)
+            remaining = deadline - time.monotonic()
+            if any(records.values()) or remaining <= 0:
+                return new_cursor, records
+            with self._cond:
+                if self._version == version:
+                    self._cond.wait(remaining)
+
+    def consumer_cursor(self, consumer: str) -> str:
+        seqs = [0] * len(self._shard_files)
+        with self._connections() as conns:
+            rows = conns.cursors.execute(
+                "SELECT shard, cursor FROM cursors WHERE consumer=?;", (consumer,)
+            ).fetchall()
+        for shard, seq in rows:
+            if shard < len(seqs):
+                seqs[shard] = seq
+        return self._to_cursor(seqs)
+
+    def set_consumer_cursor(self, consumer: str, cursor: str) -> None:
+        seqs = self._to_seqs(cursor)
+        with self._connections() as conns:
+            conns.cursors.execute("BEGIN;")
+            conns.cursors.executemany(
+                """INSERT INTO cursors (consumer, shard, cursor) VALUES (?, ?, ?)
+                ON CONFLICT (consumer, shard) DO UPDATE
+                SET cursor=MAX(cursor, excluded.cursor);""",
+                [(consumer, shard, seq) for shard, seq in enumerate(seqs)],
+            )
+            conns.cursors.execute("COMMIT;")
+
+    def consume(self, consumer: str, genre: str) -> List[Record]:
+        # NOTE: two processes consuming for the same consumer at the same time
+        # may both get the same records.
+        cursor, records = self.read_since((genre,), self.consumer_cursor(consumer))
+        self.set_consumer_cursor(consumer, cursor)
+        return records[genre]
+
+    def peek(self, consumer: str, genre: str) -> List[Record]:
+        _, records = self.read_since((genre,), self.consumer_cursor(consumer))
+        return records[genre]
+
+    def add_listener(self, listener: Callable[[], Any]) -> None:
+        """Has the listener called every time records are committed, by this
+        process or not.
+
+        The listener is called in the writer or the poller thread.
+        """
+        self._listeners.append(listener)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """Commits all the queued records and stops the threads."""
+        self._f_polling = False
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        # so its connections are closed once returns
+        self._poller.join()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _notify(self) -> None:
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def _write_periodically(self) -> None:
+        # the connections are owned by the writer thread only
+        conns = [self._connect(f) for f in self._shard_files]
+        written = [0] * len(conns)
+        stopped = False
+        while not stopped:
+            # blocks until there's something to write
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopped = True
+            per_shard: Dict[int, List[Tuple[str, str]]] = {}
+            for item in batch:
+                if item is not None:
+                    shard, genre, record = item
+                    per_shard.setdefault(shard, []).append((genre, json.dumps(record)))
+            delay = self.RETRY_DELAY
+            retries = 0
+            while per_shard:
+                failed: Dict[int, List[Tuple[str, str]]] = {}
+                for shard, rows in per_shard.items():
+                    try:
+                        self._insert(conns[shard], rows)
+                    except sqlite3.Error:
+                        traceback.print_exc()
+                        failed[shard] = rows
+                        continue
+                    written[shard] += len(rows)
+                    # delete the records out of capacity once in a while
+                    if written[shard] >= self._capacity // 10:
+                        try:
+                            self._trim(conns[shard])
+                            written[shard] = 0
+                        except sqlite3.Error:
+                            # trimmed again after the next write
+                            traceback.print_exc()
+                if len(failed) < len(per_shard):
+                    self._notify()
+                # while stopping, dropped after the first retry fails, as a
+                # crash would lose them
+                if stopped and retries:
+                    break
+                per_shard = failed
+                if per_shard:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                    retries += 1
+        for conn in conns:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, rows: List[Tuple[str, str]]) -> None:
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            conn.executemany("INSERT INTO records (genre, body) VALUES (?, ?);", rows)
+            conn.execute("COMMIT;")
+        except sqlite3.Error:
+            # so the connection isn't left in the transaction
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            raise
+
+    def _trim(self, conn: sqlite3.Connection) -> None:
+        for genre in self._genres:
+            conn.execute(
+                """DELETE FROM records WHERE genre=:genre AND seq <= (
+                    SELECT seq FROM records WHERE genre=:genre
+                    ORDER BY seq DESC LIMIT 1 OFFSET :keep
+                );""",
+                {"genre": genre, "keep": self._capacity},
+            )
+
+    def _poll_changes(self) -> None:
+        """Notifies when other connections, e.g., of other processes, commit."""
+        conns = [self._connect(f) for f in self._shard_files]
+        # data_version changes when the database is modified by other connections
+        versions = [
+            conn.execute("PRAGMA data_version;").fetchone()[0] for conn in conns
+        ]
+        while self._f_polling:
+            time.sleep(self._poll_interval)
+            new_versions = [
+                conn.execute("PRAGMA data_version;").fetchone()[0] for conn in conns
+            ]
+            if new_versions != versions:
+                versions = new_versions
+                self._notify()
+        for conn in conns:
+            conn.close()
@@ -0,0 +1,277 @@
+import contextlib
+import io
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from server.similarity import BaseSimilarityBoard
+from server.store import Record
+
+
+class SharedSimilarityBoard(BaseSimilarityBoard):
+    """Keeps the rounds in a SQLite database in WAL mode, which is shared by
+    all the processes of the server on the same machine, so the reference, the
+    screenshots and the results are the same no matter which process a
+    teacher or a student reaches.
+
+    Every write is a transaction which holds the write lock of the database, so
+    each screenshot is compared once, either when it's posted after the
+    reference or when the reference is set, and the results of all processes
+    are numbered in one sequence. Results committed by other processes are
+    noticed by polling, as ShardedRecordStore does.
+    """
+
+    def __init__(
+        self,
+        db_file: str,
+        period: float = 5 * 60,
+        grace: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        mode: str = "slices",
+        poll_interval: float = 0.05,
+    ) -> None:
+        """
+        Arguments:
+            db_file:
+                The database to keep the rounds in, created if not exists. All
+                processes should use the same one and the same mode.
+            poll_interval: How often, in seconds, the changes are checked.
+
+        See BaseSimilarityBoard for the others.
+        """
+        super().__init__(period, grace, clock, mode)
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._db_file = db_file
+        self._poll_interval = poll_interval
+        # the calls of a process take turns on one connection
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._lock:
+            self._create_tables()
+
+        self._cond = threading.Condition()
+        # increases on every commit noticed
+        self._version = 0
+        self._f_polling = True
+        self._poller = threading.Thread(
+            target=self._poll_changes, name="similarity-poller", daemon=True
+        )
+        self._poller.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # in autocommit mode, transactions are begun explicitly
+        conn = sqlite3.connect(
+            self._db_file, isolation_level=None, timeout=30, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    def _create_tables(self) -> None:
+        self._conn.execute("BEGIN IMMEDIATE;")
+        # a single row of the current round
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS current_round (round INTEGER NOT NULL);"
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS reference_features (
+                round INTEGER PRIMARY KEY,
+                feature BLOB NOT NULL
+            );"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS features (
+                round INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                feature BLOB NOT NULL,
+                PRIMARY KEY (round, id)
+            );"""
+        )
+        # AUTOINCREMENT so the cursors never go back after a round is dropped
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                cursor INTEGER PRIMARY KEY AUTOINCREMENT,
+                round INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                similarity REAL NOT NULL
+            );"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_round ON results (round, cursor);"
+        )
+        if self._conn.execute("SELECT 1 FROM current_round;").fetchone() is None:
+            self._conn.execute(
+                "INSERT INTO current_round (round) VALUES (?);",
+                (self._round_of(self._clock()),),
+            )
+        self._conn.execute("COMMIT;")
+
+    @contextlib.contextmanager
+    def _transaction(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            # a write takes the lock of the database at once, so what's read in
+            # it is still true when written
+            self._conn.execute("BEGIN IMMEDIATE;" if write else "BEGIN;")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK;")
+                raise
+            self._conn.execute("COMMIT;")
+
+    def set_reference(self, feature: np.ndarray) -> int:
+        with self._transaction(write=True) as conn:
+            round_ = self._advance(conn)
+            reference = self._reference_of(conn, round_)
+            if reference is not None and np.array_equal(reference, feature):
+                return round_
+            conn.execute(
+                "INSERT OR REPLACE INTO reference_features (round, feature) VALUES (?, ?);",
+                (round_, _to_blob(feature)),
+            )
+            features_of_students = [
+                (id_, _from_blob(blob))
+                for id_, blob in conn.execute(
+                    "SELECT id, feature FROM features WHERE round=?;", (round_,)
+                )
+            ]
+            compared = self._compare(conn, round_, feature, features_of_students)
+        if compared:
+            self._notify()
+        return round_
+
+    def add_screenshots(self, screenshots: Iterable[Record]) -> None:
+        new_features = self._parse_screenshots(screenshots)
+        if not new_features:
+            return
+        with self._transaction(write=True) as conn:
+            round_ = self._advance(conn)
+            conn.executemany(
+                "INSERT OR REPLACE INTO features (round, id, feature) VALUES (?, ?, ?);",
+                [
+                    (round_, id_, _to_blob(feature))
+                    for id_, feature in new_features.items()
+                ],
+            )
+            reference = self._reference_of(conn, round_)
+            compared = reference is not None and self._compare(
+                conn, round_, reference, list(new_features.items())
+            )
+        if compared:
+            self._notify()
+
+    def read_since(
+        self, cursor: Optional[int]
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        with self._transaction() as conn:
+            (round_,) = conn.execute("SELECT round FROM current_round;").fetchone()
+            row = conn.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name='results';"
+            ).fetchone()
+            new_cursor = row[0] if row is not None else 0
+            (first,) = conn.execute(
+                "SELECT MIN(cursor) FROM results WHERE round=?;", (round_,)
+            ).fetchone()
+            round_cursor = first - 1 if first is not None else new_cursor
+            if cursor is None or not round_cursor <= cursor <= new_cursor:
+                cursor = round_cursor
+            rows = conn.execute(
+                """SELECT id, similarity FROM results
+                WHERE round=? AND cursor > ? ORDER BY cursor;""",
+                (round_, cursor),
+            ).fetchall()
+        # the latest one of each student, in the order they're compared
+        return round_, new_cursor, list(dict(rows).items())
+
+    def wait_since(
+        self, cursor: Optional[int], timeout: float
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                version = self._version
+            # read without the lock, the version tells whether we've missed
+            # any commit in the meantime
+            round_, new_cursor, similarities = self.read_since(cursor)
+            remaining = deadline - time.monotonic()
+            if cursor is None or new_cursor != cursor or remaining <= 0:
+                return round_, new_cursor, similarities
+            with self._cond:
+                if self._version == version:
+                    self._cond.wait(remaining)
+
+    def close(self) -> None:
+        """Stops polling."""
+        self._f_polling = False
+        self._poller.join()
+        with self._lock:
+            self._conn.close()
+
+    def _advance(self, conn: sqlite3.Connection) -> int:
+        """Returns the current round, which starts if it's later; the previous
+        ones are dropped.
+        """
+        (round_,) = conn.execute("SELECT round FROM current_round;").fetchone()
+        now = self._round_of(self._clock())
+        if now <= round_:
+            return round_
+        conn.execute("UPDATE current_round SET round=?;", (now,))
+        for table in ("reference_features", "features", "results"):
+            conn.execute(f"DELETE FROM {table} WHERE round < ?;", (now,))
+        return now
+
+    @staticmethod
+    def _reference_of(conn: sqlite3.Connection, round_: int) -> Optional[np.ndarray]:
+        row = conn.execute(
+            "SELECT feature FROM reference_features WHERE round=?;", (round_,)
+        ).fetchone()
+        return _from_blob(row[0]) if row is not None else None
+
+    def _compare(
+        self,
+        conn: sqlite3.Connection,
+        round_: int,
+        reference: np.ndarray,
+        features_of_students: List[Tuple[str, np.ndarray]],
+    ) -> bool:
+        """Returns whether any is compared."""
+        results = self._similarities_to(reference, features_of_students)
+        conn.executemany(
+            "INSERT INTO results (round, id, similarity) VALUES (?, ?, ?);",
+            [(round_, id_, similarity) for id_, similarity in results],
+        )
+        return bool(results)
+
+    def _poll_changes(self) -> None:
+        """Notifies when other processes commit."""
+        conn = self._connect()
+        # data_version changes when the database is modified by other connections
+        (last_version,) = conn.execute("PRAGMA data_version;").fetchone()
+        while self._f_polling:
+            time.sleep(self._poll_interval)
+            (version,) = conn.execute("PRAGMA data_version;").fetchone()
+            if version != last_version:
+                last_version = version
+                self._notify()
+        conn.close()
+
+    def _notify(self) -> None:
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+        self._notify_listeners()
+
+
+def _to_blob(feature: np.ndarray) -> bytes:
+    # along with the dtype and shape, which differ by mode
+    buffer = io.BytesIO()
+    np.save(buffer, feature, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _from_blob(blob: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(blob), allow_pickle=False)
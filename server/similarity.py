@@ -0,0 +1,300 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from screenshot.similarity import (
+    compare_similarity_of_many_fingerprints,
+    compare_similarity_of_many_slices,
+    fingerprint_from_hex,
+)
+from server.store import Record
+
+
+# The number of slices of a screenshot, see screenshot.compare.get_compare_slices().
+SLICE_NUM = 36
+
+
+def parse_slices(value: Any) -> np.ndarray:
+    """Converts the slices posted to an array.
+
+    Raises:
+        ValueError: They're not SLICE_NUM numbers between [0, 255].
+    """
+    try:
+        slices = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"slices should be {SLICE_NUM} numbers") from None
+    if slices.shape != (SLICE_NUM,):
+        raise ValueError(f"slices should be {SLICE_NUM} numbers")
+    if not np.all((slices >= 0) & (slices <= 255)):
+        raise ValueError("slices should be between [0, 255]")
+    return slices
+
+
+def parse_fingerprint(value: Any) -> np.ndarray:
+    """Converts the fingerprint posted, in hex, to uint64 words.
+
+    Raises:
+        ValueError: It's not a multiple of 16 hex digits.
+    """
+    try:
+        return fingerprint_from_hex(value)
+    except ValueError:
+        raise ValueError("fingerprint should be a multiple of 16 hex digits") from None
+
+
+# mode -> (the key of records, how it's parsed, how many are compared with one)
+_FEATURES: Dict[
+    str,
+    Tuple[
+        str,
+        Callable[[Any], np.ndarray],
+        Callable[[np.ndarray, np.ndarray], np.ndarray],
+    ],
+] = {
+    "slices": ("slices", parse_slices, compare_similarity_of_many_slices),
+    "fingerprint": (
+        "fingerprint",
+        parse_fingerprint,
+        compare_similarity_of_many_fingerprints,
+    ),
+}
+SIMILARITY_MODES = tuple(_FEATURES)
+
+
+class BaseSimilarityBoard(ABC):
+    """Compares the screenshots of the students with the teacher's reference,
+    round by round.
+
+    A round is a period of the wall-clock of the server, the one the students
+    and the teacher take their screenshots in. Those posted early by at
+    most grace seconds belong to the next round, so those of clients whose
+    clock is slightly ahead aren't left in the previous one.
+
+    The screenshots of a round wait until the reference of the same round arrives,
+    then all of them are compared at once; those which come after are compared
+    on arrival. The results of the round are kept, so any number of teachers
+    read them without the raw slices nor comparing themselves. Every result is
+    stamped with a cursor, which increases across the rounds, so the teachers
+    long-poll only the new ones as they do with the records.
+
+    The screenshots are compared by their slices in default, or by their
+    fingerprints, whose similarity is 1 - Hamming distance / bits.
+    """
+
+    def __init__(
+        self,
+        period: float = 5 * 60,
+        grace: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        mode: str = "slices",
+    ) -> None:
+        """
+        Arguments:
+            period: In seconds, how often the screenshots are taken.
+            grace: In seconds, how early the screenshots of a round may be posted.
+            clock: Returns the seconds since the epoch.
+            mode: Compares by "slices" or "fingerprint".
+        """
+        # the key of the records to compare by
+        self.feature, self.parse, self._compare_many = _FEATURES[mode]
+        self._period = period
+        self._grace = grace
+        self._clock = clock
+        self._listeners: List[Callable[[], Any]] = []
+
+    def add_listener(self, listener: Callable[[], Any]) -> None:
+        """The listener is called, from the thread which compares, whenever
+        there are new results.
+        """
+        self._listeners.append(listener)
+
+    @abstractmethod
+    def set_reference(self, feature: np.ndarray) -> int:
+        """Sets the reference of the current round and compares the features of
+        the round with it.
+
+        Setting the same reference again, e.g., by another window of the
+        teacher, compares nothing.
+
+        Returns:
+            The round.
+        """
+
+    @abstractmethod
+    def add_screenshots(self, screenshots: Iterable[Record]) -> None:
+        """Keeps the features of the screenshots posted by the students, and
+        compares them if the reference of the round has arrived.
+
+        Those without the id or the feature, with a malformed one or not even an
+        object are ignored, they're still stored as records.
+        """
+
+    @abstractmethod
+    def read_since(
+        self, cursor: Optional[int]
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        """Reads the results after the cursor.
+
+        Arguments:
+            cursor:
+                None, or one which is not of the current round, e.g., from a
+                previous round or a previous run of the server, to read all the
+                results of the current round.
+
+        Returns:
+            The round, the new cursor and the (id, similarity) of the students;
+            only the latest one of a student is returned.
+        """
+
+    @abstractmethod
+    def wait_since(
+        self, cursor: Optional[int], timeout: float
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        """Same as read_since(), but waits until any result comes after the
+        cursor or the timeout expires.
+        """
+
+    def close(self) -> None:
+        pass
+
+    def _round_of(self, moment: float) -> int:
+        return math.floor((moment + self._grace) / self._period)
+
+    def _parse_screenshots(
+        self, screenshots: Iterable[Record]
+    ) -> Dict[str, np.ndarray]:
+        """Returns the features of the well-formed screenshots by id."""
+        features: Dict[str, np.ndarray] = {}
+        for screenshot in screenshots:
+            try:
+                features[str(screenshot["id"])] = self.parse(
+                    screenshot.get(self.feature)
+                )
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+        return features
+
+    def _similarities_to(
+        self, reference: np.ndarray, features_of_students: List[Tuple[str, np.ndarray]]
+    ) -> List[Tuple[str, float]]:
+        """Returns the (id, similarity) of the features comparable with the
+        reference.
+        """
+        # fingerprints of another size can't be compared
+        features_of_students = [
+            (id_, feature)
+            for id_, feature in features_of_students
+            if feature.shape == reference.shape
+        ]
+        if not features_of_students:
+            return []
+        similarities = self._compare_many(
+            np.stack([feature for _, feature in features_of_students]), reference
+        ).tolist()
+        return list(zip([id_ for id_, _ in features_of_students], similarities))
+
+    def _notify_listeners(self) -> None:
+        for listener in self._listeners:
+            listener()
+
+
+class SimilarityBoard(BaseSimilarityBoard):
+    """Keeps the rounds in memory, which is for a single process."""
+
+    def __init__(
+        self,
+        period: float = 5 * 60,
+        grace: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        mode: str = "slices",
+    ) -> None:
+        super().__init__(period, grace, clock, mode)
+        self._cond = threading.Condition()
+
+        self._round = self._round_of(clock())
+        self._reference: Optional[np.ndarray] = None
+        # the features and similarities of the students in this round, by id
+        self._features: Dict[str, np.ndarray] = {}
+        self._similarities: Dict[str, float] = {}
+        # (id, similarity) in the order they're compared; the cursor of the
+        # first of them is self._round_cursor
+        self._results: List[Tuple[str, float]] = []
+        self._round_cursor = 0
+
+    @property
+    def cursor(self) -> int:
+        """The cursor of the next result."""
+        with self._cond:
+            return self._round_cursor + len(self._results)
+
+    def set_reference(self, feature: np.ndarray) -> int:
+        with self._cond:
+            self._advance_to(self._round_of(self._clock()))
+            if self._reference is not None and np.array_equal(self._reference, feature):
+                return self._round
+            self._reference = feature
+            self._compare(list(self._features.items()))
+            return self._round
+
+    def add_screenshots(self, screenshots: Iterable[Record]) -> None:
+        new_features = self._parse_screenshots(screenshots)
+        if not new_features:
+            return
+        with self._cond:
+            self._advance_to(self._round_of(self._clock()))
+            self._features.update(new_features)
+            if self._reference is not None:
+                self._compare(list(new_features.items()))
+
+    def read_since(
+        self, cursor: Optional[int]
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        with self._cond:
+            return self._read_since(cursor)
+
+    def wait_since(
+        self, cursor: Optional[int], timeout: float
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        with self._cond:
+            if cursor is not None:
+                self._cond.wait_for(
+                    lambda: self._round_cursor + len(self._results) != cursor,
+                    timeout,
+                )
+            return self._read_since(cursor)
+
+    def _advance_to(self, round_: int) -> None:
+        """Starts a new round if it's later; the previous one is dropped."""
+        if round_ <= self._round:
+            return
+        self._round_cursor += len(self._results)
+        self._round = round_
+        self._reference = None
+        self._features = {}
+        self._similarities = {}
+        self._results = []
+
+    def _compare(self, features_of_students: List[Tuple[str, np.ndarray]]) -> None:
+        assert self._reference is not None
+        results = self._similarities_to(self._reference, features_of_students)
+        if not results:
+            return
+        self._similarities.update(results)
+        self._results.extend(results)
+        self._cond.notify_all()
+        self._notify_listeners()
+
+    def _read_since(
+        self, cursor: Optional[int]
+    ) -> Tuple[int, int, List[Tuple[str, float]]]:
+        new_cursor = self._round_cursor + len(self._results)
+        if cursor is None or not self._round_cursor <= cursor <= new_cursor:
+            return self._round, new_cursor, list(self._similarities.items())
+        # the latest one of each student, in the order they're compared
+        latest = dict(self._results[cursor - self._round_cursor :])
+        return self._round, new_cursor, list(latest.items())
@@ -0,0 +1,324 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+
+if TYPE_CHECKING:
+    from server.journal import SqliteJournal
+
+
+Record = Dict[str, Any]
+# What a cursor looks like depends on the store, but it's always JSON
+# serializable and can be parsed back from its str form with parse_cursor().
+C = TypeVar("C", int, str)
+
+
+class BaseRecordStore(ABC, Generic[C]):
+    """The storage layer shared by all variants of the server.
+
+    A cursor marks the position of a consumer in the records of all genres;
+    records read with a cursor are those which come after it, and the cursor
+    returned along with them is where the consumer should continue from.
+    """
+
+    @abstractmethod
+    def genres(self) -> Tuple[str, ...]:
+        pass
+
+    @property
+    @abstractmethod
+    def initial_cursor(self) -> C:
+        """The cursor which comes before all records."""
+
+    @abstractmethod
+    def parse_cursor(self, text: str) -> C:
+        """
+        Raises:
+            ValueError: The text is not a cursor of this store.
+        """
+
+    def append(self, genre: str, record: Record) -> Optional[int]:
+        """Appends the record to the end of the genre.
+
+        Returns:
+            Same as extend().
+
+        Raises:
+            KeyError: The genre is not one of the genres of the store.
+        """
+        return self.extend(genre, (record,))
+
+    @abstractmethod
+    def extend(self, genre: str, records: Iterable[Record]) -> Optional[int]:
+        """Appends the records to the end of the genre in order.
+
+        Returns:
+            The sequence number of the last record if the store knows it right
+            away, None otherwise.
+
+        Raises:
+            KeyError: The genre is not one of the genres of the store.
+        """
+
+    @abstractmethod
+    def read_since(
+        self, genres: Iterable[str], cursor: C
+    ) -> Tuple[C, Dict[str, List[Record]]]:
+        """Reads the records which come after the cursor.
+
+        Returns:
+            The new cursor and the records of each genre.
+        """
+
+    @abstractmethod
+    def wait_since(
+        self, genres: Iterable[str], cursor: C, timeout: float
+    ) -> Tuple[C, Dict[str, List[Record]]]:
+        """Same as read_since, but blocks until any record comes after the cursor
+        or the timeout expires.
+
+        Arguments:
+            timeout: In seconds.
+        """
+
+    @abstractmethod
+    def consumer_cursor(self, consumer: str) -> C:
+        """Returns the cursor remembered for the consumer, the initial cursor
+        if never seen.
+        """
+
+    @abstractmethod
+    def set_consumer_cursor(self, consumer: str, cursor: C) -> None:
+        """Remembers the cursor of the consumer. Cs never go backwards."""
+
+    @abstractmethod
+    def consume(self, consumer: str, genre: str) -> List[Record]:
+        """Returns the records which haven't been consumed by the consumer and
+        marks them as consumed.
+        """
+
+    @abstractmethod
+    def peek(self, consumer: str, genre: str) -> List[Record]:
+        """Returns the records which haven't been consumed by the consumer
+        without marking them.
+        """
+
+    @abstractmethod
+    def add_listener(self, listener: Callable[[], Any]) -> None:
+        """Has the listener called every time records are appended.
+
+        The listener may be called in any thread, so consumers which can't
+        block on wait_since, e.g., coroutines, should hand the notification
+        over to their own thread.
+        """
+
+    def pending(self) -> int:
+        """Returns the approximate number of records appended but not yet stored."""
+        return 0
+
+    def close(self) -> None:
+        """Releases the resources and flushes what's not yet persisted."""
+
+
+class RecordStore(BaseRecordStore[int]):
+    """Keeps the records posted by students in a bounded ring buffer per genre.
+
+    Every record is stamped with a sequence number which increases across all
+    genres, so a single cursor is enough for a consumer to know which records
+    it has already seen, no matter how many genres it listens to.
+    Consumers may also have the store remember their cursors by name.
+    """
+
+    def __init__(
+        self,
+        genres: Iterable[str],
+        capacity: int = 10_000,
+        journal: Optional["SqliteJournal"] = None,
+    ) -> None:
+        """
+        Arguments:
+            genres: The kinds of records the store accepts.
+            capacity:
+                The max number of records kept per genre. The oldest records
+                are dropped when exceeds, even if they are not yet consumed.
+            journal:
+                If provided, the records and cursors are persisted into it, and
+                those persisted last time are recovered.
+        """
+        self._buffers: Dict[str, Deque[Tuple[int, Record]]] = {
+            genre: deque(maxlen=capacity) for genre in genres
+        }
+        self._last_seq = 0
+        self._cursors: Dict[str, int] = {}
+        # guards all the states above and wakes up the waiting consumers
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], Any]] = []
+
+        self._journal = journal
+        if journal is not None:
+            self._recover_from_journal(journal, capacity)
+
+    def _recover_from_journal(self, journal: "SqliteJournal", capacity: int) -> None:
+        for genre, buffer in self._buffers.items():
+            # records out of the ring buffer are never read again
+            journal.trim(genre, capacity)
+            buffer.extend(journal.load_records(genre, capacity))
+        self._cursors.update(journal.load_cursors())
+        self._last_seq = journal.last_seq()
+        # and trimmed by the writer of the journal from now on
+        journal.capacity = capacity
+
+    def add_listener(self, listener: Callable[[], Any]) -> None:
+        """Has the listener called every time records are appended.
+
+        The listener is called in the thread which appends the records.
+        """
+        self._listeners.append(listener)
+
+    def pending(self) -> int:
+        """Returns the number of writes the journal hasn't committed."""
+        return self._journal.pending() if self._journal is not None else 0
+
+    def close(self) -> None:
+        """Flushes the journal if there's one."""
+        if self._journal is not None:
+            self._journal.close()
+
+    def genres(self) -> Tuple[str, ...]:
+        return tuple(self._buffers.keys())
+
+    @property
+    def initial_cursor(self) -> int:
+        return 0
+
+    def parse_cursor(self, text: str) -> int:
+        cursor = int(text)
+        if cursor < 0:
+            raise ValueError("cursor should be non-negative")
+        return cursor
+
+    @property
+    def cursor(self) -> int:
+        """The sequence number of the latest record."""
+        return self._last_seq
+
+    def extend(self, genre: str, records: Iterable[Record]) -> int:
+        """Appends the records to the end of the genre in order.
+
+        Returns:
+            The sequence number of the last record.
+
+        Raises:
+            KeyError: The genre is not one of the genres of the store.
+        """
+        buffer = self._buffers[genre]
+        with self._cond:
+            for record in records:
+                self._last_seq += 1
+                buffer.append((self._last_seq, record))
+                if self._journal is not None:
+                    # queued under the lock to keep the order of seq
+                    self._journal.write_record(self._last_seq, genre, record)
+            self._cond.notify_all()
+            last_seq = self._last_seq
+        for listener in self._listeners:
+            listener()
+        return last_seq
+
+    def read_since(
+        self, genres: Iterable[str], cursor: int
+    ) -> Tuple[int, Dict[str, List[Record]]]:
+        """Reads the records which come after the cursor.
+
+        Returns:
+            The new cursor and the records of each genre in the order they were
+            appended. Records that have been dropped out of the ring buffer are
+            not recoverable.
+        """
+        with self._cond:
+            return self._read_since(genres, cursor)
+
+    def wait_since(
+        self, genres: Iterable[str], cursor: int, timeout: float
+    ) -> Tuple[int, Dict[str, List[Record]]]:
+        """Same as read_since, but blocks until any record comes after the cursor
+        or the timeout expires.
+
+        Arguments:
+            timeout: In seconds.
+        """
+        genres = tuple(genres)
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._has_new_records(genres, cursor), timeout=timeout
+            )
+            return self._read_since(genres, cursor)
+
+    def consumer_cursor(self, consumer: str) -> int:
+        """Returns the cursor remembered for the consumer, 0 if never seen."""
+        with self._cond:
+            return self._cursors.get(consumer, 0)
+
+    def set_consumer_cursor(self, consumer: str, cursor: int) -> None:
+        """Remembers the cursor of the consumer. Cursors never go backwards."""
+        with self._cond:
+            self._update_cursor(consumer, cursor)
+
+    def consume(self, consumer: str, genre: str) -> List[Record]:
+        """Returns the records which haven't been consumed by the consumer and
+        marks them as consumed.
+        """
+        with self._cond:
+            cursor, records = self._read_since((genre,), self._cursors.get(consumer, 0))
+            self._update_cursor(consumer, cursor)
+            return records[genre]
+
+    def peek(self, consumer: str, genre: str) -> List[Record]:
+        """Returns the records which haven't been consumed by the consumer
+        without marking them.
+        """
+        with self._cond:
+            _, records = self._read_since((genre,), self._cursors.get(consumer, 0))
+            return records[genre]
+
+    def _update_cursor(self, consumer: str, cursor: int) -> None:
+        cursor = max(cursor, self._cursors.get(consumer, 0))
+        if cursor != self._cursors.get(consumer):
+            self._cursors[consumer] = cursor
+            if self._journal is not None:
+                self._journal.write_cursor(consumer, cursor)
+
+    def _has_new_records(self, genres: Tuple[str, ...], cursor: int) -> bool:
+        return any(
+            self._buffers[genre] and self._buffers[genre][-1][0] > cursor
+            for genre in genres
+        )
+
+    def _read_since(
+        self, genres: Iterable[str], cursor: int
+    ) -> Tuple[int, Dict[str, List[Record]]]:
+        result: Dict[str, List[Record]] = {}
+        for genre in genres:
+            new_records: List[Record] = []
+            # New records are at the right end, so walk backwards and stop
+            # at the first one seen, which costs only the number of new records.
+            for seq, record in reversed(self._buffers[genre]):
+                if seq <= cursor:
+                    break
+                new_records.append(record)
+            new_records.reverse()
+            result[genre] = new_records
+        return self._last_seq, result
@@ -0,0 +1,135 @@
+import random
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import requests
+
+from server.ingest import MAX_BATCH_SIZE
+from server.store import Record
+
+
+class BatchUploader:
+    """Uploads the records of a student to the server in batches by a
+    background thread, so posting never blocks the caller.
+
+    Records put within a short linger are posted together through
+    POST /student/batch. A batch refused by a busy server is kept and retried
+    after the Retry-After it hints, plus a random jitter so the students don't
+    come back all at once; one which fails to connect or with a server error,
+    e.g., of a restarting server, is retried with exponential backoff. Only
+    the batch rejected as malformed (4xx) is dropped. At most max_pending
+    records are kept, the oldest are dropped when exceeds.
+    """
+
+    MAX_BACKOFF = 60.0
+
+    def __init__(
+        self,
+        server_url: str,
+        linger: float = 1.0,
+        max_pending: int = 1_000,
+        timeout: float = 10.0,
+    ) -> None:
+        """
+        Arguments:
+            server_url: e.g., "http://127.0.0.1:5000".
+            linger: In seconds. How long to wait for more records before posting.
+            max_pending: The max number of records kept for uploading.
+            timeout: In seconds. How long a post may take.
+        """
+        self._url = f"{server_url}/student/batch"
+        self._linger = linger
+        self._timeout = timeout
+        self._pending: Deque[Tuple[str, Record]] = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._session = requests.Session()
+        self._backoff = 0.0
+        self._thread = threading.Thread(
+            target=self._upload_continuously, name="batch-uploader", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, genre: str, record: Record) -> None:
+        """Queues the record to be uploaded; returns immediately."""
+        with self._cond:
+            self._pending.append((genre, record))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """Returns the number of records not yet uploaded."""
+        with self._cond:
+            return len(self._pending)
+
+    def close(self, timeout: float = 3.0) -> None:
+        """Uploads what's pending once more without retrying, then stops."""
+        self._closed.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _upload_continuously(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed.is_set():
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # so the records put at about the same moment go together
+            self._closed.wait(self._linger)
+            with self._cond:
+                batch = [
+                    self._pending.popleft()
+                    for _ in range(min(len(self._pending), MAX_BATCH_SIZE))
+                ]
+            delay = self._post(batch)
+            if delay is None:
+                continue
+            if self._closed.is_set():
+                return
+            self._requeue(batch)
+            self._closed.wait(delay)
+
+    def _post(self, batch: List[Tuple[str, Record]]) -> Optional[float]:
+        """Posts the batch.
+
+        Returns:
+            In seconds, how long to wait before the batch is retried; None if
+            it shouldn't be, either it's stored or rejected as malformed.
+        """
+        body: Dict[str, List[Record]] = {}
+        for genre, record in batch:
+            body.setdefault(genre, []).append(record)
+        try:
+            response = self._session.post(self._url, json=body, timeout=self._timeout)
+        except requests.RequestException:
+            # may be caused by server not running
+            return self._back_off()
+        if response.status_code in (429, 503):
+            self._backoff = 0.0
+            try:
+                retry_after = float(response.headers.get("Retry-After", "1"))
+            except ValueError:
+                # an HTTP date, which our server never sends
+                retry_after = 1.0
+            return retry_after + random.uniform(0, retry_after)
+        if response.status_code >= 500:
+            # e.g., 502 from a proxy while the server restarts
+            return self._back_off()
+        self._backoff = 0.0
+        # a malformed batch won't be accepted no matter how many times retried
+        return None
+
+    def _back_off(self) -> float:
+        """Returns the next exponential backoff, with a random jitter."""
+        self._backoff = min(max(self._backoff * 2, 1.0), self.MAX_BACKOFF)
+        return self._backoff * random.uniform(0.5, 1.0)
+
+    def _requeue(self, batch: List[Tuple[str, Record]]) -> None:
+        """Puts the batch back in front of those put in the meantime."""
+        with self._cond:
+            room = self._pending.maxlen - len(self._pending)  # type: ignore[operator]
+            # keep the newest if there's no room for all
+            for item in reversed(batch[max(len(batch) - room, 0) :]):
+                self._pending.appendleft(item)
@@ -0,0 +1,148 @@
+import math
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from teacher.grade_database import LOW_GRADE
+from util.quantile import P2Quantile
+from util.time import ONE_MIN
+
+
+# A screen is considered off the teacher's if the similarity is lower than this.
+LOW_SIMILARITY = 0.6
+
+
+class ConcentrationStats:
+    """Statistics of the grades and screen similarities of a class, maintained
+    incrementally: adding a grade or a similarity costs O(1), no grade is kept
+    but the latest of each student.
+
+    The mean and median are of all the grades added; the fractions and counts
+    of low ones are of the students, by their latest grade or similarity.
+    """
+
+    def __init__(self) -> None:
+        self._count = 0
+        self._sum = 0.0
+        self._median = P2Quantile(0.5)
+        self._latest_grades: Dict[str, float] = {}
+        self._low_grade_count = 0
+        self._latest_similarities: Dict[str, float] = {}
+        self._low_screen_count = 0
+
+    @property
+    def count(self) -> int:
+        """The number of grades added."""
+        return self._count
+
+    @property
+    def student_count(self) -> int:
+        """The number of students who have any grade."""
+        return len(self._latest_grades)
+
+    @property
+    def mean(self) -> float:
+        """NaN if there's no grade."""
+        return self._sum / self._count if self._count else math.nan
+
+    @property
+    def median(self) -> float:
+        """Estimated by a streaming quantile sketch; NaN if there's no grade."""
+        return self._median.value
+
+    @property
+    def fraction_below(self) -> float:
+        """The fraction of students whose latest grade is lower than LOW_GRADE;
+        NaN if there's no student.
+        """
+        if not self._latest_grades:
+            return math.nan
+        return self._low_grade_count / len(self._latest_grades)
+
+    @property
+    def low_screen_count(self) -> int:
+        """The number of students whose latest similarity of screen is lower
+        than LOW_SIMILARITY.
+        """
+        return self._low_screen_count
+
+    def add_grade(self, student_id: str, grade: float) -> None:
+        self._count += 1
+        self._sum += grade
+        self._median.add(grade)
+        self._low_grade_count += self._low_change(
+            self._latest_grades.get(student_id), grade, LOW_GRADE
+        )
+        self._latest_grades[student_id] = grade
+
+    def add_similarity(self, student_id: str, similarity: float) -> None:
+        self._low_screen_count += self._low_change(
+            self._latest_similarities.get(student_id), similarity, LOW_SIMILARITY
+        )
+        self._latest_similarities[student_id] = similarity
+
+    @staticmethod
+    def _low_change(old: Optional[float], new: float, threshold: float) -> int:
+        """Returns how the count of low ones changes when old is replaced by new."""
+        was_low = old is not None and old < threshold
+        return int(new < threshold) - int(was_low)
+
+
+class ClassAggregates:
+    """Keeps the ConcentrationStats of the lesson and of each time bucket in it.
+
+    A grade belongs to the bucket its time falls in; a similarity to the bucket
+    it's added in, since it's compared right after the screenshots are taken.
+    Only the latest max_buckets buckets are kept.
+    """
+
+    def __init__(
+        self,
+        lesson: int,
+        bucket_size: int = 5 * ONE_MIN,
+        max_buckets: int = 12 * 24,
+    ) -> None:
+        """
+        Arguments:
+            lesson: In seconds since the epoch, when the lesson starts.
+                Grades earlier than it are not counted.
+            bucket_size: In seconds, how long a bucket is, aligned to the epoch.
+            max_buckets: The max number of buckets kept.
+        """
+        self.lesson = lesson
+        self._bucket_size = bucket_size
+        self._max_buckets = max_buckets
+        self.lesson_stats = ConcentrationStats()
+        self._buckets: "OrderedDict[int, ConcentrationStats]" = OrderedDict()
+
+    def add_grade(self, student_id: str, time: datetime, grade: float) -> None:
+        moment = time.timestamp()
+        if moment < self.lesson:
+            return
+        self.lesson_stats.add_grade(student_id, grade)
+        self._bucket_at(moment).add_grade(student_id, grade)
+
+    def add_similarity(self, student_id: str, similarity: float, moment: float) -> None:
+        self.lesson_stats.add_similarity(student_id, similarity)
+        self._bucket_at(moment).add_similarity(student_id, similarity)
+
+    def latest_bucket(self) -> Optional[Tuple[datetime, ConcentrationStats]]:
+        """Returns the start time and stats of the latest bucket; None if none."""
+        if not self._buckets:
+            return None
+        start = next(reversed(self._buckets))
+        return datetime.fromtimestamp(start), self._buckets[start]
+
+    def _bucket_at(self, moment: float) -> ConcentrationStats:
+        start = int(moment // self._bucket_size * self._bucket_size)
+        stats = self._buckets.get(start)
+        if stats is not None:
+            return stats
+        # grades of an older bucket may arrive late, keep the buckets in order
+        out_of_order = bool(self._buckets) and start < next(reversed(self._buckets))
+        stats = self._buckets[start] = ConcentrationStats()
+        if out_of_order:
+            self._buckets = OrderedDict(sorted(self._buckets.items()))
+        while len(self._buckets) > self._max_buckets:
+            self._buckets.popitem(last=False)
+        return stats
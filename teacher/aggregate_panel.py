@@ -0,0 +1,98 @@
+import math
+from datetime import datetime
+from typing import Mapping, Optional, Tuple
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QGridLayout, QLabel, QWidget
+
+from teacher.aggregate import ConcentrationStats
+
+
+class AggregatePanel(QWidget):
+    """Shows the statistics of the whole class, of the lesson and of the latest
+    time bucket.
+
+        |        |mean |median |below 0.6 |low screen |
+        |lesson  |0.72 |0.75   |20%       |3          |
+        |10:05 ~ |0.68 |0.70   |25%       |3          |
+    """
+
+    # the keys of the texts, in the order of the columns
+    COLUMNS = ("mean", "median", "below", "low_screen")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._texts = {
+            "lesson": "lesson",
+            "mean": "mean",
+            "median": "median",
+            "below": "below 0.6",
+            "low_screen": "low screen",
+        }
+        self._bucket_start: Optional[datetime] = None
+        self._layout = QGridLayout()
+        self.setLayout(self._layout)
+        self._create_labels()
+
+    def _create_labels(self) -> None:
+        font = QFont("Microsoft JhengHei UI", 9)
+        # (row, col) -> label; the row and col names are at 0
+        self._labels = {}
+        for row in range(3):
+            for col in range(len(self.COLUMNS) + 1):
+                label = QLabel("-" if row and col else "")
+                label.setFont(font)
+                if col:
+                    label.setAlignment(Qt.AlignCenter)
+                self._layout.addWidget(label, row, col)
+                self._labels[(row, col)] = label
+        self._show_texts()
+
+    def change_language(self, texts: Mapping[str, str]) -> None:
+        """
+        Arguments:
+            texts: The texts of "lesson" and those in COLUMNS.
+        """
+        self._texts.update(texts)
+        self._show_texts()
+
+    def _show_texts(self) -> None:
+        for col, key in enumerate(self.COLUMNS, start=1):
+            self._labels[(0, col)].setText(self._texts[key])
+        self._labels[(1, 0)].setText(self._texts["lesson"])
+        self._labels[(2, 0)].setText(
+            f"{self._bucket_start:%H:%M} ~" if self._bucket_start is not None else ""
+        )
+
+    def show_stats(
+        self,
+        lesson: ConcentrationStats,
+        bucket: Optional[Tuple[datetime, ConcentrationStats]],
+    ) -> None:
+        """Shows the stats of the lesson and the latest bucket, which is left
+        blank if it's None.
+        """
+        self._show_row(1, lesson)
+        if bucket is None:
+            self._bucket_start = None
+            for col in range(1, len(self.COLUMNS) + 1):
+                self._labels[(2, col)].setText("-")
+        else:
+            self._bucket_start, stats = bucket
+            self._show_row(2, stats)
+        self._show_texts()
+
+    def _show_row(self, row: int, stats: ConcentrationStats) -> None:
+        values = (
+            self._format(stats.mean, "{:.2f}"),
+            self._format(stats.median, "{:.2f}"),
+            self._format(stats.fraction_below, "{:.0%}"),
+            str(stats.low_screen_count),
+        )
+        for col, text in enumerate(values, start=1):
+            self._labels[(row, col)].setText(text)
+
+    @staticmethod
+    def _format(value: float, form: str) -> str:
+        return "-" if math.isnan(value) else form.format(value)
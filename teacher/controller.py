@@ -1,98 +1,111 @@
 import atexit
+import logging
 import math
-import sqlite3
 import time
 from configparser import ConfigParser
 from datetime import datetime, timedelta
 from decimal import Decimal
-from pathlib import Path
-from typing import Any, Dict, List, Mapping
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
 import requests
-from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import QObject, Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QBrush
-from PyQt5.QtWidgets import QTreeWidgetItem
 
 import server.main as flask_server
 from gui.language import Language
-from screenshot.compare import (
-    compare_similarity_of_slices,
-    get_compare_slices,
-    get_screenshot,
-)
+from screenshot.capture import shared_screen_capture
+from screenshot.compare import get_compare_slices
+from screenshot.fingerprint import difference_hash
+from screenshot.similarity import fingerprint_to_hex
+from teacher.aggregate import LOW_SIMILARITY, ClassAggregates
+from teacher.grade_database import GradeDatabase
 from teacher.monitor import Col, Monitor, RowContent
 from util.path import to_abs_path
+from util.scheduler import shared_scheduler
+from util.lazy_import import lazy_import
 from util.task_worker import TaskWorker
-from util.time import to_date_time
+from util.time import DATE_STR_FORMAT, ONE_MIN, to_date_time
 
 
-# TODO: I suggest that the control of databse be extracted
-DATE_STR_FORMAT = "%Y-%m-%d, %H:%M:%S"
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+else:
+    # only the chart of histories needs it
+    plt = lazy_import("matplotlib.pyplot")
 
 
 class MonitorController(QObject):
-    """Data logic, server communitcation and database managemnt are mixed into
-    the controller for simplicity.
+    """Data logic and server communitcation are mixed into the controller for
+    simplicity; the grades are kept by GradeDatabase.
     """
 
     # private signal for thread communitcation;
-    # sends the student id with the similarity of screenshot slice
-    _s_screen_similarity_refreshed = pyqtSignal(str, float)
+    # sends the (student id, similarity of screenshot slices) compared by the server
+    _s_screen_similarities_refreshed = pyqtSignal(list)
+    # private signal for thread communitcation;
+    # sends a batch of new grades pushed by the server, decoded and stored
+    _s_grades_fetched = pyqtSignal(list)
+
+    # the name the server remembers our cursor by
+    CONSUMER_NAME = "monitor"
+    # how long a long-poll request is held by the server at most, in seconds
+    POLL_TIMEOUT = 25
+    # how long to wait before the next try if the server can't be reached
+    RETRY_INTERVAL = 5
+    # how often the screenshots are taken, in seconds
+    SCREENSHOT_PERIOD = 5 * ONE_MIN
 
     def __init__(self, monitor: Monitor) -> None:
         super().__init__()
         self._monitor = monitor
 
-        self._connect_database()
-        self._table_name = "monitor"
-        self._create_table_if_not_exist()
+        self._CONFIG_FILE = to_abs_path("./teacher/config.ini")
+        self._init_global_config()
+        atexit.register(self._store_global_config)
+
+        self._database = GradeDatabase(
+            to_abs_path("teacher/database/concentration_grade.db"),
+            retention_days=self._retention_days,
+        )
+        # statistics of the class in this lesson, updated as grades come
+        self._aggregates = ClassAggregates(self._database.lesson)
+        self._set_up_monitor()
         self._connect_signals()
 
         self._server_url = f"http://{flask_server.HOST}:{flask_server.PORT}"
-        self._fetch_timer = QTimer()
-        self._fetch_timer.timeout.connect(self._get_grades_from_server)
-        self._fetch_timer.start(30 * 1000)  # 30 sec
+        self._fetch_worker = TaskWorker(self._listen_to_grades_from_server)
+        self._fetch_worker.start()
 
-        self._screenshot_worker = TaskWorker(self._get_screenshot_slices_periodically)
-        self._compare_worker = TaskWorker(
-            self._compare_screenshot_similarity_periodically
+        # The slices of the teacher's screenshot are taken on the same boundaries
+        # as the students', and uploaded for the server to compare theirs with.
+        self._screenshot_job = shared_scheduler().every(
+            self.SCREENSHOT_PERIOD, self._upload_screenshot_slices
         )
-        self._screenshot_worker.start()
-        self._compare_worker.start()
-
-        self._CONFIG_FILE = to_abs_path("./teacher/config.ini")
-        self._init_global_config()
-        atexit.register(self._store_global_config)
+        self._similarity_worker = TaskWorker(self._listen_to_similarities_from_server)
+        self._similarity_worker.start()
 
-        # Have the connection of database and timer closed right before
+        # Have the database flushed and closed right before
         # the controller is destoryed.
         # NOTE: we've tried to listen to the "destoryed" signal of QMainWindow,
         # but such signal seems not guaranteed to always be emitted.
-        atexit.register(self._conn.close)
-
-    def _connect_database(self) -> None:
-        db = Path(to_abs_path("teacher/database/concentration_grade.db"))
-        # create database if not exist
-        db.parent.mkdir(parents=True, exist_ok=True)
-        db.touch()
-        # PARSE_DECLTYPES so TIMESTAMP may be converted back to datetime
-        self._conn = sqlite3.connect(
-            db, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        atexit.register(self._database.close)
+
+    def _set_up_monitor(self) -> None:
+        """Has the rows sorted by grade, and colored by grade and screen."""
+        good = QBrush(Qt.green, Qt.Dense4Pattern)
+        bad = QBrush(Qt.red, Qt.Dense4Pattern)
+        # Green if the grade is higher than 0.8, else red,
+        # which implies the status of the specific student.
+        self._monitor.set_background_rule(
+            "grade", lambda grade: good if grade >= 0.8 else bad
         )
-        # so we can retrieve rows as dictionary
-        self._conn.row_factory = sqlite3.Row
-
-    def _create_table_if_not_exist(self) -> None:
-        """Creates table if database is empty."""
-        sql = f"""CREATE TABLE IF NOT EXISTS {self._table_name} (
-            id TEXT,
-            time TIMESTAMP,
-            grade FLOAT
-        );"""
-        with self._conn:
-            self._conn.execute(sql)
+        self._monitor.set_background_rule(
+            "screen", lambda similarity: good if similarity >= LOW_SIMILARITY else bad
+        )
+        self._monitor.sort_rows_by_label("grade", Qt.AscendingOrder)
 
     def _connect_signals(self):
         self._monitor.s_item_clicked.connect(
@@ -100,35 +113,99 @@ class MonitorController(QObject):
             if label == "grade"
             else None
         )
-        self._monitor.s_item_collapsed.connect(
-            lambda student_id: self._monitor.remove_histories_of_row(
-                self._monitor.search_row_no(("id", student_id))
-            )
-        )
+        self._monitor.s_item_collapsed.connect(self._monitor.remove_histories_of_row)
         self._monitor.s_item_expanded.connect(self._show_histories_on_monitor)
-        self._s_screen_similarity_refreshed.connect(
-            self._show_similarity_of_screenshot_to_monitor
+        self._s_screen_similarities_refreshed.connect(
+            self._show_similarities_of_screenshot_to_monitor
         )
+        self._s_grades_fetched.connect(self.show_new_grades)
         # index is designed to be as same as the value of enum Language
         self._monitor.combox.currentIndexChanged.connect(
             self._change_language_of_monitor
         )
 
-    def _get_grades_from_server(self) -> None:
-        """Get new grades from the server and
-        (1) stores into the database (2) updates to the GUI.
-        """
-        r = requests.get(f"{self._server_url}/teacher", params={"genre": "grades"})
-        for datum in r.json():
-            # Convert time string to datetime.
-            datum["time"] = datetime.strptime(datum["time"], DATE_STR_FORMAT)
+    def _listen_to_grades_from_server(self) -> None:
+        """Long-polls the server for new grades, stores them and sends them to
+        the GUI thread batch by batch.
 
-            self.store_new_grade(datum)
-            self.show_new_grade(datum)
+        The server holds the request until new grades arrive, so grades are
+        received right after they are posted while an idle class costs only a
+        request per POLL_TIMEOUT. All but showing is done in this thread, so
+        a slow server or a large batch doesn't freeze the monitor.
+        """
+        # keeps the connection alive between the polls
+        session = requests.Session()
+        # opaque to us, its form depends on how the server stores the records
+        cursor: Optional[Any] = None
+        while True:
+            params: Dict[str, Any] = {
+                "genre": "grades",
+                "consumer": self.CONSUMER_NAME,
+                "timeout": self.POLL_TIMEOUT,
+            }
+            # Without cursor, the server continues from where we were last time.
+            if cursor is not None:
+                params["cursor"] = cursor
+            try:
+                r = session.get(
+                    f"{self._server_url}/teacher/events",
+                    params=params,
+                    timeout=self.POLL_TIMEOUT + 5,
+                )
+                r.raise_for_status()
+            except requests.RequestException:
+                # The server may not be running, try again later.
+                time.sleep(self.RETRY_INTERVAL)
+                continue
+            try:
+                events = r.json()
+                new_cursor = events["cursor"]
+                grades = events["grades"]
+            except (ValueError, KeyError, TypeError):
+                # not a response of our server, e.g., of a proxy in between
+                time.sleep(self.RETRY_INTERVAL)
+                continue
+            cursor = new_cursor
+            grades = self._decode_grades(grades)
+            if grades:
+                # queued as a whole, so the batch is committed together
+                self._database.insert_grades(grades)
+                self._s_grades_fetched.emit(grades)
+
+    @staticmethod
+    def _decode_grades(grades: Any) -> List[Dict[str, Any]]:
+        """Converts the time strings of the grades to datetimes in place.
+
+        The server relays whatever the students post, so the malformed grades
+        are skipped one by one, and the others are still returned.
+        """
+        if not isinstance(grades, list):
+            logger.warning("skipped grades which are not a list: %r", grades)
+            return []
+        # The grades of a batch are mostly graded on the same boundaries,
+        # so they share only a few distinct times.
+        times: Dict[str, datetime] = {}
+        decoded: List[Dict[str, Any]] = []
+        for datum in grades:
+            try:
+                time_str = datum["time"]
+                if time_str not in times:
+                    times[time_str] = datetime.strptime(time_str, DATE_STR_FORMAT)
+                datum["time"] = times[time_str]
+                # as the database stores them
+                datum["id"] = str(datum["id"])
+                datum["grade"] = float(datum["grade"])
+                if "start" in datum:
+                    datum["start"] = int(datum["start"])
+            except (KeyError, TypeError, ValueError):
+                logger.warning("skipped a malformed grade: %r", datum)
+                continue
+            decoded.append(datum)
+        return decoded
 
     def _get_histories_from_database(
         self, student_id: str, amount: int
-    ) -> List[sqlite3.Row]:
+    ) -> List[Dict[str, Any]]:
         """Gets latest histories of the student specified by id from the database.
 
         Histories are in descending order with repect to their time.
@@ -137,76 +214,53 @@ class MonitorController(QObject):
             student_id: The id of the student.
             amount: The number of histories to get.
         """
-        sql = f"SELECT * FROM {self._table_name} WHERE id=? ORDER BY time DESC LIMIT ?;"
-        with self._conn:
-            return self._conn.execute(sql, (student_id, amount)).fetchall()
+        return self._database.histories(student_id, amount)
 
-    def store_new_grade(self, grade: Mapping[str, Any]) -> None:
-        """Stores new grade into the database."""
-        sql = f"INSERT INTO {self._table_name} (id, time, grade) VALUES (?, ?, ?);"
-        row: RowContent = self._monitor.col_header.to_row(grade)
-        with self._conn:
-            self._conn.execute(sql, tuple(col.value for col in row))
-
-    def show_new_grade(self, grade: Mapping[str, Any]) -> None:
-        """Shows the new grade to the monitor and sorts rows in ascending order
-        with respect to label "grade".
+    @pyqtSlot(list)
+    def show_new_grades(self, grades: Iterable[Mapping[str, Any]]) -> None:
+        """Shows the new grades to the monitor, whose rows are kept in ascending
+        order with respect to label "grade".
 
         A new row is inserted if the "id" introduces a new student,
         otherwise the student's grade is updated to the original row.
         """
-        row_no = self._monitor.search_row_no(("id", grade["id"]))
-        row: RowContent = self._monitor.col_header.to_row(grade)
-        if row_no == -1:  # row not found
-            row_item = self._monitor.insert_row(row)
-        else:
-            row_item = self._monitor.update_row(row_no, row)
-        self._monitor.sort_rows_by_label("grade", Qt.AscendingOrder)
-        self._set_background_by_grade(row_item, grade["grade"])
-
-        # FIXME: method call on private attribute
-        for i in range(self._monitor._table.topLevelItemCount()):
-            item = self._monitor._table.topLevelItem(i)
-            # Search all expanded items and refresh histories.
-            if item.isExpanded():
-                self._monitor.remove_histories_of_row(i)
-                self._show_histories_on_monitor(
-                    item.text(self._monitor.col_header.labels().index("id"))  # type: ignore  # pyqtSlot isn't well-typed
-                )
-
-    def _set_background_by_grade(self, row_item: QTreeWidgetItem, grade: float) -> None:
-        """Sets the background of label "grade" to green if grade is higher than
-        0.8, else to red.
-
-        Which implies the status of the specific student.
-        """
-        color: Qt.GlobalColor = Qt.green
-        if grade < 0.8:
-            color = Qt.red
-        col_no = self._monitor.col_header.labels().index("grade")
-        row_item.setBackground(col_no, QBrush(color, Qt.Dense4Pattern))
+        grades = tuple(grades)
+        self._monitor.update_rows(
+            self._monitor.col_header.to_row(grade) for grade in grades
+        )
+        # Refresh the histories of the expanded rows which have new grades,
+        # once for the whole batch.
+        updated_ids = {grade["id"] for grade in grades}
+        for student_id in self._monitor.expanded_keys() & updated_ids:
+            self._show_histories_on_monitor(student_id)
+        for grade in grades:
+            self._aggregates.add_grade(grade["id"], grade["time"], grade["grade"])
+        self._show_aggregates()
+
+    def _show_aggregates(self) -> None:
+        self._monitor.aggregate_panel.show_stats(
+            self._aggregates.lesson_stats, self._aggregates.latest_bucket()
+        )
 
     @pyqtSlot(str)
     def _show_histories_on_monitor(self, student_id: str) -> None:
         """Shows Monitor.MAX_HISTORY_NUM latest histories of the student
         specified by id on the monitor.
         """
-        row_no = self._monitor.search_row_no(("id", student_id))
         # Fetch one more grade and remove the current one.
-        for row in self._get_histories_from_database(
+        histories = self._get_histories_from_database(
             student_id, Monitor.MAX_HISTORY_NUM + 1
-        )[1:]:
-            hist_item = self._monitor.add_history_of_row(
-                row_no, self._monitor.col_header.to_row(row)  # type: ignore
-            )  # sqlite3.Row does support mapping
-            self._set_background_by_grade(hist_item, row["grade"])
+        )[1:]
+        self._monitor.set_histories_of_row(
+            student_id, (self._monitor.col_header.to_row(row) for row in histories)
+        )
 
     def _plot_histories(self, student_id: str) -> None:
         """Plots at most 50 histories of the latest 50 minutes."""
         # We assume that a single course takes 50 minutes, so at most 50
         # histories will be plotted and history farther than 50 minutes from now
         # will be ignored.
-        histories: List[sqlite3.Row] = list(
+        histories: List[Dict[str, Any]] = list(
             filter(
                 lambda row: row["time"] > datetime.now() - timedelta(minutes=50),
                 self._get_histories_from_database(student_id, 50),
@@ -233,100 +287,97 @@ class MonitorController(QObject):
         ax.set_ylim(0, 1.1)  # more than 1 so not truncate the circle on the top
         plt.show()
 
-    def _get_screenshot_slices_from_server(self) -> Dict:
-        r = requests.get(f"{self._server_url}/teacher", params={"genre": "screenshots"})
-        return r.json()
-
-    def _get_screenshot_slices_periodically(self) -> None:
-        now = datetime.now()
-        minute = (now.minute // 5) * 5
-        next_fire = now.replace(minute=minute, second=0, microsecond=0) + timedelta(
-            minutes=5
-        )
-        BUSY_CHECK_GAP = 2
-        sleep = (next_fire - now).seconds
-
+    def _upload_screenshot_slices(self) -> None:
+        """Uploads the slices and fingerprint of the teacher's screenshot as the
+        reference of this round; the server compares by either of them.
+        """
+        # as fresh as the students', so the captures are compared alike
+        screenshot = shared_screen_capture().get(max_age=1.0)
+        try:
+            requests.post(
+                f"{self._server_url}/teacher/reference",
+                json={
+                    "slices": get_compare_slices(screenshot).tolist(),
+                    "fingerprint": fingerprint_to_hex(difference_hash(screenshot)),
+                },
+                timeout=self.RETRY_INTERVAL,
+            ).raise_for_status()
+        except requests.RequestException:
+            # The server may not be running; there's no comparison this round.
+            pass
+
+    def _listen_to_similarities_from_server(self) -> None:
+        """Long-polls the server for the similarities of screenshots and sends
+        them to the GUI thread batch by batch.
+
+        The server compares the screenshots of the students with the teacher's
+        on arrival, so only the (id, similarity) are received.
+        """
+        session = requests.Session()
+        # None to get all of the current round
+        cursor: Optional[int] = None
         while True:
-            time.sleep(sleep)
-            while datetime.now() < next_fire:
-                pass
-            self._screenshot_slices = get_compare_slices(get_screenshot())
-
-            next_fire += timedelta(minutes=5)
-            sleep = 5 * 60 - BUSY_CHECK_GAP
-
-    def _compare_screenshot_similarity(self) -> None:
-        """Compares the slices of students with teacher's."""
-        for data in self._get_screenshot_slices_from_server():
-            slices = data["slices"]
-            similarity: float = compare_similarity_of_slices(
-                np.array(slices), self._screenshot_slices
-            )
-            self._s_screen_similarity_refreshed.emit(data["id"], similarity)
-
-    @pyqtSlot(str, float)
-    def _show_similarity_of_screenshot_to_monitor(
-        self, student_id: str, similarity: float
+            params: Dict[str, Any] = {"timeout": self.POLL_TIMEOUT}
+            if cursor is not None:
+                params["cursor"] = cursor
+            try:
+                r = session.get(
+                    f"{self._server_url}/teacher/similarities",
+                    params=params,
+                    timeout=self.POLL_TIMEOUT + 5,
+                )
+                r.raise_for_status()
+                results = r.json()
+                cursor = results["cursor"]
+                similarities = [
+                    (str(student_id), float(similarity))
+                    for student_id, similarity in results["similarities"]
+                ]
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                # The server may not be running, try again later.
+                time.sleep(self.RETRY_INTERVAL)
+                continue
+            if similarities:
+                self._s_screen_similarities_refreshed.emit(similarities)
+
+    @pyqtSlot(list)
+    def _show_similarities_of_screenshot_to_monitor(
+        self, similarities: List[Tuple[str, float]]
     ) -> None:
-        """Shows the similarity of screen to the corresponding student's screen label."""
-        row_no = self._monitor.search_row_no(("id", student_id))
-        screen_col = Col(
-            no=self._monitor.col_header.labels().index("screen"),
-            label="screen",
-            # round to 2 decimal places
-            value=Decimal(f"{similarity:.2f}"),
-        )
-        if row_no == -1:  # row not found
-            row = RowContent()
-            # we'll have to fill all other cols as blank
-            for i, label in enumerate(self._monitor.col_header.labels()):
-                if label == "screen":
-                    col: Col[Any] = screen_col
-                elif label == "id":
-                    col = Col(i, label, student_id)
-                else:
-                    col = Col(i, label, "")
-                row.append(col)
-            row_item = self._monitor.insert_row(row)
-        else:
-            row_item = self._monitor.update_row(row_no, RowContent([screen_col]))
-        color: Qt.GlobalColor = Qt.green
-        if similarity < 0.6:
-            color = Qt.red
-        col_no = self._monitor.col_header.labels().index("screen")
-        row_item.setBackground(col_no, QBrush(color, Qt.Dense4Pattern))
-
-    def _compare_screenshot_similarity_periodically(self) -> None:
-        now = datetime.now()
-        minute = (now.minute // 5) * 5
-        # (1) a 10 second offset to make sure screenshot are gotten
-        # (2) an extra delta to make sure the 1st screenshot of teacher is gotten
-        #   i.e., the teacher-end starts at 10:05:05, if there's no extra delta,
-        #   screenshot similarity checks at 10:05:10 with no teacher-end screenshot from 10:05:00
-        next_fire = now.replace(minute=minute, second=10, microsecond=0) + timedelta(
-            minutes=5 * 2
+        """Shows the similarities of screen to the corresponding students' screen
+        label, in a single update of the monitor.
+        """
+        labels = self._monitor.col_header.labels()
+        id_no, screen_no = labels.index("id"), labels.index("screen")
+        # a student who hasn't any grade yet is inserted with other cols blank
+        self._monitor.update_rows(
+            RowContent(
+                [
+                    Col(id_no, "id", student_id),
+                    # round to 2 decimal places
+                    Col(screen_no, "screen", Decimal(f"{similarity:.2f}")),
+                ]
+            )
+            for student_id, similarity in similarities
         )
-        BUSY_CHECK_GAP = 2
-        sleep = (next_fire - now).seconds
-
-        while True:
-            time.sleep(sleep)
-            while datetime.now() < next_fire:
-                pass
-            self._compare_screenshot_similarity()
-
-            next_fire += timedelta(minutes=5)
-            sleep = 5 * 60 - BUSY_CHECK_GAP
+        now = time.time()
+        for student_id, similarity in similarities:
+            self._aggregates.add_similarity(student_id, similarity, now)
+        self._show_aggregates()
 
     def _change_language_of_monitor(self, lang_no: int) -> None:
         self._lang = Language(lang_no)
         self._monitor.change_language(self._lang)
 
     def _init_global_config(self) -> None:
-        """Initializes the language of window."""
+        """Initializes the language of window and the retention of grades."""
         # Try to reduce the memory comsumption by delete-after-use.
         self._load_global_config()
         self._lang = Language[self._config.get("GLOBAL", "language")]
+        # grades older than it are deleted; 0 to keep all
+        self._retention_days = self._config.getint(
+            "DATABASE", "retention_days", fallback=0
+        )
         del self._config
 
         self._monitor.combox.setCurrentIndex(self._lang.value)
@@ -0,0 +1,421 @@
+import bisect
+import contextlib
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from util.time import ONE_MIN
+
+
+# (id, start, time, grade); start and time are seconds since the epoch, where
+# time is when the graded interval ends.
+GradeRow = Tuple[str, int, int, float]
+
+# Grades lower than it are counted into the time below of rollups.
+LOW_GRADE = 0.6
+ONE_DAY = 24 * 60 * ONE_MIN
+
+
+def _migrate_to_v1(conn: sqlite3.Connection) -> None:
+    """Creates the indexed grades and the rollups; grades of the legacy table
+    "monitor" are moved into the new one.
+    """
+    conn.execute(
+        """CREATE TABLE grades (
+            id TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            time INTEGER NOT NULL,
+            grade REAL NOT NULL,
+            PRIMARY KEY (id, time)
+        ) WITHOUT ROWID;"""
+    )
+    # for the retention to find the old grades
+    conn.execute("CREATE INDEX grades_time ON grades (time);")
+    conn.execute(
+        """CREATE TABLE lesson_rollups (
+            id TEXT NOT NULL,
+            lesson INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            min REAL NOT NULL,
+            seconds_below INTEGER NOT NULL,
+            PRIMARY KEY (id, lesson)
+        ) WITHOUT ROWID;"""
+    )
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='monitor';"
+    ).fetchone()
+    if legacy:
+        # The legacy time is the local time in text; the interval of a grade
+        # wasn't kept, so it's taken as a minute.
+        conn.execute(
+            f"""INSERT OR IGNORE INTO grades (id, start, time, grade)
+            SELECT id, epoch - {ONE_MIN}, epoch, grade FROM (
+                SELECT id, CAST(strftime('%s', time, 'utc') AS INTEGER) AS epoch, grade
+                FROM monitor
+            ) WHERE id IS NOT NULL AND epoch IS NOT NULL AND grade IS NOT NULL;"""
+        )
+        conn.execute("DROP TABLE monitor;")
+
+
+# The n-th migration brings the schema from version n to n + 1.
+_MIGRATIONS: Tuple[Callable[[sqlite3.Connection], None], ...] = (_migrate_to_v1,)
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+
+# (time, grade) of histories, in descending order of time
+_Histories = List[Tuple[int, float]]
+
+
+class _HistoryCache:
+    """The latest histories of the least recently used students."""
+
+    def __init__(self, capacity: int, depth: int) -> None:
+        """
+        Arguments:
+            capacity: The max number of students cached.
+            depth: The max number of histories cached per student.
+        """
+        self.capacity = capacity
+        self.depth = depth
+        self._entries: "OrderedDict[str, _Histories]" = OrderedDict()
+
+    def get(self, student_id: str) -> Optional[_Histories]:
+        histories = self._entries.get(student_id)
+        if histories is not None:
+            self._entries.move_to_end(student_id)
+        return histories
+
+    def put(self, student_id: str, histories: _Histories) -> None:
+        """Caches the latest histories; all of them, if fewer than depth."""
+        self._entries[student_id] = histories[: self.depth]
+        self._entries.move_to_end(student_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def add(self, student_id: str, end: int, grade: float) -> None:
+        """Adds a new grade to the student if cached."""
+        histories = self._entries.get(student_id)
+        if histories is None:
+            return
+        # grades usually come in order, so this is the front mostly
+        i = bisect.bisect_left([-time for time, _ in histories], -end)
+        if i < len(histories) and histories[i][0] == end:
+            histories[i] = (end, grade)
+        else:
+            histories.insert(i, (end, grade))
+            del histories[self.depth :]
+
+
+class GradeDatabase:
+    """Keeps the grades of students in a SQLite database in WAL mode.
+
+    Grades inserted are queued and written by a writer thread, which commits
+    whatever has been queued in one transaction every flush interval, so a
+    class of grades arriving at the same minute costs a single commit. Those
+    which fail to commit, e.g., on a full disk, are queued again and retried
+    in the next flush.
+    Histories are read through a pool of read-only connections; with WAL,
+    readers and the writer never block each other.
+
+    Grades not yet committed are readable as well, so a grade is in the
+    histories right after it's inserted. The latest histories of recently
+    read students are cached; new grades are added to the cache as they're
+    inserted, and those of the students of the last lesson are cached on open.
+
+    Along with the grades, the rollups of the lesson, which starts when the
+    database is opened, are kept per student. The schema is versioned and
+    migrated on open.
+    """
+
+    def __init__(
+        self,
+        db_file: str,
+        flush_interval: float = 0.5,
+        readers: int = 2,
+        retention_days: Optional[int] = None,
+        cache_capacity: int = 1_024,
+        cache_depth: int = 50,
+    ) -> None:
+        """
+        Arguments:
+            db_file: The database to keep the grades in, created if not exists.
+            flush_interval: In seconds. How often the queued grades are committed.
+            readers: The number of read-only connections in the pool.
+            retention_days:
+                Grades older than it are deleted, the rollups are kept.
+                None or 0 to keep all.
+            cache_capacity: The max number of students whose histories are cached.
+            cache_depth:
+                The max number of histories cached per student; those which ask
+                more are read from the database.
+        """
+        self._db_file = db_file
+        self._flush_interval = flush_interval
+        self._retention = retention_days * ONE_DAY if retention_days else None
+        self.lesson = int(time.time())
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._migrate()
+
+        # Queued by insert_grades() and not yet taken by the writer.
+        self._pending: List[GradeRow] = []
+        # Taken by the writer but not yet committed.
+        self._committing: List[GradeRow] = []
+        self._cache = _HistoryCache(cache_capacity, cache_depth)
+        # Increases on every insert, so histories read from the database
+        # while grades are being inserted aren't cached.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect_read_only())
+
+        self._f_closed = threading.Event()
+        self._writer = threading.Thread(
+            target=self._write_periodically, name="grade-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _migrate(self) -> None:
+        # transactions are begun explicitly, so DDL is in them as well
+        conn = sqlite3.connect(self._db_file, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        (version,) = conn.execute("PRAGMA user_version;").fetchone()
+        for new_version, migrate in enumerate(_MIGRATIONS[version:], version + 1):
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version={new_version};")
+                conn.execute("COMMIT;")
+            except BaseException:
+                conn.execute("ROLLBACK;")
+                raise
+        conn.close()
+
+    def _connect_read_only(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{Path(self._db_file).resolve()}?mode=ro",
+            uri=True,
+            # each connection is used by one thread at a time, whichever it is
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def insert_grades(self, grades: Iterable[Mapping[str, Any]]) -> None:
+        """Queues the grades to be written; returns immediately.
+
+        Arguments:
+            grades:
+                Each has "id", "time" (datetime, when the interval ends) and
+                "grade"; "start" (epoch) of the interval is optional.
+
+        Raises:
+            KeyError, TypeError, ValueError:
+                Any of the grades is malformed, in which case none is queued.
+        """
+        rows: List[GradeRow] = []
+        for datum in grades:
+            end = int(datum["time"].timestamp())
+            # converted here, so the writer never meets a row it can't write
+            rows.append(
+                (
+                    str(datum["id"]),
+                    int(datum.get("start", end - ONE_MIN)),
+                    end,
+                    float(datum["grade"]),
+                )
+            )
+        with self._lock:
+            self._pending.extend(rows)
+            self._generation += 1
+            for id_, _, end, grade in rows:
+                self._cache.add(id_, end, grade)
+
+    def histories(self, student_id: str, amount: int) -> List[Dict[str, Any]]:
+        """Returns the latest histories of the student specified by id, in
+        descending order with respect to their time.
+
+        Arguments:
+            student_id: The id of the student.
+            amount: The number of histories to get at most.
+
+        Returns:
+            Each has "id", "time" (datetime) and "grade".
+        """
+        with self._lock:
+            cached = self._cache.get(student_id)
+            if cached is not None and amount <= self._cache.depth:
+                return self._to_dicts(student_id, cached[:amount])
+            generation = self._generation
+            uncommitted = [
+                row for row in self._committing + self._pending if row[0] == student_id
+            ]
+        with self._reader() as conn:
+            # in the order of the primary key, so no sorting is needed
+            rows = conn.execute(
+                "SELECT time, grade FROM grades WHERE id=? ORDER BY time DESC LIMIT ?;",
+                (student_id, max(amount, self._cache.depth)),
+            ).fetchall()
+        merged = dict(rows)
+        # Those committed right after being copied are read twice, but a
+        # student has only one grade at a time.
+        for _, _, end, grade in uncommitted:
+            merged[end] = grade
+        histories = sorted(merged.items(), reverse=True)
+        with self._lock:
+            if self._generation == generation:
+                self._cache.put(student_id, histories)
+        return self._to_dicts(student_id, histories[:amount])
+
+    @staticmethod
+    def _to_dicts(student_id: str, histories: _Histories) -> List[Dict[str, Any]]:
+        return [
+            {"id": student_id, "time": datetime.fromtimestamp(end), "grade": grade}
+            for end, grade in histories
+        ]
+
+    def rollups(self, lesson: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Returns the rollups of each student in the lesson, those of the
+        current lesson in default.
+
+        Returns:
+            Each has "id", "count", "mean", "min" and "seconds_below", which
+            is how long the grades are lower than LOW_GRADE. Grades not yet
+            committed are not included.
+        """
+        with self._reader() as conn:
+            rows = conn.execute(
+                """SELECT id, count, mean, min, seconds_below FROM lesson_rollups
+                WHERE lesson=? ORDER BY id;""",
+                (self.lesson if lesson is None else lesson,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        """Commits the queued grades and closes all connections."""
+        if self._writer.is_alive():
+            self._f_closed.set()
+            self._writer.join()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    @contextlib.contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def _write_periodically(self) -> None:
+        # the connection is owned by the writer thread only
+        conn = sqlite3.connect(self._db_file)
+        # WAL is safe from corruption with NORMAL, only the last commits may
+        # be rolled back on a power loss
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        try:
+            self._warm_cache(conn)
+        except sqlite3.Error:
+            # cached once read instead
+            traceback.print_exc()
+        last_purge = float("-inf")
+        while not self._f_closed.wait(self._flush_interval):
+            self._flush(conn)
+            if self._retention is not None and time.monotonic() - last_purge > 3600:
+                try:
+                    with conn:
+                        conn.execute(
+                            "DELETE FROM grades WHERE time < ?;",
+                            (int(time.time()) - self._retention,),
+                        )
+                except sqlite3.Error:
+                    # purged in the next flush
+                    traceback.print_exc()
+                    continue
+                last_purge = time.monotonic()
+        self._flush(conn)
+        conn.close()
+
+    def _warm_cache(self, conn: sqlite3.Connection) -> None:
+        """Caches the histories of the students of the last lesson."""
+        with self._lock:
+            generation = self._generation
+        rows = conn.execute(
+            """SELECT id, time, grade FROM (
+                SELECT id, time, grade,
+                    ROW_NUMBER() OVER (PARTITION BY id ORDER BY time DESC) AS n
+                FROM grades WHERE id IN (
+                    SELECT id FROM lesson_rollups
+                    WHERE lesson=(SELECT MAX(lesson) FROM lesson_rollups)
+                    LIMIT :capacity
+                )
+            ) WHERE n <= :depth ORDER BY id, time DESC;""",
+            {"capacity": self._cache.capacity, "depth": self._cache.depth},
+        ).fetchall()
+        warmed: Dict[str, _Histories] = {}
+        for id_, end, grade in rows:
+            warmed.setdefault(id_, []).append((end, grade))
+        with self._lock:
+            if self._generation != generation:
+                # Some may miss the grades inserted meanwhile; they'll be
+                # cached once read.
+                return
+            for id_, histories in warmed.items():
+                if self._cache.get(id_) is None:
+                    self._cache.put(id_, histories)
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._committing, self._pending = self._pending, []
+        if not self._committing:
+            return
+        try:
+            self._commit(conn)
+        except sqlite3.Error:
+            # rolled back; queued again before the newer ones to be retried,
+            # and still readable meanwhile
+            traceback.print_exc()
+            with self._lock:
+                self._pending[:0] = self._committing
+                self._committing = []
+            return
+        with self._lock:
+            self._committing = []
+
+    def _commit(self, conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO grades (id, start, time, grade) VALUES (?, ?, ?, ?);",
+                self._committing,
+            )
+            # Recomputed from the grades of the lesson, which are a few per
+            # student, so a grade sent twice isn't counted twice.
+            conn.executemany(
+                """INSERT OR REPLACE INTO lesson_rollups
+                    (id, lesson, count, mean, min, seconds_below)
+                SELECT id, :lesson, COUNT(*), AVG(grade), MIN(grade),
+                    COALESCE(SUM(CASE WHEN grade < :low THEN time - start END), 0)
+                FROM grades WHERE id=:id AND time >= :lesson GROUP BY id;""",
+                [
+                    {"id": id_, "lesson": self.lesson, "low": LOW_GRADE}
+                    for id_ in {row[0] for row in self._committing}
+                ],
+            )
@@ -1,20 +1,38 @@
 import json
-from typing import Any, Generic, Iterable, List, Mapping, Tuple, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QFont
+from PyQt5.QtCore import (
+    QAbstractItemModel,
+    QModelIndex,
+    QSortFilterProxyModel,
+    Qt,
+    pyqtSignal,
+)
+from PyQt5.QtGui import QBrush, QFont
 from PyQt5.QtWidgets import (
     QGridLayout,
     QHeaderView,
     QLabel,
     QMainWindow,
-    QTreeWidget,
-    QTreeWidgetItem,
+    QTreeView,
     QWidget,
 )
 from more_itertools import SequenceView
 
 from gui.language import Language, LanguageComboBox
+from teacher.aggregate_panel import AggregatePanel
 from util.path import to_abs_path
 
 
@@ -123,9 +141,255 @@ class ColumnHeader:
         return row
 
 
+class _MonitorRow:
+    """The values of a row in column order, None for blank, with its histories."""
+
+    __slots__ = ("values", "histories")
+
+    def __init__(self, values: List[Any]) -> None:
+        self.values = values
+        self.histories: List[List[Any]] = []
+
+
+class MonitorModel(QAbstractItemModel):
+    """The rows of a Monitor, each has its histories as children.
+
+    Rows are never moved nor removed in the model, so a row is found by its key
+    value through a hash index; the order shown is left to a sort proxy.
+    """
+
+    def __init__(self, header: ColumnHeader, key_label: str) -> None:
+        super().__init__()
+        self._header = header
+        self._header_texts: List[str] = list(header.labels())
+        self._key_col_no = header.labels().index(key_label)
+        self._rows: List[_MonitorRow] = []
+        # key value in str -> no. of the row
+        self._row_no_of: Dict[str, int] = {}
+        self._background_rules: Dict[int, Callable[[Any], Optional[QBrush]]] = {}
+
+    def row_no_of(self, key: Any) -> int:
+        """Returns the no. of the row, -1 if the key doesn't exist."""
+        return self._row_no_of.get(str(key), -1)
+
+    def key_of(self, row_no: int) -> str:
+        return str(self._rows[row_no].values[self._key_col_no])
+
+    def values_of(self, row_no: int) -> List[Any]:
+        return self._rows[row_no].values
+
+    def sort_ranks(self, col_no: int) -> List[int]:
+        """Returns the rank of each row when sorted by the column in ascending
+        order; blanks come first.
+        """
+        rows = self._rows
+        order = sorted(
+            range(len(rows)),
+            key=lambda row_no: (
+                rows[row_no].values[col_no] is not None,
+                rows[row_no].values[col_no],
+            ),
+        )
+        ranks = [0] * len(rows)
+        for rank, row_no in enumerate(order):
+            ranks[row_no] = rank
+        return ranks
+
+    def set_header_texts(self, texts: Iterable[str]) -> None:
+        self._header_texts = list(texts)
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(self._header_texts) - 1)
+
+    def set_background_rule(
+        self, label: str, rule: Callable[[Any], Optional[QBrush]]
+    ) -> None:
+        self._background_rules[self._header.labels().index(label)] = rule
+
+    def update_rows(self, rows: Iterable[RowContent]) -> Set[int]:
+        """Updates the rows by their key values; rows of new keys are appended.
+
+        Changes of the whole batch are signaled at once.
+
+        Returns:
+            The no. of the columns whose order may have changed, which are all
+            of them if any row is appended.
+
+        Raises:
+            ValueError: A row doesn't have the key column.
+        """
+        changed: List[int] = []
+        changed_col_nos: Set[int] = set()
+        new_rows: List[_MonitorRow] = []
+        new_row_no_of: Dict[str, int] = {}
+        for row in rows:
+            key = self._key_in(row)
+            if key in self._row_no_of:
+                row_no = self._row_no_of[key]
+                target = self._rows[row_no]
+                changed.append(row_no)
+            elif key in new_row_no_of:
+                target = new_rows[new_row_no_of[key]]
+            else:
+                target = _MonitorRow([None] * self._header.col_count)
+                new_row_no_of[key] = len(self._rows) + len(new_rows)
+                new_rows.append(target)
+            for col in row:
+                target.values[col.no] = col.value
+                changed_col_nos.add(col.no)
+
+        if changed:
+            self.dataChanged.emit(
+                self.index(min(changed), 0),
+                self.index(max(changed), self._header.col_count - 1),
+            )
+        if new_rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            self._rows.extend(new_rows)
+            self._row_no_of.update(new_row_no_of)
+            self.endInsertRows()
+            changed_col_nos.update(range(self._header.col_count))
+        return changed_col_nos
+
+    def _key_in(self, row: RowContent) -> str:
+        """
+        Raises:
+            ValueError: The row doesn't have the key column.
+        """
+        for col in row:
+            if col.no == self._key_col_no:
+                return str(col.value)
+        raise ValueError("row should have the key column")
+
+    def set_histories(self, row_no: int, histories: Iterable[RowContent]) -> None:
+        """Replaces the histories of the row with the new ones, in order."""
+        self.remove_histories(row_no)
+        new_histories: List[List[Any]] = []
+        for hist_row in histories:
+            values: List[Any] = [None] * self._header.col_count
+            for col in hist_row:
+                values[col.no] = col.value
+            new_histories.append(values)
+        if new_histories:
+            parent = self.index(row_no, 0)
+            self.beginInsertRows(parent, 0, len(new_histories) - 1)
+            self._rows[row_no].histories = new_histories
+            self.endInsertRows()
+
+    def remove_histories(self, row_no: int) -> None:
+        histories = self._rows[row_no].histories
+        if histories:
+            self.beginRemoveRows(self.index(row_no, 0), 0, len(histories) - 1)
+            self._rows[row_no].histories = []
+            self.endRemoveRows()
+
+    def _values_at(self, index: QModelIndex) -> List[Any]:
+        # internal id is 0 for rows, no. of the row plus 1 for histories
+        parent_id = index.internalId()
+        if parent_id == 0:
+            return self._rows[index.row()].values
+        return self._rows[parent_id - 1].histories[index.row()]
+
+    # Override
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)
+        return self.createIndex(row, column, 0)
+
+    # Override
+    def parent(self, index: QModelIndex):  # type: ignore[override]
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    # Override
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if not parent.isValid():
+            return len(self._rows)
+        if parent.internalId() == 0:
+            return len(self._rows[parent.row()].histories)
+        return 0
+
+    # Override
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return self._header.col_count
+
+    # Override
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if not parent.isValid():
+            return bool(self._rows)
+        # Since histories are lazily added after the row is expanded, we have
+        # to show the expansion indicator even there are no child.
+        return parent.internalId() == 0
+
+    # Override
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        value = self._values_at(index)[index.column()]
+        if role == Qt.DisplayRole:
+            return "" if value is None else str(value)
+        if role == Qt.BackgroundRole:
+            rule = self._background_rules.get(index.column())
+            if rule is not None and value is not None:
+                return rule(value)
+        elif role == Qt.TextAlignmentRole:
+            # differentiate current and history grade
+            if index.internalId() != 0:
+                return Qt.AlignCenter
+        return None
+
+    # Override
+    def headerData(
+        self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole
+    ) -> Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self._header_texts[section]
+        return None
+
+
+class MonitorSortProxy(QSortFilterProxyModel):
+    """Sorts the rows by their values; histories are kept in their order.
+
+    It's sorted explicitly, once per batch of updates, instead of on every change.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.setDynamicSortFilter(False)
+        self._ranks: List[int] = []
+
+    # Override
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        # The rows are ranked in Python at once, so each of the comparisons
+        # made by Qt is only two lookups.
+        model: MonitorModel = self.sourceModel()  # type: ignore[assignment]
+        self._ranks = model.sort_ranks(column)
+        super().sort(column, order)
+
+    # Override
+    def lessThan(self, left: QModelIndex, right: QModelIndex) -> bool:
+        if left.internalId() != 0:
+            # so histories are in the same order whichever the sort order is
+            return (left.row() < right.row()) != (
+                self.sortOrder() == Qt.DescendingOrder
+            )
+        return self._rank_of(left.row()) < self._rank_of(right.row())
+
+    def _rank_of(self, row_no: int) -> int:
+        # Rows inserted after the last sort are placed after all ranked ones
+        # until they're sorted.
+        return self._ranks[row_no] if row_no < len(self._ranks) else row_no
+
+
 class Monitor(QMainWindow):
     """A Teacher-end view for grade display.
 
+    The rows are kept in a MonitorModel and shown through a sort proxy, so
+    finding the row of a key is a hash lookup and the rows are sorted once per
+    batch of updates.
+
     Signals:
         s_item_clicked:
             Emits when any of the items (row) are clicked. Sends the key value
@@ -144,14 +408,18 @@ class Monitor(QMainWindow):
 
     MAX_HISTORY_NUM: int = 5  # make this larger if you would like to show more
 
-    def __init__(self, header: ColumnHeader, key_label: str = None) -> None:
+    def __init__(self, header: ColumnHeader, key_label: Optional[str] = None) -> None:
         super().__init__()
         self.setWindowTitle("Teacher Monitor")
         self.setMinimumSize(768, 576)  # (640, 480) * 1.2
 
+        self._header = header
+        self._key_label = key_label if key_label is not None else header.labels()[0]
+        # (column no., order) the rows are kept sorted by
+        self._sort_by: Optional[Tuple[int, Qt.SortOrder]] = None
+        # kept by the signals of the view instead of asking each row of it
+        self._expanded_keys: Set[str] = set()
         self._create_widgets()
-        self._set_col_header(header)
-        self._key_label = key_label
 
         self._connect_signals()
 
@@ -165,18 +433,21 @@ class Monitor(QMainWindow):
         central_widget.setLayout(self._layout)
         self.setCentralWidget(central_widget)
 
-        self._table = QTreeWidget()
+        self._model = MonitorModel(self._header, self._key_label)
+        self._proxy = MonitorSortProxy()
+        self._proxy.setSourceModel(self._model)
+        self._table = QTreeView()
+        # so the view doesn't measure every row, which matters with 1,000 rows
+        self._table.setUniformRowHeights(True)
+        self._table.setModel(self._proxy)
+        # Resize header section to keep time from being blocked.
+        self._table.header().setSectionResizeMode(1, QHeaderView.Stretch)
         self._layout.addWidget(self._table, 0, 0, 1, -1)
         self._create_language_combox()
+        self.aggregate_panel = AggregatePanel()
+        self._layout.addWidget(self.aggregate_panel, 2, 0, 1, -1)
         self._layout.setColumnStretch(1, 10)
 
-    def _set_col_header(self, header: ColumnHeader) -> None:
-        self._header = header
-        self._table.setColumnCount(header.col_count)
-        self._table.setHeaderLabels(header.labels())
-        # Resize header section to keep time from being blocked.
-        self._table.header().setSectionResizeMode(1, QHeaderView.Stretch)
-
     def _create_language_combox(self) -> None:
         self.combox = LanguageComboBox()
         self.combox.setFont(QFont("Microsoft JhengHei UI", 9))
@@ -191,108 +462,93 @@ class Monitor(QMainWindow):
         with open(lang_file, mode="r", encoding="utf-8") as f:
             lang_map = json.load(f)[type(self).__name__]
         # header of table
-        for i, label in enumerate(lang_map["header"]):
-            self._table.headerItem().setText(i, label)
+        self._model.set_header_texts(lang_map["header"])
         # language combox
         self._layout.itemAtPosition(1, 0).widget().setText(lang_map["language"])
         for lang_ in Language:
             self.combox.setItemText(lang_.value, lang_map[lang_.name.lower()])
+        self.aggregate_panel.change_language(lang_map["aggregate"])
 
-    def insert_row(self, row: RowContent) -> QTreeWidgetItem:
-        """Inserts a new row to the bottom of the table.
+    def update_rows(self, rows: Iterable[RowContent]) -> None:
+        """Updates the rows by their key values; a row of a new key is inserted,
+        with the columns it doesn't have left blank.
 
-        Returns:
-            The inserted widget item (row).
-        """
-        content = [str(col.value) for col in row]
-        new_item = QTreeWidgetItem(self._table, content)
-        # Since we lazily add children after the item is expanded, we have to
-        # show the expansion indicator even there are no child.
-        new_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
-        self._table.addTopLevelItem(new_item)
-        return new_item
-
-    def update_row(self, row_no: int, row: RowContent) -> QTreeWidgetItem:
-        """
-        Returns:
-            The updated widget item (row).
+        The rows are sorted once after the whole batch is updated, and only if
+        the batch may change their order.
+
+        Raises:
+            ValueError: A row doesn't have the key column.
         """
-        item = self._table.topLevelItem(row_no)
-        for col in row:
-            item.setText(col.no, str(col.value))
-        return item
+        changed_col_nos = self._model.update_rows(rows)
+        if self._sort_by is not None and self._sort_by[0] in changed_col_nos:
+            self._proxy.sort(*self._sort_by)
+
+    def has_row(self, key: Any) -> bool:
+        return self._model.row_no_of(key) != -1
 
-    def get_row_content(self, row_no: int) -> RowContent:
-        """Returns text of columns of the row specified by row number.
+    def get_row_content(self, key: Any) -> RowContent:
+        """Returns the columns of the row specified by key value.
 
-        Notice that all values are with type: str, not their original types.
+        Notice that blank columns have value None.
         """
-        item = self._table.topLevelItem(row_no)
         row = RowContent()
-        for i in range(item.columnCount()):
-            row.append(Col(i, self._header.labels()[i], item.text(i)))
+        for i, value in enumerate(self._model.values_of(self._model.row_no_of(key))):
+            row.append(Col(i, self._header.labels()[i], value))
         return row
 
-    def add_history_of_row(self, row_no: int, hist_row: RowContent) -> QTreeWidgetItem:
-        """Adds history from the top to the row specified by row number.
+    def set_background_rule(
+        self, label: str, rule: Callable[[Any], Optional[QBrush]]
+    ) -> None:
+        """Has the background of the column decided by its value, e.g., to color
+        low grades red. Applies to histories as well.
+        """
+        self._model.set_background_rule(label, rule)
 
-        At most MAX_HISTORY_NUM histories can be shown.
+    def set_histories_of_row(self, key: Any, hist_rows: Iterable[RowContent]) -> None:
+        """Shows the histories under the row specified by key value, from the top.
 
-        Returns:
-            The added history item (row).
+        At most MAX_HISTORY_NUM histories can be shown.
         """
-        item = self._table.topLevelItem(row_no)
-        hist_item = QTreeWidgetItem(item, [str(col.value) for col in hist_row])
-        # differentiate current and history grade
-        for i in range(self._table.columnCount()):
-            hist_item.setTextAlignment(i, Qt.AlignCenter)
-        # desc time order
-        item.insertChild(item.childCount(), hist_item)
-
-        while item.childCount() > Monitor.MAX_HISTORY_NUM:
-            item.removeChild(item.child(Monitor.MAX_HISTORY_NUM))
-        return hist_item
-
-    def remove_histories_of_row(self, row_no: int) -> None:
-        """Removes histories from the top to the row specified by row number."""
-        item = self._table.topLevelItem(row_no)
-        item.takeChildren()
+        hist_rows = list(hist_rows)[: Monitor.MAX_HISTORY_NUM]
+        # inserted at once, so they're mapped by the proxy in the order given
+        self._model.set_histories(self._model.row_no_of(key), hist_rows)
 
-    def sort_rows_by_label(self, label: str, order: Qt.SortOrder) -> None:
-        self._table.sortItems(self._header.labels().index(label), order)
+    def remove_histories_of_row(self, key: Any) -> None:
+        """Removes histories from the row specified by key value."""
+        self._model.remove_histories(self._model.row_no_of(key))
 
-    def search_row_no(self, key: Tuple[str, Any]) -> int:
-        """Searches with the key row by row.
+    def expanded_keys(self) -> Set[str]:
+        """Returns the key values of the rows which are expanded."""
+        return set(self._expanded_keys)
 
-        Returns:
-            The row no. where the key is located, -1 if the key doesn't exist.
-        """
-        label, value = key
-        col_no = self._header.labels().index(label)
-        for row_no in range(self._table.topLevelItemCount()):
-            if self._table.topLevelItem(row_no).text(col_no) == str(value):
-                return row_no
-        return -1
+    def sort_rows_by_label(self, label: str, order: Qt.SortOrder) -> None:
+        """Sorts the rows, which are kept sorted so after updates."""
+        self._sort_by = (self._header.labels().index(label), order)
+        self._proxy.sort(*self._sort_by)
+
+    def _key_of(self, proxy_index: QModelIndex) -> str:
+        index = self._proxy.mapToSource(proxy_index)
+        if index.parent().isValid():
+            # histories belong to the key of their row
+            index = index.parent()
+        return self._model.key_of(index.row())
 
     def _connect_signals(self) -> None:
-        self._table.itemClicked.connect(
-            lambda item, col_no: self.s_item_clicked.emit(
-                *self._map_item_and_column_to_key_and_label(item, col_no)
-            )
-        )
-        self._table.itemCollapsed.connect(
-            lambda item: self.s_item_collapsed.emit(
-                item.text(self._header.labels().index(self._key_label))
-            )
-        )
-        self._table.itemExpanded.connect(
-            lambda item: self.s_item_expanded.emit(
-                item.text(self._header.labels().index(self._key_label))
+        self._table.clicked.connect(
+            lambda index: self.s_item_clicked.emit(
+                self._key_of(index),
+                self._header.labels()[index.column()],  # always in English
             )
         )
-
-    def _map_item_and_column_to_key_and_label(
-        self, item: QTreeWidgetItem, col_no: int
-    ) -> Tuple[str, str]:
-        key_index = self._header.labels().index(self._key_label)
-        return item.text(key_index), self._header.labels()[col_no]  # always in English
+        self._table.collapsed.connect(self._on_collapsed)
+        self._table.expanded.connect(self._on_expanded)
+
+    def _on_collapsed(self, proxy_index: QModelIndex) -> None:
+        key = self._key_of(proxy_index)
+        self._expanded_keys.discard(key)
+        self.s_item_collapsed.emit(key)
+
+    def _on_expanded(self, proxy_index: QModelIndex) -> None:
+        key = self._key_of(proxy_index)
+        self._expanded_keys.add(key)
+        self.s_item_expanded.emit(key)
@@ -0,0 +1,72 @@
+import math
+import random
+import statistics
+import unittest
+from datetime import datetime, timedelta
+
+from teacher.aggregate import ClassAggregates, ConcentrationStats
+from util.quantile import P2Quantile
+
+
+class P2QuantileTestCase(unittest.TestCase):
+    def test_exact_with_few_values(self) -> None:
+        median = P2Quantile(0.5)
+        self.assertTrue(math.isnan(median.value))
+
+        for x in (0.4, 0.1, 0.3, 0.2):
+            median.add(x)
+
+        self.assertAlmostEqual(median.value, 0.25)
+
+    def test_close_to_exact_quantiles(self) -> None:
+        rng = random.Random(0)
+        values = [rng.betavariate(5, 2) for _ in range(10_000)]
+        for p in (0.1, 0.5, 0.9):
+            with self.subTest(p=p):
+                quantile = P2Quantile(p)
+                for x in values:
+                    quantile.add(x)
+
+                exact = statistics.quantiles(values, n=10)[round(p * 10) - 1]
+                self.assertAlmostEqual(quantile.value, exact, delta=0.01)
+
+
+class ConcentrationStatsTestCase(unittest.TestCase):
+    def test_low_ones_counted_by_latest(self) -> None:
+        stats = ConcentrationStats()
+
+        stats.add_grade("1", 0.5)
+        stats.add_grade("2", 0.9)
+        self.assertEqual(stats.fraction_below, 0.5)
+        stats.add_grade("1", 0.7)
+        self.assertEqual(stats.fraction_below, 0)
+        self.assertAlmostEqual(stats.mean, (0.5 + 0.9 + 0.7) / 3)
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.student_count, 2)
+
+        stats.add_similarity("1", 0.3)
+        stats.add_similarity("2", 0.4)
+        stats.add_similarity("2", 0.8)
+        self.assertEqual(stats.low_screen_count, 1)
+
+
+class ClassAggregatesTestCase(unittest.TestCase):
+    def test_grades_in_buckets_of_lesson(self) -> None:
+        lesson = datetime(2022, 5, 1, 10, 0, 0)
+        aggregates = ClassAggregates(int(lesson.timestamp()), bucket_size=300)
+
+        # before the lesson, not counted
+        aggregates.add_grade("1", lesson - timedelta(minutes=1), 0.1)
+        aggregates.add_grade("1", lesson + timedelta(minutes=1), 0.8)
+        aggregates.add_grade("1", lesson + timedelta(minutes=6), 0.4)
+        # late for the first bucket
+        aggregates.add_grade("2", lesson + timedelta(minutes=2), 0.6)
+
+        self.assertEqual(aggregates.lesson_stats.count, 3)
+        start, bucket = aggregates.latest_bucket()
+        self.assertEqual(start, lesson + timedelta(minutes=5))
+        self.assertEqual((bucket.count, bucket.mean), (1, 0.4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import cv2
+import dlib
+import numpy as np
+
+from brightness.calculator import BrightnessCalculator
+
+
+class GetBrightnessPercentageTestCase(unittest.TestCase):
+    def _percentage_by_hsv(self, frame: np.ndarray, face: dlib.rectangle) -> float:
+        *_, value = cv2.split(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+        mask = np.ones(value.shape, dtype=bool)
+        mask[face.top() : face.bottom() + 1, face.left() : face.right() + 1] = False
+        return 100 * value[mask].mean() / 255
+
+    def test_same_as_value_channel_of_hsv_without_face(self) -> None:
+        rng = np.random.default_rng(0)
+        # 4 channels, as captured from the screen
+        for channel in (3, 4):
+            frame = rng.integers(0, 256, (480, 640, channel), dtype=np.uint8)
+            # the latter one is partly out of the frame
+            for face in (
+                dlib.rectangle(100, 50, 300, 280),
+                dlib.rectangle(600, 400, 700, 500),
+            ):
+                with self.subTest(channel=channel, face=face):
+                    self.assertAlmostEqual(
+                        BrightnessCalculator.get_brightness_percentage(frame, face),
+                        self._percentage_by_hsv(frame, face),
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import time
+import unittest
+from typing import List
+
+from brightness.actuator import BrightnessActuator, RecordingBackend
+
+
+class BrightnessActuatorTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.backend = RecordingBackend()
+        self.actuator = BrightnessActuator(self.backend, step=2, min_interval=0.2)
+
+    def tearDown(self) -> None:
+        self.actuator.stop()
+
+    def _written_values(self) -> List[int]:
+        return [value for _, value in self.backend.writes]
+
+    def test_changes_smaller_than_step_not_written(self) -> None:
+        self.assertTrue(self.actuator.request(50))
+        self.assertTrue(self.backend.wait_for_writes(1, timeout=1))
+
+        self.assertFalse(self.actuator.request(51))
+        self.assertFalse(self.actuator.request(49))
+        time.sleep(0.3)
+
+        self.assertEqual(self._written_values(), [50])
+
+    def test_requests_within_interval_coalesced(self) -> None:
+        self.actuator.request(10)
+        self.assertTrue(self.backend.wait_for_writes(1, timeout=1))
+
+        for value in (20, 30, 40):
+            self.actuator.request(value)
+        self.assertTrue(self.backend.wait_for_writes(2, timeout=1))
+        time.sleep(0.3)
+
+        writes = self.backend.writes
+        # only the latest one is written, after the interval
+        self.assertEqual(self._written_values(), [10, 40])
+        self.assertGreaterEqual(writes[1][0] - writes[0][0], 0.2 - 0.01)
+
+    def test_request_not_blocked_by_slow_write(self) -> None:
+        self.actuator.stop()
+        self.backend = RecordingBackend(latency=0.5)
+        self.actuator = BrightnessActuator(self.backend)
+
+        start = time.perf_counter()
+        self.actuator.request(50)
+
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertTrue(self.backend.wait_for_writes(1, timeout=2))
+
+
+if __name__ == "__main__":
+    unittest.main()
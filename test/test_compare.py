@@ -0,0 +1,37 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from screenshot.compare import get_compare_slices
+
+
+class GetCompareSlicesTestCase(unittest.TestCase):
+    def _slices_block_by_block(self, image: np.ndarray, grid: int) -> np.ndarray:
+        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h = gray_image.shape[0] // (2 * grid)
+        w = gray_image.shape[1] // (2 * grid)
+        return np.array(
+            [
+                np.mean(gray_image[h * i : h * (i + 1), w * j : w * (j + 1)])
+                for i in range(0, 2 * grid, 2)
+                for j in range(0, 2 * grid, 2)
+            ]
+        )
+
+    def test_same_as_block_by_block(self) -> None:
+        rng = np.random.default_rng(0)
+        for height, width, channel in ((768, 1366, 4), (1080, 1920, 3), (37, 50, 4)):
+            image = rng.integers(0, 256, (height, width, channel), dtype=np.uint8)
+            for grid in (6, 3):
+                with self.subTest(shape=image.shape, grid=grid):
+                    slices = get_compare_slices(image, grid)
+
+                    self.assertEqual(slices.shape, (grid * grid,))
+                    np.testing.assert_allclose(
+                        slices, self._slices_block_by_block(image, grid)
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from datetime import datetime
+
+from teacher.controller import MonitorController
+
+
+class DecodeGradesTestCase(unittest.TestCase):
+    def test_malformed_grades_skipped(self) -> None:
+        grades = [
+            {"id": "1", "time": "2022-05-01, 10:00:00", "grade": 0.5},
+            {"id": "2", "grade": 0.5},
+            {"id": "3", "time": "10 o'clock", "grade": 0.5},
+            {"id": "4", "time": "2022-05-01, 10:00:00", "grade": "high"},
+            "not a grade",
+            {"id": 5, "time": "2022-05-01, 10:01:00", "grade": 1, "start": 0},
+        ]
+
+        with self.assertLogs("teacher.controller", "WARNING") as logs:
+            decoded = MonitorController._decode_grades(grades)
+
+        self.assertEqual(
+            decoded,
+            [
+                {"id": "1", "time": datetime(2022, 5, 1, 10, 0, 0), "grade": 0.5},
+                {
+                    "id": "5",
+                    "time": datetime(2022, 5, 1, 10, 1, 0),
+                    "grade": 1.0,
+                    "start": 0,
+                },
+            ],
+        )
+        self.assertEqual(len(logs.records), 4)
+
+    def test_not_a_list(self) -> None:
+        with self.assertLogs("teacher.controller", "WARNING"):
+            self.assertEqual(MonitorController._decode_grades({"id": "1"}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import contextlib
+import io
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from teacher.grade_database import SCHEMA_VERSION, GradeDatabase
+
+
+class GradeDatabaseTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = str(Path(self.tmp_dir.name) / "grades.db")
+        self.database = GradeDatabase(self.db_file, flush_interval=60)
+        self.start = datetime(2022, 5, 1, 10, 0, 0)
+
+    def tearDown(self) -> None:
+        self.database.close()
+        self.tmp_dir.cleanup()
+
+    def _grades_of(self, student_id: str, minutes: int):
+        return [
+            {
+                "id": student_id,
+                "time": self.start + timedelta(minutes=i),
+                "grade": i / 10,
+            }
+            for i in range(minutes)
+        ]
+
+    def test_uncommitted_grades_readable(self) -> None:
+        self.database.insert_grades(self._grades_of("1", 3) + self._grades_of("2", 2))
+
+        histories = self.database.histories("1", 2)
+
+        self.assertEqual(
+            [(row["time"], row["grade"]) for row in histories],
+            [
+                (self.start + timedelta(minutes=2), 0.2),
+                (self.start + timedelta(minutes=1), 0.1),
+            ],
+        )
+
+    def test_committed_on_close(self) -> None:
+        self.database.insert_grades(self._grades_of("1", 3))
+        self.database.close()
+
+        self.database = GradeDatabase(self.db_file)
+        histories = self.database.histories("1", 10)
+
+        self.assertEqual(len(histories), 3)
+        self.assertEqual(histories[0]["time"], self.start + timedelta(minutes=2))
+
+    def test_committed_and_uncommitted_merged(self) -> None:
+        self.database.insert_grades(self._grades_of("1", 3))
+        self.database.close()
+        self.database = GradeDatabase(self.db_file, flush_interval=60)
+        self.database.insert_grades(
+            [{"id": "1", "time": self.start + timedelta(minutes=3), "grade": 0.9}]
+        )
+
+        histories = self.database.histories("1", 10)
+
+        self.assertEqual([row["grade"] for row in histories], [0.9, 0.2, 0.1, 0.0])
+
+    def test_rollups_of_lesson(self) -> None:
+        lesson = self.database.lesson
+        start = datetime.fromtimestamp(lesson)
+        self.database.insert_grades(
+            [
+                # before the lesson, not counted
+                {"id": "1", "time": start - timedelta(minutes=1), "grade": 0.1},
+                {"id": "1", "time": start + timedelta(minutes=1), "grade": 0.8},
+                {"id": "1", "time": start + timedelta(minutes=2), "grade": 0.4},
+                {
+                    "id": "1",
+                    "time": start + timedelta(minutes=3),
+                    "grade": 0.5,
+                    "start": lesson + 150,
+                },
+            ]
+        )
+        self.database.close()
+        self.database = GradeDatabase(self.db_file)
+
+        (rollup,) = self.database.rollups(lesson)
+
+        self.assertEqual(rollup["id"], "1")
+        self.assertEqual(rollup["count"], 3)
+        self.assertAlmostEqual(rollup["mean"], (0.8 + 0.4 + 0.5) / 3)
+        self.assertEqual(rollup["min"], 0.4)
+        self.assertEqual(rollup["seconds_below"], 60 + 30)
+
+    def test_cached_histories_updated_by_new_grades(self) -> None:
+        self.database.close()
+        self.database = GradeDatabase(self.db_file, flush_interval=60, cache_depth=3)
+        self.database.insert_grades(self._grades_of("1", 3))
+        self.database.histories("1", 3)  # cached
+
+        self.database.insert_grades(
+            [{"id": "1", "time": self.start + timedelta(minutes=3), "grade": 0.9}]
+        )
+
+        self.assertEqual(
+            [row["grade"] for row in self.database.histories("1", 3)], [0.9, 0.2, 0.1]
+        )
+        # deeper than the cache
+        self.assertEqual(
+            [row["grade"] for row in self.database.histories("1", 10)],
+            [0.9, 0.2, 0.1, 0.0],
+        )
+
+    def test_cache_warmed_with_last_lesson(self) -> None:
+        start = datetime.fromtimestamp(self.database.lesson)
+        self.database.insert_grades(
+            [
+                {"id": "1", "time": start + timedelta(minutes=1), "grade": 0.8},
+                {"id": "1", "time": start + timedelta(minutes=2), "grade": 0.4},
+            ]
+        )
+        self.database.close()
+
+        self.database = GradeDatabase(self.db_file)
+        # the writer has warmed the cache before it commits the last time
+        self.database.close()
+
+        self.assertEqual(
+            self.database._cache.get("1"),
+            [
+                (int((start + timedelta(minutes=2)).timestamp()), 0.4),
+                (int((start + timedelta(minutes=1)).timestamp()), 0.8),
+            ],
+        )
+
+    def test_failed_flush_retried(self) -> None:
+        class FlakyDatabase(GradeDatabase):
+            failures = 1
+
+            def _commit(self, conn):
+                if self.failures:
+                    self.failures -= 1
+                    raise sqlite3.OperationalError("database or disk is full")
+                super()._commit(conn)
+
+        self.database.close()
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.database = FlakyDatabase(self.db_file, flush_interval=0.05)
+            self.database.insert_grades(self._grades_of("1", 3))
+            time.sleep(0.5)
+
+        conn = sqlite3.connect(self.db_file)
+        (count,) = conn.execute("SELECT COUNT(*) FROM grades;").fetchone()
+        conn.close()
+        self.assertEqual(self.database.failures, 0)
+        self.assertEqual(count, 3)
+
+
+class GradeDatabaseMigrationTestCase(unittest.TestCase):
+    def test_legacy_grades_migrated(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = str(Path(tmp_dir) / "grades.db")
+            conn = sqlite3.connect(db_file)
+            with conn:
+                conn.execute(
+                    "CREATE TABLE monitor (id TEXT, time TIMESTAMP, grade FLOAT);"
+                )
+                conn.execute(
+                    "INSERT INTO monitor VALUES ('1', '2022-05-01 10:00:00', 0.5);"
+                )
+            conn.close()
+
+            database = GradeDatabase(db_file)
+            histories = database.histories("1", 10)
+            database.close()
+
+            self.assertEqual(
+                histories, [{"id": "1", "time": datetime(2022, 5, 1, 10), "grade": 0.5}]
+            )
+            conn = sqlite3.connect(db_file)
+            self.assertEqual(
+                conn.execute("PRAGMA user_version;").fetchone()[0], SCHEMA_VERSION
+            )
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+from PyQt5.QtGui import QImage
+
+from util.image_convert import QImageWriter, ndarray_to_qimage, qimage_to_ndarray
+
+
+class ImageConvertTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        # odd widths make the lines of RGB888 padded
+        self.frames = [
+            rng.integers(0, 256, (5, width, 3), dtype=np.uint8) for width in (37, 64)
+        ]
+
+    def test_ndarray_to_qimage_in_rgb(self) -> None:
+        for frame in self.frames:
+            with self.subTest(width=frame.shape[1]):
+                qimage = ndarray_to_qimage(frame)
+
+                b, g, r = map(int, frame[3, 2])
+                self.assertEqual(qimage.pixel(2, 3) & 0xFFFFFF, r << 16 | g << 8 | b)
+                np.testing.assert_array_equal(
+                    qimage_to_ndarray(qimage)[..., ::-1], frame
+                )
+
+    def test_view_is_read_only_and_keeps_image_alive(self) -> None:
+        qimage = QImage(37, 5, QImage.Format_RGB32)
+        qimage.fill(0xFF0A141E)
+
+        view = qimage_to_ndarray(qimage)
+        del qimage
+
+        self.assertFalse(view.flags.writeable)
+        self.assertEqual(view.shape, (5, 37, 4))
+        np.testing.assert_array_equal(view[4, 36], (0x1E, 0x14, 0x0A, 0xFF))
+
+    def test_writer_does_not_modify_image_held_elsewhere(self) -> None:
+        writer = QImageWriter()
+        held = QImage(writer.write(self.frames[0]))  # e.g., by a queued signal
+
+        writer.write(self.frames[0][::-1].copy())
+
+        np.testing.assert_array_equal(
+            qimage_to_ndarray(held)[..., ::-1], self.frames[0]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
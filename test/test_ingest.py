@@ -0,0 +1,93 @@
+import unittest
+
+import server.main as flask_server
+from server.ingest import MAX_BATCH_SIZE, IngestGate, parse_batch
+from server.store import RecordStore
+
+
+class ParseBatchTestCase(unittest.TestCase):
+    GENRES = ("grades", "screenshots")
+
+    def test_valid_batch(self) -> None:
+        batch = {"grades": [{"id": "1"}, {"id": "2"}], "screenshots": [{"id": "1"}]}
+        self.assertEqual(parse_batch(batch, self.GENRES), batch)
+
+    def test_malformed_batch(self) -> None:
+        for batch in (
+            None,
+            [{"id": "1"}],
+            {"unknown": [{"id": "1"}]},
+            {"grades": {"id": "1"}},
+            {"grades": [{"id": "1"}, {"grade": 0.5}]},
+            {"grades": [{"id": str(i)} for i in range(MAX_BATCH_SIZE + 1)]},
+        ):
+            with self.subTest(batch=str(batch)[:40]):
+                with self.assertRaises(ValueError):
+                    parse_batch(batch, self.GENRES)
+
+
+class IngestGateTestCase(unittest.TestCase):
+    def test_refuse_when_saturated(self) -> None:
+        queued = 0
+        gate = IngestGate(lambda: queued, max_pending=10)
+
+        self.assertTrue(gate.try_admit(6))
+        self.assertFalse(gate.try_admit(5))
+        gate.release(6)
+        self.assertTrue(gate.try_admit(10))
+        gate.release(10)
+
+        queued = 8
+        self.assertFalse(gate.try_admit(3))
+
+    def test_refuse_when_too_many_posts(self) -> None:
+        # a store which queues nothing, e.g., in memory
+        gate = IngestGate(lambda: 0, max_requests=2)
+
+        self.assertTrue(gate.try_admit(1))
+        self.assertTrue(gate.try_admit(1))
+        self.assertFalse(gate.try_admit(1))
+        gate.release(1)
+        self.assertTrue(gate.try_admit(1))
+
+
+class BatchEndpointTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._origin = flask_server.store, flask_server.gate
+        flask_server.store = RecordStore(flask_server.GENRES)
+        self.client = flask_server.app.test_client()
+
+    def tearDown(self) -> None:
+        flask_server.store, flask_server.gate = self._origin
+
+    def test_batch_stored_at_once(self) -> None:
+        batch = {"grades": [{"id": "1"}, {"id": "2"}], "screenshots": [{"id": "1"}]}
+        response = self.client.post("/student/batch", json=batch)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"grades": 2, "screenshots": 1})
+        _, records = flask_server.store.read_since(flask_server.GENRES, 0)
+        self.assertEqual(records, batch)
+
+    def test_malformed_batch_not_stored(self) -> None:
+        response = self.client.post(
+            "/student/batch", json={"grades": [{"id": "1"}, "not a record"]}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(flask_server.store.cursor, 0)
+
+    def test_busy_with_retry_after(self) -> None:
+        flask_server.gate = IngestGate(lambda: 0, max_pending=1, retry_after=3)
+
+        response = self.client.post(
+            "/student/batch", json={"grades": [{"id": "1"}, {"id": "2"}]}
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "3")
+        self.assertEqual(flask_server.store.cursor, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
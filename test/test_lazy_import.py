@@ -0,0 +1,32 @@
+import json
+import sys
+import unittest
+
+import util.lazy_import
+from util.lazy_import import LazyModule, lazy_import
+
+
+class LazyImportTestCase(unittest.TestCase):
+    # a small module which nothing here imports
+    NAME = "colorsys"
+
+    def setUp(self) -> None:
+        sys.modules.pop(self.NAME, None)
+        util.lazy_import.import_times.pop(self.NAME, None)
+
+    def test_imported_on_first_attribute_access(self) -> None:
+        module = lazy_import(self.NAME)
+
+        self.assertIsInstance(module, LazyModule)
+        self.assertNotIn(self.NAME, sys.modules)
+
+        self.assertEqual(module.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn(self.NAME, sys.modules)
+        self.assertIn(self.NAME, util.lazy_import.import_times)
+
+    def test_imported_module_returned_as_is(self) -> None:
+        self.assertIs(lazy_import("json"), json)
+
+
+if __name__ == "__main__":
+    unittest.main()
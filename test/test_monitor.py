@@ -1,7 +1,15 @@
 import unittest
 from typing import List
 
-from teacher.monitor import Col, ColumnHeader, RowContent
+from PyQt5.QtCore import Qt
+
+from teacher.monitor import (
+    Col,
+    ColumnHeader,
+    MonitorModel,
+    MonitorSortProxy,
+    RowContent,
+)
 
 
 class ColTestCase(unittest.TestCase):
@@ -77,5 +85,64 @@ class ColumnHeaderTestCase(unittest.TestCase):
             )
 
 
+class MonitorModelTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.col_header = ColumnHeader((("id", str), ("grade", float)))
+        self.model = MonitorModel(self.col_header, "id")
+        self.proxy = MonitorSortProxy()
+        self.proxy.setSourceModel(self.model)
+
+    def _rows(self, *grades: float) -> List[RowContent]:
+        return [
+            self.col_header.to_row({"id": str(i), "grade": grade})
+            for i, grade in enumerate(grades)
+        ]
+
+    def test_update_rows_by_key(self) -> None:
+        self.model.update_rows(self._rows(0.5, 0.7))
+        changed_col_nos = self.model.update_rows(
+            [RowContent([Col(0, "id", "1"), Col(1, "grade", 0.9)])]
+        )
+
+        self.assertEqual(self.model.rowCount(), 2)
+        self.assertEqual(self.model.values_of(self.model.row_no_of("1")), ["1", 0.9])
+        self.assertEqual(changed_col_nos, {0, 1})
+        self.assertEqual(self.model.row_no_of("2"), -1)
+
+    def test_new_row_with_blank_cols(self) -> None:
+        self.model.update_rows([RowContent([Col(0, "id", "3")])])
+
+        index = self.model.index(self.model.row_no_of("3"), 1)
+        self.assertEqual(self.model.data(index), "")
+
+    def test_row_without_key(self) -> None:
+        with self.assertRaises(ValueError):
+            self.model.update_rows([RowContent([Col(1, "grade", 0.5)])])
+
+    def test_sorted_once_with_blanks_first(self) -> None:
+        self.model.update_rows(self._rows(0.5, 0.2, 0.9))
+        self.model.update_rows([RowContent([Col(0, "id", "9")])])
+        self.proxy.sort(1, Qt.AscendingOrder)
+
+        ids = [self.proxy.index(i, 0).data() for i in range(self.proxy.rowCount())]
+        self.assertEqual(ids, ["9", "1", "0", "2"])
+
+    def test_histories_in_order(self) -> None:
+        self.model.update_rows(self._rows(0.5, 0.2))
+        self.proxy.sort(1, Qt.AscendingOrder)
+        self.model.set_histories(
+            self.model.row_no_of("0"),
+            [self.col_header.to_row({"id": "0", "grade": g}) for g in (0.9, 0.1)],
+        )
+
+        parent = self.proxy.index(1, 0)
+        self.assertEqual(parent.data(), "0")
+        self.assertEqual(
+            [self.proxy.index(i, 1, parent).data() for i in range(2)], ["0.9", "0.1"]
+        )
+        self.model.remove_histories(self.model.row_no_of("0"))
+        self.assertEqual(self.proxy.rowCount(parent), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+from typing import Dict, List
+
+import numpy as np
+
+from posture.fallback import MtcnnFallback
+
+
+FACE = {
+    "box": [100, 50, 60, 80],
+    "confidence": 0.99,
+    "keypoints": {
+        "left_eye": (115, 70),
+        "right_eye": (145, 70),
+        "nose": (130, 90),
+        "mouth_left": (118, 110),
+        "mouth_right": (142, 110),
+    },
+}
+
+
+class MtcnnFallbackTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.faces: List[Dict] = [FACE]
+        self.widths: List[int] = []
+        self.detected = threading.Semaphore(0)
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    def tearDown(self) -> None:
+        self.fallback.stop()
+
+    def _detect_faces(self, image: np.ndarray) -> List[Dict]:
+        self.widths.append(image.shape[1])
+        self.detected.release()
+        return self.faces
+
+    def _create_fallback(self, **kwargs) -> None:
+        self.fallback = MtcnnFallback(self._detect_faces, max_width=320, **kwargs)
+
+    def _wait_for_result(self) -> None:
+        self.assertTrue(self.detected.acquire(timeout=1))
+        # the result is stored right after the detection returns
+        time.sleep(0.05)
+
+    def test_face_scaled_back_to_frame(self) -> None:
+        self._create_fallback()
+
+        self.assertIsNone(self.fallback.detect_face(self.frame))
+        self._wait_for_result()
+        face = self.fallback.detect_face(self.frame)
+
+        self.assertEqual(self.widths, [320])
+        self.assertEqual(face["box"], [200, 100, 120, 160])
+        self.assertEqual(face["keypoints"]["nose"], (260, 180))
+        stats = self.fallback.stats
+        self.assertEqual((stats.hits, stats.misses, stats.detections), (1, 1, 1))
+
+    def test_no_face_holds_detection_until_expired(self) -> None:
+        self.faces = []
+        self._create_fallback(min_interval=0, negative_ttl=0.3)
+
+        self.fallback.detect_face(self.frame)
+        self._wait_for_result()
+        for _ in range(5):
+            self.assertIsNone(self.fallback.detect_face(self.frame))
+        self.assertEqual(len(self.widths), 1)
+
+        time.sleep(0.3)
+        self.fallback.detect_face(self.frame)
+        self._wait_for_result()
+
+        self.assertEqual(len(self.widths), 2)
+        self.assertEqual(self.fallback.stats.hits, 5)
+
+    def test_not_blocked_by_slow_detection(self) -> None:
+        def slow_detect_faces(image: np.ndarray) -> List[Dict]:
+            time.sleep(0.5)
+            return self._detect_faces(image)
+
+        self.fallback = MtcnnFallback(slow_detect_faces)
+
+        start = time.perf_counter()
+        for _ in range(10):
+            self.fallback.detect_face(self.frame)
+
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self._wait_for_result()
+        self.assertEqual(self.fallback.stats.detections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,248 @@
+import contextlib
+import io
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List
+
+from server.journal import SqliteJournal
+from server.sharded_store import ShardedRecordStore
+from server.store import RecordStore
+
+
+class RecordStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.store = RecordStore(("grades", "screenshots"), capacity=5)
+
+    def test_cursor_across_genres(self) -> None:
+        self.assertEqual(self.store.append("grades", {"id": "1"}), 1)
+        self.assertEqual(self.store.append("screenshots", {"id": "1"}), 2)
+        self.assertEqual(self.store.extend("grades", [{"id": "2"}, {"id": "3"}]), 4)
+        self.assertEqual(self.store.cursor, 4)
+
+    def test_read_since(self) -> None:
+        self.store.append("grades", {"id": "1"})
+        self.store.append("screenshots", {"id": "1"})
+        self.store.append("grades", {"id": "2"})
+
+        cursor, records = self.store.read_since(("grades", "screenshots"), 1)
+        self.assertEqual(cursor, 3)
+        self.assertEqual(records["grades"], [{"id": "2"}])
+        self.assertEqual(records["screenshots"], [{"id": "1"}])
+
+        cursor, records = self.store.read_since(("grades",), cursor)
+        self.assertEqual(cursor, 3)
+        self.assertEqual(records["grades"], [])
+
+    def test_oldest_dropped_when_full(self) -> None:
+        self.store.extend("grades", [{"id": str(i)} for i in range(8)])
+        _, records = self.store.read_since(("grades",), 0)
+        self.assertEqual(records["grades"], [{"id": str(i)} for i in range(3, 8)])
+
+    def test_wait_since_wakes_up_on_append(self) -> None:
+        timer = threading.Timer(0.2, self.store.append, ("grades", {"id": "1"}))
+        timer.start()
+        start = time.perf_counter()
+        cursor, records = self.store.wait_since(("grades",), 0, timeout=10)
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(cursor, 1)
+        self.assertEqual(records["grades"], [{"id": "1"}])
+
+    def test_wait_since_timeout(self) -> None:
+        self.store.append("screenshots", {"id": "1"})
+        # records of other genres don't wake up the waiting
+        cursor, records = self.store.wait_since(("grades",), 0, timeout=0.1)
+        self.assertEqual(cursor, 1)
+        self.assertEqual(records["grades"], [])
+
+    def test_consume(self) -> None:
+        self.store.append("grades", {"id": "1"})
+        self.assertEqual(self.store.peek("teacher", "grades"), [{"id": "1"}])
+        self.assertEqual(self.store.consume("teacher", "grades"), [{"id": "1"}])
+        self.assertEqual(self.store.consume("teacher", "grades"), [])
+        # other consumers are not affected
+        self.assertEqual(self.store.consume("dashboard", "grades"), [{"id": "1"}])
+
+    def test_consumer_cursor_never_goes_backwards(self) -> None:
+        self.store.set_consumer_cursor("teacher", 10)
+        self.store.set_consumer_cursor("teacher", 3)
+        self.assertEqual(self.store.consumer_cursor("teacher"), 10)
+        self.assertEqual(self.store.consumer_cursor("stranger"), 0)
+
+
+class JournaledRecordStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = str(Path(self.tmp_dir.name) / "records.db")
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _reopen(self) -> RecordStore:
+        return RecordStore(
+            ("grades", "screenshots"),
+            capacity=3,
+            journal=SqliteJournal(self.db_file),
+        )
+
+    def test_recover_after_restart(self) -> None:
+        store = self._reopen()
+        store.extend("grades", [{"id": str(i)} for i in range(5)])
+        store.append("screenshots", {"id": "0"})
+        store.consume("teacher", "grades")
+        store.close()
+
+        store = self._reopen()
+        self.assertEqual(store.cursor, 6)
+        _, records = store.read_since(("grades", "screenshots"), 0)
+        # only the latest records within capacity are recovered
+        self.assertEqual(records["grades"], [{"id": "2"}, {"id": "3"}, {"id": "4"}])
+        self.assertEqual(records["screenshots"], [{"id": "0"}])
+        self.assertEqual(store.consumer_cursor("teacher"), 6)
+        self.assertEqual(store.consume("teacher", "grades"), [])
+        # new records continue the sequence
+        self.assertEqual(store.append("grades", {"id": "5"}), 7)
+        store.close()
+
+    def test_trimmed_while_running(self) -> None:
+        store = RecordStore(
+            ("grades",),
+            capacity=3,
+            journal=SqliteJournal(self.db_file, trim_interval=1),
+        )
+        for i in range(10):
+            store.append("grades", {"id": str(i)})
+        store.close()
+
+        conn = sqlite3.connect(self.db_file)
+        (count,) = conn.execute("SELECT COUNT(*) FROM records;").fetchone()
+        conn.close()
+        self.assertEqual(count, 3)
+
+    def test_failed_commit_retried(self) -> None:
+        class FlakyJournal(SqliteJournal):
+            RETRY_DELAY = 0.01
+            failures = 2
+
+            @staticmethod
+            def _commit(conn, batch):
+                if FlakyJournal.failures:
+                    FlakyJournal.failures -= 1
+                    raise sqlite3.OperationalError("database is locked")
+                return SqliteJournal._commit(conn, batch)
+
+        journal = FlakyJournal(self.db_file)
+        self.addCleanup(journal.close)
+        with contextlib.redirect_stderr(io.StringIO()):
+            journal.write_record(1, "grades", {"id": "0"})
+            journal.write_record(2, "grades", {"id": "1"})
+            deadline = time.monotonic() + 5
+            while (
+                len(journal.load_records("grades", 10)) < 2
+                and time.monotonic() < deadline
+            ):
+                time.sleep(0.01)
+
+        self.assertEqual(FlakyJournal.failures, 0)
+        self.assertEqual(
+            journal.load_records("grades", 10), [(1, {"id": "0"}), (2, {"id": "1"})]
+        )
+
+
+class ShardedRecordStoreTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # two stores on the same directory act like two processes
+        self.stores = [
+            ShardedRecordStore(("grades", "screenshots"), self.tmp_dir.name, shards=3)
+            for _ in range(2)
+        ]
+
+    def tearDown(self) -> None:
+        for store in self.stores:
+            store.close()
+        self.tmp_dir.cleanup()
+
+    def test_parse_cursor(self) -> None:
+        store = self.stores[0]
+        self.assertEqual(store.initial_cursor, "0.0.0")
+        self.assertEqual(store.parse_cursor("1.0.12"), "1.0.12")
+        for malformed in ("1.0", "1.0.-1", "a.b.c", "3"):
+            self.assertRaises(ValueError, store.parse_cursor, malformed)
+
+    def test_records_shared_among_stores(self) -> None:
+        self.stores[0].extend("grades", [{"id": str(i)} for i in range(10)])
+        self.stores[1].append("screenshots", {"id": "0"})
+
+        cursor, records = self.stores[1].wait_since(
+            ("grades",), self.stores[1].initial_cursor, timeout=5
+        )
+        # wait until all are committed
+        time.sleep(0.5)
+        cursor, more_records = self.stores[1].read_since(("grades",), cursor)
+        ids = [r["id"] for r in records["grades"] + more_records["grades"]]
+        self.assertCountEqual(ids, [str(i) for i in range(10)])
+
+        _, records = self.stores[0].read_since(("screenshots",), "0.0.0")
+        self.assertEqual(records["screenshots"], [{"id": "0"}])
+
+    def test_consume(self) -> None:
+        self.stores[0].append("grades", {"id": "0"})
+        self.stores[0].wait_since(("grades",), "0.0.0", timeout=5)
+        self.assertEqual(self.stores[0].consume("teacher", "grades"), [{"id": "0"}])
+        self.assertEqual(self.stores[1].consume("teacher", "grades"), [])
+        self.assertEqual(self.stores[1].peek("dashboard", "grades"), [{"id": "0"}])
+
+    def test_connections_pooled_among_threads(self) -> None:
+        store = ShardedRecordStore(
+            ("grades",), self.tmp_dir.name, shards=3, pool_size=2
+        )
+        self.stores.append(store)
+        store.append("grades", {"id": "0"})
+        store.wait_since(("grades",), store.initial_cursor, timeout=5)
+        results: List[List[dict]] = []
+
+        # like the request threads of a threaded server
+        threads = [
+            threading.Thread(target=lambda: results.append(store.peek("t", "grades")))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [[{"id": "0"}]] * 10)
+        self.assertLessEqual(store._pool.qsize(), 2)
+
+    def test_locked_shards_retried(self) -> None:
+        class ImpatientStore(ShardedRecordStore):
+            RETRY_DELAY = 0.05
+
+            def _connect(self, db_file: str) -> sqlite3.Connection:
+                conn = super()._connect(db_file)
+                conn.execute("PRAGMA busy_timeout=10;")
+                return conn
+
+        store = ImpatientStore(("grades",), self.tmp_dir.name, shards=3)
+        self.stores.append(store)
+        # like other processes holding the write locks
+        lockers = [sqlite3.connect(f, isolation_level=None) for f in store._shard_files]
+        for locker in lockers:
+            locker.execute("BEGIN IMMEDIATE;")
+        with contextlib.redirect_stderr(io.StringIO()):
+            store.append("grades", {"id": "0"})
+            time.sleep(0.3)
+            for locker in lockers:
+                locker.execute("COMMIT;")
+                locker.close()
+            _, records = store.wait_since(("grades",), store.initial_cursor, timeout=5)
+
+        self.assertEqual(records["grades"], [{"id": "0"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
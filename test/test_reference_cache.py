@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from distance.reference_cache import ReferenceCache
+
+
+class ReferenceCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.dir.name, "cache.json")
+        self.model_file = os.path.join(self.dir.name, "model.dat")
+        with open(self.model_file, "wb") as f:
+            f.write(b"model")
+        self.image_file = os.path.join(self.dir.name, "ref.png")
+        cv2.imwrite(self.image_file, np.zeros((8, 8, 3), dtype=np.uint8))
+        self.calls = 0
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def _detect(self, image):
+        self.calls += 1
+        return np.arange(136).reshape(68, 2)
+
+    def _fail(self, image):
+        self.calls += 1
+        raise ValueError("should have exactly 1 face in the reference image")
+
+    def test_detected_once_across_instances(self) -> None:
+        first = ReferenceCache(self.cache_file, self.model_file).get_or_detect(
+            self.image_file, self._detect
+        )
+        second = ReferenceCache(self.cache_file, self.model_file).get_or_detect(
+            self.image_file, self._detect
+        )
+
+        self.assertEqual(self.calls, 1)
+        np.testing.assert_array_equal(first, second)
+
+    def test_failure_cached(self) -> None:
+        cache = ReferenceCache(self.cache_file, self.model_file)
+        for _ in range(2):
+            with self.assertRaisesRegex(ValueError, "exactly 1 face"):
+                cache.get_or_detect(self.image_file, self._fail)
+
+        self.assertEqual(self.calls, 1)
+
+    def test_detected_again_if_image_or_model_changes(self) -> None:
+        cache = ReferenceCache(self.cache_file, self.model_file)
+        cache.get_or_detect(self.image_file, self._detect)
+
+        cv2.imwrite(self.image_file, np.ones((8, 8, 3), dtype=np.uint8))
+        cache.get_or_detect(self.image_file, self._detect)
+        with open(self.model_file, "ab") as f:
+            f.write(b" v2")
+        cache.get_or_detect(self.image_file, self._detect)
+
+        self.assertEqual(self.calls, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import threading
+import time
+import unittest
+from typing import List
+
+from util.scheduler import PeriodicScheduler, ScheduledJob
+
+
+class ScheduledJobTestCase(unittest.TestCase):
+    def test_next_fire_aligned_to_boundaries(self) -> None:
+        job = ScheduledJob(lambda: None, period=300, offset=10)
+        moment = time.time()
+
+        fire_time = job.next_fire_after(moment)
+
+        self.assertGreater(fire_time, moment)
+        self.assertLessEqual(fire_time - moment, 300)
+        # the local time of fire is XX:X0:10 or XX:X5:10
+        local = time.localtime(fire_time)
+        self.assertEqual(local.tm_min % 5, 0)
+        self.assertEqual(local.tm_sec, 10)
+        self.assertEqual(job.next_fire_after(fire_time), fire_time + 300)
+
+
+class PeriodicSchedulerTestCase(unittest.TestCase):
+    PERIOD = 0.2
+
+    def setUp(self) -> None:
+        self.scheduler = PeriodicScheduler()
+
+    def tearDown(self) -> None:
+        self.scheduler.stop()
+
+    def _fire_times_of(self, job_count: int, runs: int, **kwargs) -> List[List[float]]:
+        fire_times: List[List[float]] = [[] for _ in range(job_count)]
+        done = threading.Semaphore(0)
+
+        def record(times: List[float]) -> None:
+            times.append(time.time())
+            if len(times) == runs:
+                done.release()
+
+        for times in fire_times:
+            self.scheduler.every(
+                self.PERIOD, lambda times=times: record(times), **kwargs
+            )
+        for _ in range(job_count):
+            self.assertTrue(done.acquire(timeout=5))
+        return fire_times
+
+    def test_jobs_run_on_boundaries_without_drift(self) -> None:
+        fire_times = self._fire_times_of(job_count=3, runs=5, offset=0.05)
+
+        for times in fire_times:
+            for t in times[:5]:
+                # how late it is after the boundary plus offset
+                lateness = (t - 0.05) % self.PERIOD
+                self.assertLess(lateness, 0.05)
+
+    def test_jitter_within_window(self) -> None:
+        job = self.scheduler.every(60, lambda: None, offset=1, jitter=2)
+
+        self.assertGreaterEqual(job.offset, 1)
+        self.assertLessEqual(job.offset, 3)
+
+    def test_cancelled_job_not_run(self) -> None:
+        runs: List[float] = []
+        job = self.scheduler.every(self.PERIOD, lambda: runs.append(time.time()))
+        job.cancel()
+
+        time.sleep(self.PERIOD * 2)
+        self.assertEqual(runs, [])
+
+    def test_failing_job_not_stop_others(self) -> None:
+        def fail() -> None:
+            raise RuntimeError("expected to be printed")
+
+        self.scheduler.every(self.PERIOD, fail)
+        fire_times = self._fire_times_of(job_count=1, runs=2)
+
+        self.assertEqual(len(fire_times[0]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
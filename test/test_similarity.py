@@ -0,0 +1,244 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+import server.main as flask_server
+from screenshot.similarity import (
+    fingerprint_from_hex,
+    fingerprint_to_hex,
+    popcount64,
+)
+from server.shared_similarity import SharedSimilarityBoard
+from server.similarity import SimilarityBoard, parse_slices
+from server.store import RecordStore
+
+
+class _FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SimilarityBoardTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        # 10 seconds after a boundary
+        self.clock = _FakeClock(300 * 1_000 + 10)
+        self.board = SimilarityBoard(period=300, grace=30, clock=self.clock)
+        self.reference = np.full(36, 100.0)
+
+    def _screenshot(self, student_id: str, value: float):
+        return {"id": student_id, "slices": [value] * 36}
+
+    def test_slices_compared_once_reference_arrives(self) -> None:
+        self.board.add_screenshots([self._screenshot("1", 100)])
+        self.assertEqual(self.board.read_since(None)[2], [])
+
+        self.board.set_reference(self.reference)
+        self.board.add_screenshots([self._screenshot("2", 100 - 25.5)])
+
+        _, cursor, similarities = self.board.read_since(None)
+        self.assertEqual(cursor, 2)
+        self.assertEqual(dict(similarities), {"1": 1.0, "2": 0.9})
+
+    def test_read_only_new_results_with_cursor(self) -> None:
+        self.board.set_reference(self.reference)
+        self.board.add_screenshots([self._screenshot("1", 100)])
+        _, cursor, _ = self.board.read_since(None)
+
+        self.board.add_screenshots([self._screenshot("2", 100)])
+
+        self.assertEqual(self.board.read_since(cursor)[1:], (2, [("2", 1.0)]))
+        # nothing new, which the long-poll waits for until the timeout
+        self.assertEqual(self.board.wait_since(2, timeout=0.01)[1:], (2, []))
+
+    def test_new_round_waits_for_new_reference(self) -> None:
+        self.board.set_reference(self.reference)
+        self.board.add_screenshots([self._screenshot("1", 100)])
+
+        # posted a little early for the next round
+        self.clock.now += 300 - 10 - 5
+        self.board.add_screenshots([self._screenshot("1", 50)])
+
+        round_, cursor, similarities = self.board.read_since(None)
+        self.assertEqual(round_, 1_001)
+        self.assertEqual((cursor, similarities), (1, []))
+
+    def test_malformed_slices(self) -> None:
+        for slices in (None, [1] * 35, ["a"] * 36, [256] * 36):
+            with self.subTest(slices=str(slices)[:20]):
+                with self.assertRaises(ValueError):
+                    parse_slices(slices)
+
+
+class SharedSimilarityBoardTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.clock = _FakeClock(300 * 1_000 + 10)
+        db_file = str(Path(self.tmp_dir.name) / "similarities.db")
+        # two boards on the same database act like two processes
+        self.boards = [
+            SharedSimilarityBoard(db_file, period=300, grace=30, clock=self.clock)
+            for _ in range(2)
+        ]
+        self.reference = np.full(36, 100.0)
+
+    def tearDown(self) -> None:
+        for board in self.boards:
+            board.close()
+        self.tmp_dir.cleanup()
+
+    def _screenshot(self, student_id: str, value: float):
+        return {"id": student_id, "slices": [value] * 36}
+
+    def test_compared_with_reference_of_another_process(self) -> None:
+        self.boards[0].add_screenshots([self._screenshot("1", 100)])
+        self.boards[1].set_reference(self.reference)
+        self.boards[0].add_screenshots([self._screenshot("2", 100 - 25.5)])
+
+        for board in self.boards:
+            round_, cursor, similarities = board.read_since(None)
+            self.assertEqual((round_, cursor), (1_000, 2))
+            self.assertEqual(dict(similarities), {"1": 1.0, "2": 0.9})
+        self.assertEqual(self.boards[1].read_since(1)[1:], (2, [("2", 0.9)]))
+
+    def test_wait_for_results_of_another_process(self) -> None:
+        self.boards[0].set_reference(self.reference)
+        timer = threading.Timer(
+            0.1, self.boards[0].add_screenshots, ([self._screenshot("1", 100)],)
+        )
+        timer.start()
+
+        _, cursor, similarities = self.boards[1].wait_since(0, timeout=5)
+        timer.join()
+
+        self.assertEqual((cursor, similarities), (1, [("1", 1.0)]))
+
+    def test_new_round_waits_for_new_reference(self) -> None:
+        self.boards[0].set_reference(self.reference)
+        self.boards[0].add_screenshots([self._screenshot("1", 100)])
+
+        self.clock.now += 300
+        self.boards[1].add_screenshots([self._screenshot("1", 100 - 25.5)])
+
+        # the cursor continues from the previous round
+        self.assertEqual(self.boards[0].read_since(1), (1_001, 1, []))
+        self.boards[0].set_reference(self.reference)
+        self.assertEqual(self.boards[1].read_since(1)[1:], (2, [("1", 0.9)]))
+
+
+class FingerprintTestCase(unittest.TestCase):
+    def test_popcount(self) -> None:
+        words = np.array([0, 1, 0xFF, 2**64 - 1, 0x8000000000000001], dtype=np.uint64)
+
+        self.assertEqual(popcount64(words).tolist(), [0, 1, 8, 64, 2])
+
+    def test_hex_round_trip(self) -> None:
+        fingerprint = np.array([2**64 - 1, 0x0123456789ABCDEF], dtype=np.uint64)
+
+        text = fingerprint_to_hex(fingerprint)
+
+        self.assertEqual(text, "ffffffffffffffff0123456789abcdef")
+        np.testing.assert_array_equal(fingerprint_from_hex(text), fingerprint)
+        for malformed in (
+            "",
+            "abc",
+            "g" * 16,
+            None,
+            "-000000000000001",
+            "0x00000000000001",
+            " 000000000000001",
+            "f" * 15 + "\n",
+        ):
+            with self.subTest(text=malformed):
+                with self.assertRaises(ValueError):
+                    fingerprint_from_hex(malformed)
+
+    def test_compared_by_hamming_distance(self) -> None:
+        board = SimilarityBoard(mode="fingerprint")
+        board.set_reference(fingerprint_from_hex("f" * 16))
+
+        board.add_screenshots(
+            [
+                {"id": "1", "fingerprint": "f" * 16},
+                {"id": "2", "fingerprint": "0" * 8 + "f" * 8},
+                # of another size, not comparable
+                {"id": "3", "fingerprint": "f" * 32},
+                {"id": "4", "slices": [0] * 36},
+            ]
+        )
+
+        self.assertEqual(dict(board.read_since(None)[2]), {"1": 1.0, "2": 0.5})
+
+    def test_compared_on_shared_board(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = str(Path(tmp_dir) / "similarities.db")
+            boards = [
+                SharedSimilarityBoard(db_file, mode="fingerprint") for _ in range(2)
+            ]
+            try:
+                boards[0].add_screenshots(
+                    [{"id": "1", "fingerprint": "0" * 8 + "f" * 8}]
+                )
+                boards[1].set_reference(fingerprint_from_hex("f" * 16))
+                boards[0].add_screenshots([{"id": "2", "fingerprint": "f" * 32}])
+
+                self.assertEqual(boards[0].read_since(None)[2], [("1", 0.5)])
+            finally:
+                for board in boards:
+                    board.close()
+
+
+class SimilarityEndpointTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._origin = flask_server.store, flask_server.board
+        flask_server.store = RecordStore(flask_server.GENRES)
+        flask_server.board = SimilarityBoard()
+        self.client = flask_server.app.test_client()
+
+    def tearDown(self) -> None:
+        flask_server.store, flask_server.board = self._origin
+
+    def test_compared_on_server(self) -> None:
+        self.client.post("/student/screenshots", json={"id": "1", "slices": [0] * 36})
+        response = self.client.post("/teacher/reference", json={"slices": [0] * 36})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/teacher/similarities")
+
+        self.assertEqual(response.get_json()["similarities"], [["1", 1.0]])
+
+    def test_malformed_screenshot_stored(self) -> None:
+        for screenshot in ({"slices": [0] * 36}, [{"id": "1"}], "1"):
+            with self.subTest(screenshot=screenshot):
+                response = self.client.post("/student/screenshots", json=screenshot)
+
+                self.assertEqual(response.status_code, 200)
+        _, records = flask_server.store.read_since(("screenshots",), 0)
+        self.assertEqual(len(records["screenshots"]), 3)
+
+    def test_malformed_reference(self) -> None:
+        response = self.client.post("/teacher/reference", json={"slices": [0] * 35})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_signed_fingerprint_refused(self) -> None:
+        flask_server.board = SimilarityBoard(mode="fingerprint")
+        fingerprint = "-000000000000001"
+
+        response = self.client.post(
+            "/teacher/reference", json={"fingerprint": fingerprint}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/student/screenshots", json={"id": "1", "fingerprint": fingerprint}
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+from typing import List
+
+from util.startup import StartupError, StartupOrchestrator
+
+
+class StartupOrchestratorTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.startup = StartupOrchestrator()
+        self.order: List[str] = []
+        self.finished = threading.Event()
+        self.startup.on_finished(self.finished.set)
+
+    def _step(self, name: str, seconds: float = 0.0):
+        def run() -> None:
+            time.sleep(seconds)
+            self.order.append(name)
+
+        return run
+
+    def test_independent_steps_overlap(self) -> None:
+        self.startup.add("webcam", self._step("webcam", 0.2))
+        self.startup.add("model", self._step("model", 0.2))
+
+        start = time.perf_counter()
+        self.startup.start()
+        self.startup.wait("webcam", "model", timeout=1)
+
+        self.assertLess(time.perf_counter() - start, 0.35)
+
+    def test_step_runs_after_its_dependencies(self) -> None:
+        self.startup.add("detector", self._step("detector", 0.1))
+        self.startup.add("predictor", self._step("predictor", 0.05))
+        self.startup.add(
+            "landmarks", self._step("landmarks"), after=("detector", "predictor")
+        )
+        ready = threading.Event()
+        self.startup.on_done("landmarks", ready.set)
+
+        self.startup.start()
+
+        self.assertTrue(ready.wait(timeout=1))
+        self.assertTrue(self.startup.is_done("landmarks"))
+        self.assertEqual(self.order[-1], "landmarks")
+
+    def test_dependents_of_failed_step_skipped(self) -> None:
+        def fail() -> None:
+            raise ValueError("should have exactly 1 face in the reference image")
+
+        self.startup.add("landmarks", fail)
+        self.startup.add("guard", self._step("guard"), after=("landmarks",))
+
+        self.startup.start()
+
+        with self.assertRaises(StartupError):
+            self.startup.wait("guard", timeout=1)
+        self.assertTrue(self.finished.wait(timeout=1))
+        self.assertEqual(self.order, [])
+        states = {name: state for name, _, _, state in self.startup.timeline()}
+        self.assertTrue(states["landmarks"].startswith("failed"))
+        self.assertEqual(states["guard"], "skipped")
+        self.assertIn("guard", self.startup.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from server.uploader import BatchUploader
+
+
+class _StubServer(ThreadingHTTPServer):
+    """Answers the posts with the scripted statuses in order, 200 after them,
+    and keeps the bodies posted.
+    """
+
+    def __init__(self, responses: List[Tuple[int, Dict[str, str]]]) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.responses = responses
+        self.bodies: List[dict] = []
+        self.posted = threading.Condition()
+        # the answer of the first post waits for it, if set
+        self.hold: Optional[threading.Event] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def wait_for_posts(self, count: int, timeout: float) -> bool:
+        with self.posted:
+            return self.posted.wait_for(lambda: len(self.bodies) >= count, timeout)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: _StubServer
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.posted:
+            first = not self.server.bodies
+            self.server.bodies.append(body)
+            status, headers = (
+                self.server.responses.pop(0) if self.server.responses else (200, {})
+            )
+            self.server.posted.notify_all()
+        if first and self.server.hold is not None:
+            self.server.hold.wait(5)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class BatchUploaderTestCase(unittest.TestCase):
+    def _serve(self, responses: List[Tuple[int, Dict[str, str]]]) -> _StubServer:
+        server = _StubServer(responses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _upload(self, server: _StubServer, max_pending: int = 1_000) -> BatchUploader:
+        uploader = BatchUploader(server.url, linger=0.05, max_pending=max_pending)
+        self.addCleanup(uploader.close, 0)
+        return uploader
+
+    def test_busy_retried_after_retry_after(self) -> None:
+        server = self._serve([(503, {"Retry-After": "0.1"})])
+        uploader = self._upload(server)
+
+        uploader.put("grades", {"id": "1"})
+
+        self.assertTrue(server.wait_for_posts(2, timeout=2))
+        self.assertEqual(server.bodies, [{"grades": [{"id": "1"}]}] * 2)
+
+    def test_server_error_retried(self) -> None:
+        server = self._serve([(502, {})])
+        uploader = self._upload(server)
+
+        uploader.put("grades", {"id": "1"})
+
+        # the first backoff is within a second
+        self.assertTrue(server.wait_for_posts(2, timeout=3))
+        self.assertEqual(server.bodies[1], {"grades": [{"id": "1"}]})
+
+    def test_malformed_batch_dropped(self) -> None:
+        server = self._serve([(400, {})])
+        uploader = self._upload(server)
+
+        uploader.put("grades", {"id": "1"})
+
+        self.assertTrue(server.wait_for_posts(1, timeout=2))
+        self.assertFalse(server.wait_for_posts(2, timeout=0.5))
+        self.assertEqual(uploader.pending(), 0)
+
+    def test_requeued_before_newer_ones_within_max_pending(self) -> None:
+        server = self._serve([(503, {"Retry-After": "0.1"})])
+        server.hold = threading.Event()
+        uploader = self._upload(server, max_pending=3)
+
+        uploader.put("grades", {"id": "1"})
+        uploader.put("grades", {"id": "2"})
+        self.assertTrue(server.wait_for_posts(1, timeout=2))
+        # put while the first batch is being posted
+        uploader.put("grades", {"id": "3"})
+        uploader.put("grades", {"id": "4"})
+        server.hold.set()
+
+        self.assertTrue(server.wait_for_posts(2, timeout=2))
+        # the oldest of the refused batch has no room
+        self.assertEqual(
+            server.bodies[1], {"grades": [{"id": "2"}, {"id": "3"}, {"id": "4"}]}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
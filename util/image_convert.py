@@ -1,26 +1,112 @@
+from typing import Optional
+
+import cv2
 import numpy as np
 from PyQt5.QtGui import QImage, QPixmap
 
 from util.image_type import ColorImage
 
 
+# the formats whose pixels are 4 bytes, B, G, R, A (or X) in memory
+_FORMATS_OF_4_CHANNELS = (
+    QImage.Format_RGB32,
+    QImage.Format_ARGB32,
+    QImage.Format_ARGB32_Premultiplied,
+)
+# and those of 3 bytes, R, G, B in memory
+_FORMATS_OF_3_CHANNELS = (QImage.Format_RGB888,)
+
+
+class _QImageBuffer:
+    """Exposes the pixels of a QImage through the array interface, so the
+    ndarray made from it views them without copying.
+
+    The ndarray keeps this as its base, which keeps the QImage alive as long as
+    the ndarray is.
+    """
+
+    def __init__(self, image: QImage, writable: bool) -> None:
+        if image.format() in _FORMATS_OF_4_CHANNELS:
+            channel = 4
+        elif image.format() in _FORMATS_OF_3_CHANNELS:
+            channel = 3
+        else:
+            raise ValueError(f"format {image.format()} is not supported")
+        self._image = image
+        # bits() detaches the image from its copies, if any, so only this one
+        # is written; constBits() never copies.
+        pointer = image.bits() if writable else image.constBits()
+        self.__array_interface__ = {
+            "version": 3,
+            "shape": (image.height(), image.width(), channel),
+            "typestr": "|u1",
+            # each line is padded to bytesPerLine, a multiple of 4
+            "strides": (image.bytesPerLine(), channel, 1),
+            "data": (int(pointer), not writable),
+        }
+
+
+def qimage_to_ndarray(image: QImage, writable: bool = False) -> np.ndarray:
+    """Views the pixels of the QImage as an ndarray without copying.
+
+    The view is (height, width, 4) in BGRA for the 32-bit formats, and
+    (height, width, 3) in RGB for Format_RGB888.
+
+    Lifetime: the view keeps the QImage alive, but it's the buffer of the
+    QImage at the moment. Once the QImage is modified by Qt, e.g., painted
+    on, the view may not reflect it, so take a new view instead of keeping one.
+
+    Arguments:
+        writable:
+            A writable view detaches the QImage from its implicitly shared
+            copies first, so writing doesn't affect them.
+
+    Raises:
+        ValueError: The format of the QImage is neither 32-bit nor RGB888.
+    """
+    return np.asarray(_QImageBuffer(image, writable))
+
+
 def qpixmap_to_ndarray(image: QPixmap) -> ColorImage:
-    """Converts the QPixmap type image to ndarray type."""
+    """Converts the QPixmap type image to ndarray type, in BGRA.
+
+    The image is converted from the pixmap once; the ndarray views it.
+    """
     qimage: QImage = image.toImage()
+    if qimage.format() not in _FORMATS_OF_4_CHANNELS:
+        qimage = qimage.convertToFormat(QImage.Format_RGB32)
+    return qimage_to_ndarray(qimage)
+
 
-    width, height = qimage.width(), qimage.height()
+def ndarray_to_qimage(image: ColorImage) -> QImage:
+    """Converts the BGR image to a QImage, which owns a copy of the pixels."""
+    height, width, _ = image.shape
+    qimage = QImage(width, height, QImage.Format_RGB888)
+    cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=qimage_to_ndarray(qimage, True))
+    return qimage
 
-    byte_str: bytes = qimage.constBits().asstring(height * width * 4)
-    ndarray: ColorImage = np.frombuffer(byte_str, np.uint8).reshape((height, width, 4))
 
-    return ndarray
+class QImageWriter:
+    """Converts BGR frames into a QImage which is reused frame by frame.
 
+    The BGR to RGB conversion writes straight into the buffer of the QImage,
+    so a frame costs no allocation nor copying besides the conversion itself.
+    A new buffer is allocated only when the size changes, or when the QImage
+    of the previous frame is still held elsewhere, e.g., by a queued signal,
+    since QImage is implicitly shared and detached before written.
+    """
 
-def ndarray_to_qimage(image: ColorImage) -> QImage:
-    height, width, channel = image.shape
-    # RGB -> 3
-    bytes_per_line = 3 * width
+    def __init__(self) -> None:
+        self._image: Optional[QImage] = None
 
-    return QImage(
-        image.data, width, height, bytes_per_line, QImage.Format_RGB888
-    ).rgbSwapped()
+    def write(self, frame: ColorImage) -> QImage:
+        """Returns the QImage of the frame; valid until the next write."""
+        height, width, _ = frame.shape
+        if (
+            self._image is None
+            or self._image.width() != width
+            or self._image.height() != height
+        ):
+            self._image = QImage(width, height, QImage.Format_RGB888)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=qimage_to_ndarray(self._image, True))
+        return self._image
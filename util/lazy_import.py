@@ -0,0 +1,53 @@
+import importlib
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Optional
+
+
+# name of the lazy modules loaded -> in seconds, how long the import took
+import_times: Dict[str, float] = {}
+
+
+class LazyModule(ModuleType):
+    """A placeholder of a module, which is imported on first access of its
+    attributes.
+
+    Heavy dependencies which are used by only some features, e.g., TensorFlow
+    of MTCNN, are imported as lazy modules, so they don't delay the startup.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr: str):
+        # only called for the attributes not found on the placeholder itself
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self.__name__!r} ({state})>"
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            # the features run in different threads, only one of them imports
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    import_times[self.__name__] = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Returns the module if it's already imported, a LazyModule of it otherwise.
+
+    Arguments:
+        name: The absolute name of the module, e.g., "matplotlib.pyplot".
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
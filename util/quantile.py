@@ -0,0 +1,89 @@
+import bisect
+import math
+from typing import List
+
+
+class P2Quantile:
+    """Estimates a quantile of a stream with the P-square algorithm
+    (Jain & Chlamtac, 1985).
+
+    Only 5 markers are kept no matter how many values are added, and adding a
+    value costs O(1). The estimate is exact for the first 5 values.
+    """
+
+    def __init__(self, p: float = 0.5) -> None:
+        """
+        Arguments:
+            p: The quantile to estimate, between (0, 1), e.g., 0.5 for the median.
+        """
+        if not 0 < p < 1:
+            raise ValueError("p should be between (0, 1)")
+        self._p = p
+        self._count = 0
+        # heights and actual positions of the markers; the positions start at 1
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def value(self) -> float:
+        """The estimated quantile; NaN if no value is added yet."""
+        if self._count == 0:
+            return math.nan
+        if self._count > 5:
+            return self._heights[2]
+        # exact, interpolated between the closest ranks
+        rank = self._p * (self._count - 1)
+        lower = math.floor(rank)
+        upper = min(lower + 1, self._count - 1)
+        return self._heights[lower] + (rank - lower) * (
+            self._heights[upper] - self._heights[lower]
+        )
+
+    def add(self, x: float) -> None:
+        self._count += 1
+        q = self._heights
+        if self._count <= 5:
+            bisect.insort(q, x)
+            return
+
+        # the cell the value falls in, with the extreme markers extended
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect.bisect_right(q, x) - 1
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = self._linear(i, step)
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
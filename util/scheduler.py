@@ -0,0 +1,154 @@
+import itertools
+import math
+import random
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Optional, Tuple
+
+from util.heap import MinHeap
+
+
+class ScheduledJob:
+    """A job which runs periodically on the boundaries of the wall-clock."""
+
+    def __init__(self, callback: Callable[[], Any], period: float, offset: float):
+        self._callback = callback
+        self._period = period
+        self._offset = offset
+        self._f_cancelled = False
+
+    @property
+    def offset(self) -> float:
+        """In seconds, how long after the boundaries the job runs, jitter included."""
+        return self._offset
+
+    def cancel(self) -> None:
+        """The job won't run again; one which is running is not interrupted."""
+        self._f_cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self._f_cancelled
+
+    def next_fire_after(self, moment: float) -> float:
+        """Returns the first time the job should run after the moment.
+
+        Both are in seconds since the epoch. The boundaries are those of the
+        local time, e.g., XX:X0:00 and XX:X5:00 with a period of 5 minutes.
+        """
+        utc_offset = datetime.fromtimestamp(moment).astimezone().utcoffset()
+        local_shift = utc_offset.total_seconds() if utc_offset is not None else 0.0
+        local = moment + local_shift - self._offset
+        return (math.floor(local / self._period) + 1) * self._period + (
+            self._offset - local_shift
+        )
+
+    def run(self) -> None:
+        self._callback()
+
+
+class PeriodicScheduler:
+    """Runs many periodic jobs on a single thread.
+
+    The jobs are aligned to the boundaries of the wall-clock. Each fire time is
+    derived from the boundaries instead of the previous run, so the schedule
+    doesn't drift however long the jobs take. The thread sleeps with a timed
+    wait until the earliest job is due, no polling nor busy-waiting.
+
+    Jobs should be short since they run one after another; a job which runs
+    over its next fire time skips it.
+    """
+
+    def __init__(self, name: str = "scheduler") -> None:
+        # (fire time, insertion order, job); the order breaks the ties
+        self._jobs: MinHeap[Tuple[float, int, ScheduledJob]] = MinHeap()
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._f_running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def every(
+        self,
+        period: float,
+        callback: Callable[[], Any],
+        offset: float = 0.0,
+        jitter: float = 0.0,
+    ) -> ScheduledJob:
+        """Has the callback called on every boundary of the period.
+
+        Arguments:
+            period: In seconds, e.g., 5 * 60 to run on XX:X0:00 and XX:X5:00.
+            callback: Runs in the thread of the scheduler.
+            offset: In seconds. Runs this long after the boundaries.
+            jitter:
+                In seconds. A random delay within it is picked once and added to
+                the offset, so clients which run the same job, e.g., students
+                who post to the server, don't do so in the same instant.
+        """
+        job = ScheduledJob(callback, period, offset + random.uniform(0, jitter))
+        self._push(job, job.next_fire_after(time.time()))
+        return job
+
+    def stop(self) -> None:
+        """Stops the thread after the running job, if any, returns."""
+        with self._cond:
+            self._f_running = False
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _push(self, job: ScheduledJob, fire_time: float) -> None:
+        with self._cond:
+            self._jobs.push((fire_time, next(self._order), job))
+            # the new job may be earlier than the one being waited for
+            self._cond.notify()
+
+    def _next_due_job(self) -> Optional[Tuple[float, ScheduledJob]]:
+        """Blocks until a job is due; None if the scheduler is stopped."""
+        with self._cond:
+            while self._f_running:
+                if not self._jobs:
+                    self._cond.wait()
+                    continue
+                fire_time, _, job = self._jobs.min
+                if job.is_cancelled():
+                    self._jobs.pop()
+                    continue
+                # The remaining time is recalculated on every wake-up, which
+                # also catches up with adjustments of the wall-clock.
+                remaining = fire_time - time.time()
+                if remaining <= 0:
+                    self._jobs.pop()
+                    return fire_time, job
+                # the timeout of the wait is measured by the monotonic clock
+                self._cond.wait(remaining)
+            return None
+
+    def _run(self) -> None:
+        while True:
+            due = self._next_due_job()
+            if due is None:
+                return
+            fire_time, job = due
+            try:
+                job.run()
+            except Exception:
+                # one failing job shouldn't stop the others
+                traceback.print_exc()
+            if not job.is_cancelled():
+                self._push(job, job.next_fire_after(max(time.time(), fire_time)))
+
+
+_shared_scheduler: Optional[PeriodicScheduler] = None
+_shared_lock = threading.Lock()
+
+
+def shared_scheduler() -> PeriodicScheduler:
+    """Returns the scheduler shared by the whole process, created on first use."""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = PeriodicScheduler("shared-scheduler")
+        return _shared_scheduler
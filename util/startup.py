@@ -0,0 +1,202 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class StartupError(RuntimeError):
+    """A step of startup failed, or was skipped since one it depends on did."""
+
+
+class _Step:
+    def __init__(self, name: str, func: Callable[[], Any], after: Tuple[str, ...]):
+        self.name = name
+        self.func = func
+        self.after = after
+        self.started: Optional[float] = None
+        self.ended: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self.callbacks: List[Callable[[], Any]] = []
+
+
+class StartupOrchestrator:
+    """Runs the steps of startup concurrently, each as soon as the steps it
+    depends on are done, so the slow ones, e.g., opening the webcam and loading
+    the models, overlap each other and the construction of the GUI.
+
+    The time each step starts and ends is recorded for the timeline report.
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self._steps: Dict[str, _Step] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="startup")
+        self._origin = time.perf_counter()
+        self._finished_callbacks: List[Callable[[], Any]] = []
+        self._f_finished = False
+
+    def add(
+        self, name: str, func: Callable[[], Any], after: Iterable[str] = ()
+    ) -> None:
+        """Adds a step, which should be before start().
+
+        Arguments:
+            name: Unique among the steps.
+            func: Runs in a thread of the orchestrator.
+            after: The names of the steps to be done before it, added already.
+        """
+        after = tuple(after)
+        if name in self._steps:
+            raise ValueError(f"step {name!r} is already added")
+        for dependency in after:
+            if dependency not in self._steps:
+                raise ValueError(f"step {dependency!r} is not added")
+        self._steps[name] = _Step(name, func, after)
+
+    def start(self) -> None:
+        """Starts the steps which depend on nothing; the others follow."""
+        for step in [step for step in self._steps.values() if not step.after]:
+            self._executor.submit(self._run, step)
+
+    def on_done(self, name: str, callback: Callable[[], Any]) -> None:
+        """Has the callback called once the step succeeds, in the thread of the
+        step; right away if it already has.
+        """
+        step = self._steps[name]
+        with self._lock:
+            if not step.done.is_set():
+                step.callbacks.append(callback)
+                return
+        if step.error is None:
+            callback()
+
+    def on_finished(self, callback: Callable[[], Any]) -> None:
+        """Has the callback called once all steps are done, whether they
+        succeed or not, e.g., to report the timeline.
+        """
+        with self._lock:
+            if not self._f_finished:
+                self._finished_callbacks.append(callback)
+                return
+        callback()
+
+    def is_done(self, name: str) -> bool:
+        """Returns whether the step succeeds; never blocks."""
+        step = self._steps[name]
+        return step.done.is_set() and step.error is None
+
+    def wait(self, *names: str, timeout: Optional[float] = None) -> None:
+        """Blocks until the steps are done.
+
+        Raises:
+            StartupError: One of the steps failed or was skipped, from the error
+                it failed with; or not done within the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in names:
+            step = self._steps[name]
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if not step.done.wait(remaining):
+                raise StartupError(f"step {name!r} is not done in {timeout} seconds")
+            if step.error is not None:
+                raise StartupError(f"step {name!r} failed") from step.error
+
+    def timeline(self) -> List[Tuple[str, Optional[float], Optional[float], str]]:
+        """Returns (name, start, end, state) of the steps in the order they
+        start, where start and end are in seconds since the orchestrator is
+        created, None if not yet; state is "done", "failed" with the error,
+        "skipped", "running" or "pending".
+        """
+        rows = []
+        with self._lock:
+            for step in self._steps.values():
+                if step.started is None:
+                    state = "skipped" if step.done.is_set() else "pending"
+                elif not step.done.is_set():
+                    state = "running"
+                elif step.error is not None:
+                    state = f"failed: {step.error!r}"
+                else:
+                    state = "done"
+                start = None if step.started is None else step.started - self._origin
+                end = None if step.ended is None else step.ended - self._origin
+                rows.append((step.name, start, end, state))
+        # those not started are at the end
+        return sorted(rows, key=lambda row: (row[1] is None, row[1] or 0.0))
+
+    def report(self) -> str:
+        """Returns the timeline as a table, with each step drawn as a bar.
+
+        webcam            0 ~  812 ms  |#################       |  done
+        shape_predictor   0 ~  968 ms  |####################    |  done
+        """
+        rows = self.timeline()
+        ends = [end for _, _, end, _ in rows if end is not None]
+        span = max(ends, default=0.0) or 1.0
+        width = 40
+        name_width = max((len(name) for name, *_ in rows), default=0)
+        lines = []
+        for name, start, end, state in rows:
+            if start is None:
+                lines.append(
+                    f"{name:<{name_width}}  {'-':>16}  |{'':{width}}|  {state}"
+                )
+                continue
+            stop = end if end is not None else span
+            left = round(start / span * width)
+            bar = " " * left + "#" * max(1, round(stop / span * width) - left)
+            times = f"{start * 1e3:5.0f} ~ {stop * 1e3:5.0f} ms"
+            lines.append(f"{name:<{name_width}}  {times}  |{bar:<{width}}|  {state}")
+        return "\n".join(lines)
+
+    def _run(self, step: _Step) -> None:
+        step.started = time.perf_counter()
+        try:
+            step.func()
+        except Exception as e:
+            step.error = e
+        finally:
+            step.ended = time.perf_counter()
+            self._finish(step)
+
+    def _finish(self, step: _Step) -> None:
+        with self._lock:
+            step.done.set()
+            callbacks, step.callbacks = step.callbacks, []
+            # the dependents whose dependencies are all done now
+            ready = [
+                other
+                for other in self._steps.values()
+                if step.name in other.after
+                and all(self._steps[name].done.is_set() for name in other.after)
+            ]
+            finished_callbacks: List[Callable[[], Any]] = []
+            if all(other.done.is_set() for other in self._steps.values()):
+                self._f_finished = True
+                finished_callbacks, self._finished_callbacks = (
+                    self._finished_callbacks,
+                    [],
+                )
+        if step.error is None:
+            self._call(callbacks)
+        for other in ready:
+            failed = [
+                name for name in other.after if self._steps[name].error is not None
+            ]
+            if failed:
+                other.error = StartupError(f"skipped since {failed[0]!r} failed")
+                self._finish(other)
+            else:
+                self._executor.submit(self._run, other)
+        self._call(finished_callbacks)
+
+    @staticmethod
+    def _call(callbacks: List[Callable[[], Any]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # the dependents shouldn't wait forever because of it
+                traceback.print_exc()
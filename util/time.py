@@ -5,6 +5,9 @@ import time
 ONE_MIN = 60
 HALF_MIN = 30
 
+# the format of the time of grades sent between the Student-end and Teacher-end
+DATE_STR_FORMAT = "%Y-%m-%d, %H:%M:%S"
+
 
 class Timer:
     """